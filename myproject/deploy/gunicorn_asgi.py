@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for serving myproject through ASGI with Uvicorn workers.
+
+    pip install gunicorn uvicorn
+    gunicorn -c deploy/gunicorn_asgi.py myproject.asgi:application
+
+A few workers serve many slow clients, because a request waiting for the network
+or the database no longer holds a thread. All values can be overridden from the environment.
+In production set DJANGO_SETTINGS_MODULE=myproject.settings_production_asgi; every worker
+then warms up on the ASGI lifespan startup event before it accepts connections.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+# requests with a body upload slowly on mobile networks; keep idle connections around for reuse
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# restart workers now and then to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+accesslog = '-'
+
+raw_env = ['DJANGO_SETTINGS_MODULE=' + os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings_asgi')]
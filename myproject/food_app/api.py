@@ -0,0 +1,126 @@
+import hashlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.gzip import gzip_page
+from django.views.generic import View
+
+from .menu_cache import get_menu, get_menu_version
+from .models import Orders
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import ReadReplicaMixin
+from .search import search_dishes
+from .services import user_orders
+
+
+# A small read-only JSON API for the mobile app: the menu and the order history of the logged-in user.
+# ?fields=a,b returns only those fields (the order history loads only their columns), the history is paged
+# with the same keyset cursor as OrderHistoryView, the JSON has no whitespace and is gzipped when the client
+# accepts it, and every response carries an ETag, so an unchanged payload is answered with 304 Not Modified.
+
+#{API field: how to read it from a Dish}
+DISH_FIELDS = {
+    'id': lambda dish: dish.pk,
+    'name': lambda dish: dish.name,
+    'description': lambda dish: dish.description,
+    'net_price': lambda dish: dish.net_price,
+    'image': lambda dish: dish.image_src,
+}
+#{API field: Orders column}; "lines" are the order lines from Orders.summary.
+ORDER_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'customer_name': 'customer_name',
+    'customer_email': 'customer_email',
+    'customer_phone': 'customer_phone',
+    'customer_address': 'customer_address',
+    'total_price': 'total_price',
+    'lines': 'summary',
+}
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+#reads ?fields=a,b against the allowed fields; without it every field is returned, in their declared order.
+def parse_fields(value, allowed):
+    if not value:
+        return list(allowed)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown or not fields:
+        raise InvalidFields('Nieznane pola: {}'.format(', '.join(unknown)))
+    return list(dict.fromkeys(fields))
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params=JSON_PARAMS)
+
+
+#a response that is private to the user's browser and always revalidated with its ETag.
+def api_response(request, data, etag=None):
+    response = JsonResponse(data, encoder=DjangoJSONEncoder, json_dumps_params=JSON_PARAMS)
+    etag = etag or quote_etag(hashlib.sha1(response.content).hexdigest())
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+#GET api/dishes/: the whole menu, from the menu cache, or with ?q= the matching dishes, best first, each with
+#its "score". Its ETag follows the menu version, so a client with the current menu gets a 304 before anything is serialized.
+@method_decorator(gzip_page, name='dispatch')
+class DishListApiView(View):
+    query_budget = 1
+
+    def get(self, request):
+        try:
+            fields = parse_fields(request.GET.get('fields'), DISH_FIELDS)
+        except InvalidFields as exc:
+            return api_error(str(exc))
+        query = request.GET.get('q', '').strip()
+        version = get_menu_version()
+        etag = quote_etag(hashlib.sha1('{}:{}:{}'.format(version, ','.join(fields), query).encode()).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified.headers['ETag'] = etag
+            patch_cache_control(not_modified, private=True, no_cache=True)
+            return not_modified
+        if query:
+            dishes = [
+                {**{name: DISH_FIELDS[name](dish) for name in fields}, 'score': round(score, 4)}
+                for dish, score in search_dishes(query)
+            ]
+        else:
+            dishes = [{name: DISH_FIELDS[name](dish) for name in fields} for dish in get_menu()]
+        return api_response(request, {'dishes': dishes}, etag)
+
+
+#GET api/orders/?fields=&cursor=: the orders of the logged-in user, newest first, one keyset page at a time.
+#Only the requested columns (plus the cursor columns) are loaded; "next" is the cursor of the next page.
+@method_decorator(gzip_page, name='dispatch')
+class OrderListApiView(ReadReplicaMixin, View):
+    paginate_by = 20
+    query_budget = 3
+
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return api_error('Zaloguj się, aby zobaczyć zamówienia', status=403)
+        try:
+            fields = parse_fields(request.GET.get('fields'), ORDER_FIELDS)
+        except InvalidFields as exc:
+            return api_error(str(exc))
+        columns = {ORDER_FIELDS[name] for name in fields} | {'id', 'created_at'}
+        paginator = KeysetPaginator(
+            user_orders(Orders.objects.only(*columns), request.user), self.paginate_by, ordering=('-created_at', '-id')
+        )
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor as exc:
+            return api_error(str(exc))
+        orders = [{name: getattr(order, ORDER_FIELDS[name]) for name in fields} for order in page]
+        return api_response(request, {'orders': orders, 'next': page.next_cursor})
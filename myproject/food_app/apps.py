@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FoodAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'food_app'
+
+    def ready(self):
+        from . import jobs, signals  # noqa: F401
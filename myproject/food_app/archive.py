@@ -0,0 +1,322 @@
+import gzip
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .menu_cache import LRUCache
+from .models import Orders, OrdersDish
+
+
+# The cold archive of old orders.
+#
+# `manage.py archive_orders` moves the orders older than ORDER_RETENTION_DAYS (with their lines) out of the
+# database into append-only files under ORDER_ARCHIVE_DIR, one directory per month of created_at (UTC):
+#
+#   2024-03/<first id>-<last id>.ndjson.gz   the orders, one JSON object per line, in one gzip member per user,
+#                                            newest first, so one user's orders are read without the rest
+#   2024-03/<first id>-<last id>.idx.json    {"users": {user id: [offset, length, count, newest, oldest]},
+#                                             "dishes": {dish id: [lines, units]}, ...}
+#   manifest.json                            the list of segments and the cutoff of the latest run
+#                                            ("archived_before"); rewritten after every segment
+#
+# The cutoff is rounded down to local midnight, which is also an hour boundary, so an hourly or daily sales rollup
+# (food_app.reporting) is never split between the archive and the live tables: the rollups before archived_before
+# are final and are kept by `rollup_sales --rebuild` and skipped by `--check`. For the same reason an order is only
+# archived once `rollup_sales` has counted it: archive_orders refuses to run past the rollup watermark.
+#
+# A segment is never changed once written; a later run for the same month adds another one. The live tables keep
+# only the recent months, which is what the hot queries read, so their indexes and vacuum stay small. The history
+# page reads the archive only when a user pages past their live orders (see extend_page).
+#
+# The tables are not natively partitioned on PostgreSQL: a partitioned table needs created_at in its primary key and
+# in every unique constraint, and the foreign keys of OrdersDish and OrderSubmission point at Orders.id alone.
+
+MANIFEST = 'manifest.json'
+
+
+class ArchiveNotRolledUp(ValueError):
+    pass
+
+
+def archive_root():
+    return Path(getattr(settings, 'ORDER_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'order_archive'))
+
+
+def retention_days():
+    return getattr(settings, 'ORDER_RETENTION_DAYS', 365)
+
+
+#the cutoff of an archive run for orders created before `moment`: the local midnight at or before it.
+def archive_cutoff(moment):
+    return timezone.make_aware(datetime.combine(timezone.localdate(moment), time.min))
+
+
+def _key(order):
+    return order['created_at'], order['id']
+
+
+def _order_record(order, lines):
+    return {
+        'id': order.pk,
+        #fixed width, so the ISO strings sort like the moments they stand for
+        'created_at': order.created_at.astimezone(dt_timezone.utc).isoformat(timespec='microseconds'),
+        'customer_name': order.customer_name,
+        'customer_email': order.customer_email,
+        'customer_phone': order.customer_phone,
+        'customer_address': order.customer_address,
+        'total_price': str(order.total_price),
+        'summary': order.summary,
+        #[dish id, count, price, user id] of every OrdersDish row
+        'lines': [[line['dish_id'], line['count'], str(line['price']), line['user_id']] for line in lines],
+    }
+
+
+#builds an unsaved Orders instance the history template can show like a live one.
+def _order_from_record(record):
+    return Orders(
+        id=record['id'],
+        created_at=parse_datetime(record['created_at']),
+        customer_name=record['customer_name'],
+        customer_email=record['customer_email'],
+        customer_phone=record['customer_phone'],
+        customer_address=record['customer_address'],
+        total_price=Decimal(record['total_price']),
+        summary=record['summary'],
+    )
+
+
+def _write_atomically(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+#Reads the segments listed in the manifest. The indexes of the ORDER_ARCHIVE_INDEX_CACHE most recently used
+#segments are kept in memory, so a worker does not hold the index of the whole archive; the manifest is checked
+#with one stat() per lookup, so a process notices the segments written by a later archive run.
+class OrderArchive:
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._manifest_data = {'segments': []}
+        self._indexes = LRUCache(maxsize=getattr(settings, 'ORDER_ARCHIVE_INDEX_CACHE', 24))
+
+    def _manifest(self):
+        try:
+            mtime = (self.root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return {'segments': []}
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                self._manifest_data = json.loads((self.root / MANIFEST).read_text())
+                self._manifest_mtime = mtime
+            return self._manifest_data
+
+    def segments(self):
+        return self._manifest()['segments']
+
+    #the cutoff of the latest archive run: every order created before it is archived (or about to be), None if
+    #nothing was archived yet.
+    def archived_before(self):
+        value = self._manifest().get('archived_before')
+        return parse_datetime(value) if value else None
+
+    def index(self, segment):
+        index = self._indexes.get(segment)
+        if index is None:
+            index = json.loads((self.root / f'{segment}.idx.json').read_text())
+            self._indexes.set(segment, index)
+        return index
+
+    #the archived orders of a user, newest first, older than `before` (created_at, id) if given: at most `limit`.
+    #The segments are sorted by month, newest first, so the months older than the oldest order
+    #needed are never opened once `limit` orders have been found.
+    def user_orders(self, user_id, before=None, limit=20):
+        found = {}
+        month = None
+        for segment in sorted(self.segments(), reverse=True):
+            segment_month = segment.split('/')[0]
+            if len(found) >= limit and segment_month != month:
+                break
+            month = segment_month
+            entry = self.index(segment)['users'].get(str(user_id))
+            if entry is None:
+                continue
+            offset, length, _, _, oldest = entry
+            if before is not None and parse_datetime(oldest) >= before[0]:
+                continue
+            with open(self.root / f'{segment}.ndjson.gz', 'rb') as fh:
+                fh.seek(offset)
+                member = gzip.decompress(fh.read(length))
+            for line in member.splitlines():
+                record = json.loads(line)
+                order = _order_from_record(record)
+                if before is None or (order.created_at, order.pk) < tuple(before):
+                    found[order.pk] = order
+        orders = sorted(found.values(), key=lambda order: (order.created_at, order.pk), reverse=True)
+        return orders[:limit]
+
+    #{dish id: (lines, units)} of every archived order, for the popularity counters.
+    def dish_totals(self):
+        totals = defaultdict(lambda: [0, 0])
+        for segment in self.segments():
+            for dish_id, (lines, units) in self.index(segment)['dishes'].items():
+                totals[int(dish_id)][0] += lines
+                totals[int(dish_id)][1] += units
+        return {dish_id: tuple(counts) for dish_id, counts in totals.items()}
+
+    #writes one segment of `records` (all from the same month) and returns its name, e.g. "2024-03/1-250".
+    def write_segment(self, records, users):
+        month = records[0]['created_at'][:7]
+        segment = f"{month}/{records[0]['id']}-{records[-1]['id']}"
+        (self.root / month).mkdir(parents=True, exist_ok=True)
+
+        data = bytearray()
+        index = {'version': 1, 'count': len(records), 'users': {}, 'dishes': {}}
+        by_user = defaultdict(list)
+        for record in records:
+            for user_id in users[record['id']]:
+                by_user[user_id].append(record)
+        for user_id, user_records in sorted(by_user.items()):
+            user_records.sort(key=_key, reverse=True)
+            member = gzip.compress(
+                b''.join(json.dumps(record).encode() + b'\n' for record in user_records),
+                mtime=0,
+            )
+            index['users'][str(user_id)] = [
+                len(data), len(member), len(user_records), user_records[0]['created_at'], user_records[-1]['created_at'],
+            ]
+            data += member
+        dishes = defaultdict(lambda: [0, 0])
+        for record in records:
+            for dish_id, count, _, _ in record['lines']:
+                dishes[str(dish_id)][0] += 1
+                dishes[str(dish_id)][1] += count
+        index['dishes'] = dishes
+
+        #the data first: a segment is only read once its index exists
+        _write_atomically(self.root / f'{segment}.ndjson.gz', bytes(data))
+        _write_atomically(self.root / f'{segment}.idx.json', json.dumps(index).encode())
+        return segment
+
+    def add_to_manifest(self, new_segments, archived_before=None):
+        manifest = self._manifest()
+        segments = sorted(set(manifest['segments']) | set(new_segments))
+        data = {'segments': segments, 'archived_before': manifest.get('archived_before')}
+        if archived_before is not None:
+            previous = self.archived_before()
+            if previous is None or archived_before > previous:
+                data['archived_before'] = archived_before.astimezone(dt_timezone.utc).isoformat()
+        self.root.mkdir(parents=True, exist_ok=True)
+        _write_atomically(self.root / MANIFEST, json.dumps(data, indent=1).encode())
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def order_archive():
+    root = archive_root()
+    with _archives_lock:
+        if root not in _archives:
+            _archives[root] = OrderArchive(root)
+        return _archives[root]
+
+
+#the sales rollups are built from the live tables, so an order deleted before roll_up has counted it would be
+#missing from them for good. Raises ArchiveNotRolledUp if an order created before `before` is not rolled up yet.
+def check_rolled_up(before):
+    #imported here: food_app.reporting reads the archive horizon from this module
+    from .reporting import processed_until
+
+    watermark = processed_until()
+    pending = Orders.objects.filter(created_at__lt=before)
+    if watermark is not None:
+        pending = pending.filter(created_at__gte=watermark)
+    if pending.exists():
+        raise ArchiveNotRolledUp(
+            f'Orders created before {before.isoformat()} have not all been rolled up into the sales reports yet '
+            f'(rolled up until: {watermark.isoformat() if watermark else "never"}). Run `manage.py rollup_sales` first.'
+        )
+
+
+#Moves the orders created before `before` (default: ORDER_RETENTION_DAYS ago), rounded down to local midnight,
+#into the archive, `batch_size` orders per transaction and segment, oldest first;
+#returns (orders archived, segments written). Raises ArchiveNotRolledUp if rollup_sales has not counted them yet.
+#A batch is deleted from the database in the transaction that also makes its segment visible: the segment is
+#written first and listed in the manifest just before the commit, so a crash leaves the orders either live or archived
+#(in the worst case both for one batch; the history then shows them once, as it deduplicates by id).
+def archive_orders(before=None, batch_size=500):
+    before = archive_cutoff(before or timezone.now() - timedelta(days=retention_days()))
+    check_rolled_up(before)
+    archive = order_archive()
+    archived = 0
+    segments = []
+    while True:
+        with transaction.atomic():
+            orders = list(Orders.objects.filter(created_at__lt=before).order_by('created_at', 'id')[:batch_size])
+            if not orders:
+                if archive.archived_before() is None or archive.archived_before() < before:
+                    archive.add_to_manifest([], before)
+                return archived, segments
+            #a batch ends at a month boundary, so every segment holds a single month
+            month = orders[0].created_at.astimezone(dt_timezone.utc).strftime('%Y-%m')
+            orders = [
+                order for order in orders if order.created_at.astimezone(dt_timezone.utc).strftime('%Y-%m') == month
+            ]
+            ids = [order.pk for order in orders]
+            lines = defaultdict(list)
+            for line in OrdersDish.objects.filter(orders_id__in=ids).order_by('pk').values(
+                'orders_id', 'dish_id', 'count', 'price', 'user_id'
+            ):
+                lines[line['orders_id']].append(line)
+            records = [_order_record(order, lines[order.pk]) for order in orders]
+            users = {order.pk: sorted({line['user_id'] for line in lines[order.pk]}) for order in orders}
+            segment = archive.write_segment(records, users)
+
+            #the lines go with a plain DELETE: deleting them one by one would send post_delete (and rebuild the
+            #summary of an order that is being deleted) for every line
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM {} WHERE orders_id IN ({})'.format(
+                        connection.ops.quote_name(OrdersDish._meta.db_table), ', '.join(['%s'] * len(ids))
+                    ),
+                    ids,
+                )
+            Orders.objects.filter(pk__in=ids).delete()
+            archive.add_to_manifest([segment], before)
+        archived += len(ids)
+        segments.append(segment)
+
+
+#Continues a history page into the archive once the user's live orders run out:
+#the page is filled up with the archived orders older than its last order (or the cursor) and gets a next cursor
+#if there are more. A page that still has live orders after it is returned as it is, without touching the archive.
+def extend_page(paginator, page, user):
+    if page.has_next:
+        return page
+    if page.object_list:
+        last = page.object_list[-1]
+        before = (last.created_at, last.pk)
+    elif page.cursor:
+        before = tuple(paginator.decode_cursor(page.cursor))
+    else:
+        before = None
+    missing = paginator.per_page - len(page.object_list) + 1
+    archived = order_archive().user_orders(user.pk, before, missing)
+    if not archived:
+        return page
+    return paginator.page_of(list(page.object_list) + archived, page.cursor)
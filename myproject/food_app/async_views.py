@@ -0,0 +1,161 @@
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.shortcuts import redirect, render
+from django.views.generic import View
+
+from .archive import extend_page
+from .exports import InvalidExport, OrderExport
+from .menu_cache import aget_menu, aget_menu_version
+from .models import Orders
+from .pagination import KeysetPaginator
+from .popularity import arecently_popular
+from .routers import ReadReplicaMixin
+from .services import (
+    InvalidOrder, aplace_order, new_idempotency_key, parse_customer, parse_idempotency_key, parse_order_lines,
+    user_orders,
+)
+from .views import (
+    HomeView, OrderExportView, OrderHistoryView, OrderSuccessView, OrderView, home_validators, menu_dishes,
+    set_validators,
+)
+
+
+# Async versions of the ordering views, served by the ASGI entry point (myproject.urls_async).
+# Database work goes through the async ORM (aget, ain_bulk, async iteration), so a request waiting
+# for the database does not hold a worker thread. The templates are rendered only from data
+# that is already loaded (the order lines come from Orders.summary), because the ORM cannot be
+# used synchronously inside an async view.
+
+
+#request.user is lazy and loading it reads the session and the user from the database,
+#so it is resolved in a worker thread (Django 4.2 has no request.auser()).
+async def aget_user(request):
+    def load_user():
+        user = request.user
+        user.is_authenticated
+        return user
+    return await sync_to_async(load_user)()
+
+
+#the whole menu comes from the async menu cache; a search (?q=) may query the database, so it runs in a thread.
+async def _amenu_dishes(request):
+    if request.GET.get('q', '').strip():
+        return await sync_to_async(menu_dishes)(request)
+    return '', await aget_menu()
+
+
+class AsyncHomeView(ReadReplicaMixin, View):
+    query_budget = HomeView.query_budget
+
+    async def get(self, request):
+        user = await aget_user(request)
+        etag, last_modified = await sync_to_async(home_validators)(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+
+        menu_version = await aget_menu_version()
+        query, dishes = await _amenu_dishes(request)
+        ctx = {
+            'dishes': dishes,
+            'q': query,
+            'menu_version': menu_version,
+        }
+        if user.is_authenticated:
+            ctx['username'] = user.username
+        return set_validators(render(request, 'food_app/home.html', ctx), etag, last_modified)
+
+
+class AsyncOrderView(ReadReplicaMixin, View):
+    template_name = OrderView.template_name
+    success_template_name = OrderView.success_template_name
+    query_budget = OrderView.query_budget
+
+    async def get(self, request, *args, **kwargs):
+        if not (await aget_user(request)).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        menu_version = await aget_menu_version()
+        query, dishes = await _amenu_dishes(request)
+        menu = {dish.pk: dish for dish in await aget_menu()}
+        popular_dishes = [(menu[dish_id], total) for dish_id, total in await arecently_popular() if dish_id in menu]
+        context = {
+            'dishes': dishes,
+            'q': query,
+            'menu_version': menu_version,
+            #no OrdersForm: the template does not render it and its __init__ reads the menu synchronously
+            'popular_dishes': popular_dishes,
+            'idempotency_key': new_idempotency_key(),
+        }
+        return render(request, self.template_name, context)
+
+    async def post(self, request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        try:
+            order = await aplace_order(user, parse_customer(request.POST), parse_order_lines(request.POST),
+                                       parse_idempotency_key(request.POST))
+        except InvalidOrder as exc:
+            messages.error(request, str(exc))
+            return redirect('order')
+
+        return render(request, self.success_template_name, {'order': order})
+
+
+class AsyncOrderSuccessView(View):
+    template_name = OrderSuccessView.template_name
+    query_budget = OrderSuccessView.query_budget
+
+    async def get(self, request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        try:
+            order = await user_orders(Orders.objects.all(), user).aget(pk=kwargs['order_id'])
+        except Orders.DoesNotExist:
+            raise Http404('Nie ma takiego zamówienia')
+        return render(request, self.template_name, {'order': order})
+
+
+class AsyncOrderHistoryView(ReadReplicaMixin, View):
+    template_name = OrderHistoryView.template_name
+    paginate_by = OrderHistoryView.paginate_by
+    query_budget = OrderHistoryView.query_budget
+
+    async def get(self, request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        paginator = KeysetPaginator(user_orders(Orders.objects.all(), user), self.paginate_by)
+        page = await paginator.apage(request.GET.get('cursor'))
+        if not page.has_next:
+            page = await sync_to_async(extend_page)(paginator, page, user)
+        context = {
+            'orders': page.object_list,
+            'object_list': page.object_list,
+            'page_obj': page,
+            'paginator': paginator,
+            'is_paginated': page.has_next or page.has_previous,
+        }
+        return render(request, self.template_name, context)
+
+
+class AsyncOrderExportView(View):
+    query_budget = OrderExportView.query_budget
+
+    async def get(self, request):
+        if not (await aget_user(request)).is_staff:
+            raise PermissionDenied
+        try:
+            export = OrderExport.from_params(request.GET)
+        except InvalidExport as exc:
+            return HttpResponseBadRequest(str(exc))
+        response = StreamingHttpResponse(aiter(export), content_type=export.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+        return response
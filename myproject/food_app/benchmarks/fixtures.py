@@ -0,0 +1,122 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from food_app.menu_cache import bump_menu_version
+from food_app.models import Dish, Orders, OrdersDish
+
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+DISH_WORDS = (
+    ('Pizza', 'Zupa', 'Burger', 'Makaron', 'Sałatka', 'Zapiekanka', 'Pierogi', 'Kotlet', 'Tortilla', 'Risotto'),
+    ('wiejska', 'grecka', 'carbonara', 'serowa', 'ostra', 'domowa', 'wegańska', 'z kurczakiem', 'z grzybami',
+     'z łososiem'),
+)
+DESCRIPTION_WORDS = ('świeże', 'pomidory', 'ser', 'bazylia', 'czosnek', 'cebula', 'boczek', 'papryka', 'oliwa',
+                     'sos', 'ziemniaki', 'śmietana', 'szpinak', 'rukola', 'kurczak', 'wołowina', 'pieczarki')
+
+
+#created_at is auto_now_add, which bulk_create would overwrite with "now";
+#the generator turns it off for the duration so orders can be spread over a realistic history.
+@contextmanager
+def _explicit_created_at():
+    field = Orders._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _batched(objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def make_dishes(count, rng):
+    for i in range(count):
+        suffix = ' {}'.format(i)
+        name = '{} {}'.format(rng.choice(DISH_WORDS[0]), rng.choice(DISH_WORDS[1]))
+        yield Dish(
+            name=name[:Dish._meta.get_field('name').max_length - len(suffix)] + suffix,
+            description=' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(rng.randint(6, 20))),
+            net_price=Decimal(rng.randint(900, 9900)) / 100,
+        )
+
+
+#Generates a synthetic menu, users and their order histories with bulk inserts.
+#Every user can log in with BENCHMARK_PASSWORD (the hash is computed once and shared).
+#The same seed always produces the same data, so runs on different commits are comparable.
+def generate(dishes=100, users=50, orders_per_user=20, max_lines=5, days=365, seed=0, batch_size=2000,
+             username_prefix='bench'):
+    rng = random.Random(seed)
+    User = get_user_model()
+    now = timezone.now()
+
+    with transaction.atomic():
+        for batch in _batched(make_dishes(dishes, rng), batch_size):
+            Dish.objects.bulk_create(batch)
+        menu = list(Dish.objects.order_by('-pk')[:dishes])
+
+        password = make_password(BENCHMARK_PASSWORD)
+        for batch in _batched(
+            (User(username='{}{}'.format(username_prefix, i), password=password) for i in range(users)), batch_size
+        ):
+            User.objects.bulk_create(batch)
+        user_ids = list(
+            User.objects.filter(username__startswith=username_prefix).order_by('-pk').values_list('pk', flat=True)[:users]
+        )
+
+        order_count = line_count = 0
+        with _explicit_created_at():
+            for user_batch in _batched(user_ids, max(1, batch_size // max(1, orders_per_user))):
+                orders = []
+                owners = []
+                for user_id in user_batch:
+                    for _ in range(orders_per_user):
+                        orders.append(Orders(
+                            customer_name='Klient {}'.format(user_id),
+                            customer_email='klient{}@example.com'.format(user_id),
+                            customer_phone='{:09d}'.format(rng.randint(0, 999999999)),
+                            customer_address='ul. Testowa {}'.format(rng.randint(1, 200)),
+                            created_at=now - timedelta(seconds=rng.randint(0, days * 24 * 3600)),
+                        ))
+                        owners.append(user_id)
+                Orders.objects.bulk_create(orders)
+
+                lines = []
+                for order, user_id in zip(orders, owners):
+                    total = Decimal('0.00')
+                    order_lines = []
+                    for dish in rng.sample(menu, min(len(menu), rng.randint(1, max_lines))):
+                        count = rng.randint(1, 3)
+                        total += dish.net_price * count
+                        order_lines.append(OrdersDish(orders=order, dish=dish, user_id=user_id, count=count,
+                                                      price=dish.net_price * count))
+                    order.total_price = total
+                    order.summary = Orders.summarize(order_lines)
+                    lines.extend(order_lines)
+                Orders.objects.bulk_update(orders, ['total_price', 'summary'], batch_size=batch_size)
+                for batch in _batched(lines, batch_size):
+                    OrdersDish.objects.bulk_create(batch)
+                order_count += len(orders)
+                line_count += len(lines)
+
+    call_command('rebuild_popularity', stdout=StringIO())
+    bump_menu_version()
+    return {'dishes': dishes, 'users': users, 'orders': order_count, 'order_lines': line_count}
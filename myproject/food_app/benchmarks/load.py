@@ -0,0 +1,178 @@
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from food_app.models import Dish
+
+from .stats import summarize
+
+
+#(name, share of the requests); everything but "home" is sent as a logged-in user.
+SCENARIOS = (
+    ('home', 50),
+    ('order_form', 20),
+    ('history', 20),
+    ('place_order', 10),
+)
+
+
+#A virtual user: a session cookie (logged in the way Client.force_login does it) and a CSRF secret.
+class VirtualUser:
+    def __init__(self, user):
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        self.csrf = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+        self.cookie = '{}={}; {}={}'.format(
+            settings.SESSION_COOKIE_NAME, session.session_key, settings.CSRF_COOKIE_NAME, self.csrf
+        )
+
+
+#a Host header the configured ALLOWED_HOSTS accepts; with an empty list (DEBUG) that is "localhost".
+def benchmark_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def _environ(method, path, body=b'', cookie='', headers=None):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': benchmark_host(),
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': benchmark_host(),
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if body:
+        environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        environ['CONTENT_LENGTH'] = str(len(body))
+    environ.update(headers or {})
+    return environ
+
+
+#Drives the WSGI application in-process from `concurrency` threads, each acting as one of the virtual users,
+#and reports latency percentiles and throughput, overall and per scenario.
+class LoadDriver:
+    def __init__(self, users, concurrency=50, requests=1000, seed=0, application=None):
+        self.application = application or WSGIHandler()
+        self.users = [VirtualUser(user) for user in users]
+        self.concurrency = concurrency
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.dish_ids = list(Dish.objects.order_by('pk').values_list('pk', flat=True)[:20])
+        self._lock = threading.Lock()
+        self._latencies = {name: [] for name, _ in SCENARIOS}
+        self._errors = {name: 0 for name, _ in SCENARIOS}
+
+    def _plan(self):
+        names = [name for name, _ in SCENARIOS]
+        weights = [weight for _, weight in SCENARIOS]
+        return [(self.rng.choice(self.users), self.rng.choices(names, weights)[0]) for _ in range(self.requests)]
+
+    def _order_body(self):
+        dish_ids = self.rng.sample(self.dish_ids, min(3, len(self.dish_ids)))
+        data = [
+            ('customer_name', 'Benchmark'),
+            ('customer_email', 'benchmark@example.com'),
+            ('customer_phone', '123456789'),
+            ('customer_address', 'ul. Testowa 1'),
+        ]
+        data += [('dishes', dish_id) for dish_id in dish_ids]
+        data += [('counts_{}'.format(dish_id), 1) for dish_id in dish_ids]
+        return urlencode(data).encode()
+
+    def _request(self, user, scenario):
+        if scenario == 'home':
+            environ = _environ('GET', reverse('home'))
+        elif scenario == 'order_form':
+            environ = _environ('GET', reverse('order'), cookie=user.cookie)
+        elif scenario == 'history':
+            environ = _environ('GET', reverse('order_history'), cookie=user.cookie)
+        else:
+            environ = _environ('POST', reverse('order'), self._order_body(), user.cookie, {
+                'HTTP_X_CSRFTOKEN': user.csrf,
+                'HTTP_REFERER': 'http://{}/'.format(benchmark_host()),
+            })
+
+        status = []
+        start = time.perf_counter()
+        try:
+            body = self.application(environ, lambda s, headers, exc_info=None: status.append(s))
+            for _ in body:
+                pass
+            if hasattr(body, 'close'):
+                body.close()
+            ok = status and int(status[0].split()[0]) < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies[scenario].append(elapsed)
+            if not ok:
+                self._errors[scenario] += 1
+
+    def _worker(self, plan):
+        try:
+            for user, scenario in plan:
+                self._request(user, scenario)
+        finally:
+            close_old_connections()
+
+    def run(self):
+        plan = self._plan()
+        chunks = [plan[i::self.concurrency] for i in range(self.concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self._worker, chunks))
+        duration = time.perf_counter() - start
+
+        everything = [latency for latencies in self._latencies.values() for latency in latencies]
+        result = summarize(everything)
+        result.update({
+            'concurrency': self.concurrency,
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(len(everything) / duration, 2) if duration else None,
+            'errors': sum(self._errors.values()),
+            'scenarios': {
+                name: dict(summarize(self._latencies[name]), errors=self._errors[name])
+                for name, _ in SCENARIOS
+            },
+        })
+        return result
+
+
+def run(concurrency=50, requests=1000, users=100, seed=0):
+    User = get_user_model()
+    accounts = list(User.objects.filter(ordersdish__isnull=False).distinct().order_by('pk')[:users])
+    if not accounts:
+        raise RuntimeError('No users with orders to drive; generate a dataset first.')
+    return LoadDriver(accounts, concurrency=concurrency, requests=requests, seed=seed).run()
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .fixtures import BENCHMARK_PASSWORD
+from .load import benchmark_host
+from .stats import summarize
+
+
+#POSTs the login form `attempts` times in this thread and returns the latencies plus the rate per
+#second of wall time and per second of this process's CPU time (i.e. per busy core).
+def _post_logins(username, password, attempts, expected_status):
+    client = Client(SERVER_NAME=benchmark_host())
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(attempts):
+        start = time.perf_counter()
+        response = client.post(reverse('login'), {'username': username, 'password': password})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != expected_status:
+            raise RuntimeError(f'POST {reverse("login")} returned {response.status_code}, expected {expected_status}')
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    result = summarize(latencies)
+    result['per_second'] = round(attempts / wall, 2)
+    result['per_core_second'] = round(attempts / cpu, 2) if cpu else None
+    return result
+
+
+#Logins per second per core: successful logins through LoginView, a bare check of the password hash
+#for comparison (a login should cost about one), and attempts refused by the throttle before hashing.
+def run(attempts=20):
+    user = get_user_model().objects.filter(username__startswith='bench').order_by('pk').first()
+    if user is None:
+        raise RuntimeError('No users to benchmark; generate a dataset first.')
+
+    with override_settings(LOGIN_THROTTLE={}):
+        results = {'login': _post_logins(user.username, BENCHMARK_PASSWORD, attempts, 302)}
+
+    cpu_start = time.process_time()
+    for _ in range(attempts):
+        check_password(BENCHMARK_PASSWORD, user.password)
+    cpu = time.process_time() - cpu_start
+    results['password_hash'] = {'count': attempts, 'per_core_second': round(attempts / cpu, 2) if cpu else None}
+
+    #an unknown username with an empty bucket after its first attempt, so every other attempt is refused
+    with override_settings(LOGIN_THROTTLE={'username': (1, 3600)}):
+        _post_logins('throttled-benchmark-user', 'wrong-password', 1, 200)
+        results['throttled'] = _post_logins('throttled-benchmark-user', 'wrong-password', attempts, 429)
+    return results
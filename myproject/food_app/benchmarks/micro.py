@@ -0,0 +1,100 @@
+import time
+
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from food_app.models import Dish, Orders, OrdersDish
+from food_app.pagination import KeysetPaginator
+from food_app.views import OrderHistoryView
+
+from .fixtures import BENCHMARK_PASSWORD
+from .load import benchmark_host
+from .stats import summarize
+
+
+def _client(username=None):
+    client = Client(SERVER_NAME=benchmark_host())
+    if username:
+        client.login(username=username, password=BENCHMARK_PASSWORD)
+    return client
+
+
+#times one request repeatedly through the test Client and returns latency percentiles, queries and bytes per request.
+def bench_request(client, method, path, data=None, iterations=50, warmup=5):
+    send = getattr(client, method.lower())
+    latencies = []
+    queries = 0
+    size = 0
+    for i in range(warmup + iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = send(path, data or {})
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {path} returned {response.status_code}')
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries += len(ctx.captured_queries)
+            size += len(response.content)
+    result = summarize(latencies)
+    result['queries_per_request'] = round(queries / max(1, iterations), 2)
+    result['bytes_per_response'] = round(size / max(1, iterations))
+    return result
+
+
+#the cursor of the page `pages` pages deep into the user's history, as OrderHistoryView would hand it out.
+def _deep_history_cursor(username, pages):
+    user_lines = OrdersDish.objects.filter(orders=OuterRef('pk'), user__username=username)
+    paginator = KeysetPaginator(Orders.objects.filter(Exists(user_lines)), OrderHistoryView.paginate_by)
+    position = pages * OrderHistoryView.paginate_by - 1
+    order = paginator.queryset[position:position + 1].first()
+    return paginator.encode_cursor(order) if order else None
+
+
+#Micro-benchmarks of the view hot paths: the menu, the order form, placing an order
+#and the first and a deep page of the order history of the user with the most orders.
+def run(iterations=50, warmup=5, order_lines=3, history_depth=20):
+    busiest = (
+        OrdersDish.objects.values('user__username')
+        .annotate(orders=Count('orders', distinct=True))
+        .order_by('-orders')
+        .first()
+    )
+    if busiest is None:
+        raise RuntimeError('No orders to benchmark; generate a dataset first.')
+    username = busiest['user__username']
+
+    anonymous = _client()
+    client = _client(username)
+    dish_ids = list(Dish.objects.order_by('pk').values_list('pk', flat=True)[:order_lines])
+    order = {
+        'customer_name': 'Benchmark',
+        'customer_email': 'benchmark@example.com',
+        'customer_phone': '123456789',
+        'customer_address': 'ul. Testowa 1',
+        'dishes': dish_ids,
+    }
+    order.update({'counts_{}'.format(dish_id): 2 for dish_id in dish_ids})
+
+    results = {
+        'home': bench_request(anonymous, 'GET', reverse('home'), iterations=iterations, warmup=warmup),
+        'order_form': bench_request(client, 'GET', reverse('order'), iterations=iterations, warmup=warmup),
+        'place_order': bench_request(client, 'POST', reverse('order'), order, iterations=iterations, warmup=warmup),
+        'history_first_page': bench_request(
+            client, 'GET', reverse('order_history'), iterations=iterations, warmup=warmup
+        ),
+        #the JSON API next to the HTML pages it replaces for the mobile app
+        'api_menu': bench_request(anonymous, 'GET', reverse('api_dishes'), iterations=iterations, warmup=warmup),
+        'api_history_first_page': bench_request(
+            client, 'GET', reverse('api_orders'), iterations=iterations, warmup=warmup
+        ),
+    }
+    cursor = _deep_history_cursor(username, history_depth)
+    if cursor:
+        results['history_deep_page'] = bench_request(
+            client, 'GET', reverse('order_history'), {'cursor': cursor}, iterations=iterations, warmup=warmup
+        )
+    return results
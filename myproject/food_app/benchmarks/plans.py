@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from food_app.models import Orders, OrdersDish, Task
+from food_app.pagination import KeysetPaginator
+from food_app.services import user_orders
+from food_app.views import OrderHistoryView
+
+
+#The hot query shapes and the indexes their plans are expected to use:
+#{name: (function(user) returning the queryset, index names)}.
+def hot_queries():
+    now = timezone.now()
+    return {
+        'order_history': (
+            lambda user: KeysetPaginator(
+                user_orders(Orders.objects.all(), user), OrderHistoryView.paginate_by, ordering=('-created_at', '-id')
+            ).queryset[:OrderHistoryView.paginate_by + 1],
+            ('orders_created_at_id_idx', 'ordersdish_user_orders_idx'),
+        ),
+        'export_range': (
+            lambda user: Orders.objects.filter(created_at__gte=now - timedelta(days=1)).order_by('created_at', 'id'),
+            ('orders_created_at_id_idx',),
+        ),
+        'popularity_totals': (
+            lambda user: OrdersDish.objects.values('dish_id').annotate(order_count=Count('*'), units=Sum('count')),
+            ('ordersdish_dish_count_idx',),
+        ),
+        'due_tasks': (
+            lambda user: Task.objects.filter(status=Task.QUEUED, run_after__lte=now).order_by('run_after', 'id'),
+            ('task_status_run_after_idx',),
+        ),
+    }
+
+
+def explain(queryset):
+    return queryset.explain()
+
+
+#Runs EXPLAIN on every hot query for `user` and reports which of the expected indexes the plan uses:
+#{name: {'plan': text, 'expected': [...], 'missing': [...]}}.
+#The plans only mean something on a dataset of realistic size (see fixtures.generate): with a few rows
+#a sequential scan is the cheapest plan and PostgreSQL rightly picks it, so the tables are analyzed first.
+def check_plans(user):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for model in (Orders, OrdersDish, Task):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+    results = {}
+    for name, (build, indexes) in hot_queries().items():
+        plan = explain(build(user))
+        results[name] = {
+            'plan': plan,
+            'expected': list(indexes),
+            'missing': [index for index in indexes if index not in plan],
+        }
+    return results
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from food_app.models import Dish
+
+from .fixtures import BENCHMARK_PASSWORD
+from .load import benchmark_host
+
+
+#the login/order flow of one visitor: [(step, method, url, data)].
+def _flow(username, dish_id):
+    return [
+        ('login_form', 'GET', reverse('login'), {}),
+        ('login', 'POST', reverse('login'), {'username': username, 'password': BENCHMARK_PASSWORD}),
+        ('home', 'GET', reverse('home'), {}),
+        ('order_form', 'GET', reverse('order'), {}),
+        ('cart_add', 'POST', reverse('cart_add'), {'dish': dish_id, 'count': 2}),
+        #the same quantity again: the session is marked modified, but nothing changed
+        ('cart_unchanged', 'POST', reverse('cart_update'), {'dish': dish_id, 'count': 2}),
+        ('cart', 'GET', reverse('cart'), {}),
+        ('logout', 'GET', reverse('logout'), {}),
+        ('login_page_message', 'GET', reverse('login'), {}),
+    ]
+
+
+def _session_queries(queries):
+    session = [query['sql'] for query in queries if 'django_session' in query['sql']]
+    writes = [sql for sql in session if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    return len(session) - len(writes), len(writes)
+
+
+#Database work of the session and message storage per request of the login/order flow, for every tier
+#of settings.SESSION_TIERS: {tier: {step: {'session_reads', 'session_writes', 'queries'}, 'flow': totals}}.
+#Every round is a new visitor; the numbers are averages per round.
+def run(rounds=20, tiers=None):
+    user = get_user_model().objects.filter(username__startswith='bench').order_by('pk').first()
+    dish = Dish.objects.order_by('pk').first()
+    if user is None or dish is None:
+        raise RuntimeError('No users or dishes to benchmark; generate a dataset first.')
+    flow = _flow(user.username, dish.pk)
+
+    results = {}
+    for tier in tiers or settings.SESSION_TIERS:
+        engine, storage = settings.SESSION_TIERS[tier]
+        totals = {step: {'session_reads': 0, 'session_writes': 0, 'queries': 0} for step, *_ in flow}
+        #the middleware picks the session engine when the client's handler is created, so inside the override
+        with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=storage):
+            for _ in range(rounds):
+                client = Client(SERVER_NAME=benchmark_host())
+                for step, method, url, data in flow:
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = getattr(client, method.lower())(url, data)
+                    if response.status_code >= 400:
+                        raise RuntimeError(f'{method} {url} returned {response.status_code} with the {tier} tier')
+                    reads, writes = _session_queries(ctx.captured_queries)
+                    totals[step]['session_reads'] += reads
+                    totals[step]['session_writes'] += writes
+                    totals[step]['queries'] += len(ctx.captured_queries)
+        result = {
+            step: {name: round(value / rounds, 2) for name, value in counts.items()} for step, counts in totals.items()
+        }
+        result['flow'] = {
+            name: round(sum(counts[name] for counts in result.values()), 2)
+            for name in ('session_reads', 'session_writes', 'queries')
+        }
+        results[tier] = result
+    return results
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import reverse
+
+from food_app.warmup import warm_up
+
+from .load import _environ
+from .stats import summarize
+
+
+FIRST_REQUEST_PAGES = ('home', 'login', 'register')
+
+
+#the first request to each page in this process, optionally after the warm-up: {name: milliseconds}.
+#Only meaningful in a fresh process, which is what run() gives it.
+def first_requests(warm):
+    result = {}
+    if warm:
+        start = time.perf_counter()
+        warm_up()
+        result['warm_up'] = round((time.perf_counter() - start) * 1000, 3)
+    application = WSGIHandler()
+    for name in FIRST_REQUEST_PAGES:
+        status = []
+        start = time.perf_counter()
+        body = application(_environ('GET', reverse(name)), lambda s, headers, exc_info=None: status.append(s))
+        b''.join(body)
+        body.close()
+        result[name] = round((time.perf_counter() - start) * 1000, 3)
+        if int(status[0].split()[0]) >= 400:
+            raise RuntimeError(f'GET {reverse(name)} returned {status[0]}')
+    return result
+
+
+_CHILD = 'import sys, django; django.setup(); from food_app.benchmarks.startup import main; main(sys.argv[1])'
+
+
+def main(mode):
+    print(json.dumps(first_requests(warm=mode == 'warm')))
+
+
+#Cold vs warm start: every run starts a new interpreter with the current settings and times the first request
+#to a few pages, without and with the warm-up. Runs against the configured database, like the other benchmarks.
+def run(runs=5):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings'))
+    samples = {'cold': [], 'warm': []}
+    for _ in range(runs):
+        for mode, results in samples.items():
+            output = subprocess.run(
+                [sys.executable, '-c', _CHILD, mode],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results.append(json.loads(output.splitlines()[-1]))
+    return {
+        mode: {name: summarize([result[name] / 1000 for result in results]) for name in results[0]}
+        for mode, results in samples.items()
+    }
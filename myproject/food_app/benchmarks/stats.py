@@ -0,0 +1,26 @@
+import math
+import statistics
+
+
+#nearest-rank percentile of an already sorted list.
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+#summarizes latencies given in seconds; the result is in milliseconds, ready to be dumped as JSON.
+def summarize(latencies):
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.fmean(values) * 1000, 3),
+        'min_ms': round(values[0] * 1000, 3),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
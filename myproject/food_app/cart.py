@@ -0,0 +1,100 @@
+from decimal import Decimal
+
+from .menu_cache import get_menu_by_id, get_menu_version
+from .services import InvalidOrder
+
+
+CART_SESSION_KEY = 'food_app_cart'
+MAX_COUNT = 99
+CENT = Decimal('0.01')
+
+
+#The cart of a visitor, kept in the session (a JSON document, so amounts are strings):
+#{'version': the menu version the prices come from, 'lines': {dish id: [name, count, unit price]}, 'total': ...}.
+#Every change is priced from the in-memory menu and moves the total by the difference of that one line,
+#so editing the cart never reads the dishes from the database. The lines are re-priced only when the
+#menu version changes; the order itself is priced again from the database by place_order at checkout.
+class Cart:
+    def __init__(self, session):
+        self.session = session
+        data = session.get(CART_SESSION_KEY) or {}
+        self.version = data.get('version')
+        self.lines = {
+            int(dish_id): (name, count, Decimal(unit_price))
+            for dish_id, (name, count, unit_price) in data.get('lines', {}).items()
+        }
+        self.total = Decimal(data.get('total', '0.00'))
+
+    def __len__(self):
+        return sum(count for _, count, _ in self.lines.values())
+
+    #prices the lines again after a menu change; dishes taken off the menu are dropped.
+    def refresh(self):
+        version = get_menu_version()
+        if self.version == version:
+            return
+        menu = get_menu_by_id()
+        self.lines = {
+            dish_id: (menu[dish_id].name, count, menu[dish_id].net_price)
+            for dish_id, (_, count, _) in self.lines.items()
+            if dish_id in menu
+        }
+        self.total = sum((count * price for _, count, price in self.lines.values()), Decimal('0.00'))
+        self.version = version
+
+    #sets the quantity of a dish; 0 removes it.
+    def set(self, dish_id, count):
+        if not 0 <= count <= MAX_COUNT:
+            raise InvalidOrder('Nieprawidłowa ilość')
+        self.refresh()
+        _, old_count, old_price = self.lines.get(dish_id, (None, 0, Decimal('0.00')))
+        if count == 0:
+            self.lines.pop(dish_id, None)
+            self.total -= old_count * old_price
+            return
+        dish = get_menu_by_id().get(dish_id)
+        if dish is None:
+            raise InvalidOrder('Wybrane danie nie istnieje')
+        self.lines[dish_id] = (dish.name, count, dish.net_price)
+        self.total += count * dish.net_price - old_count * old_price
+
+    def add(self, dish_id, count=1):
+        self.refresh()
+        self.set(dish_id, self.lines.get(dish_id, (None, 0, None))[1] + count)
+
+    def remove(self, dish_id):
+        self.set(dish_id, 0)
+
+    def clear(self):
+        self.lines = {}
+        self.total = Decimal('0.00')
+
+    def save(self):
+        self.session[CART_SESSION_KEY] = {
+            'version': self.version,
+            'lines': {
+                str(dish_id): [name, count, str(price)] for dish_id, (name, count, price) in self.lines.items()
+            },
+            'total': str(self.total.quantize(CENT)),
+        }
+
+    #the {dish_id: count} lines place_order expects.
+    def order_lines(self):
+        return {dish_id: count for dish_id, (_, count, _) in self.lines.items()}
+
+    #the payload returned by the cart endpoints; lines look like Orders.summary.
+    def as_json(self):
+        return {
+            'lines': [
+                {
+                    'dish_id': dish_id,
+                    'name': name,
+                    'count': count,
+                    'unit_price': str(price.quantize(CENT)),
+                    'price': str((count * price).quantize(CENT)),
+                }
+                for dish_id, (name, count, price) in self.lines.items()
+            ],
+            'count': len(self),
+            'total': str(self.total.quantize(CENT)),
+        }
@@ -0,0 +1,178 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .archive import order_archive
+from .models import Orders
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import read_replica
+from .services import user_orders
+
+
+EXPORT_COLUMNS = (
+    'cursor', 'order_id', 'created_at', 'customer_name', 'customer_email', 'customer_phone', 'customer_address',
+    'order_total', 'dish_id', 'dish_name', 'count', 'unit_price', 'price',
+)
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+#the columns holding text typed in by customers or staff, which a spreadsheet must not run as a formula.
+TEXT_COLUMNS = frozenset(('customer_name', 'customer_email', 'customer_phone', 'customer_address', 'dish_name'))
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class InvalidExport(ValueError):
+    pass
+
+
+#prefixes a value a spreadsheet would read as a formula (e.g. "=HYPERLINK(...)") with a quote, so it opens as text.
+def escape_formula(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+#parses "2024-05-01" (midnight) or a full ISO datetime; naive values are in the current time zone.
+def parse_moment(value):
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise InvalidExport(f'Nieprawidłowa data: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+#a file-like object whose write() returns the line, so csv.writer can format one row at a time.
+class _Echo:
+    def write(self, value):
+        return value
+
+
+#Streams the order lines of a created_at range (start inclusive, end exclusive) as CSV or NDJSON, one row per line.
+#The orders are read in (created_at, id) order with .iterator(chunk_size), i.e. a server-side cursor on PostgreSQL,
+#and the lines come from Orders.summary, so memory stays flat and no join is needed for any range.
+#`user` is a User or a user id. Every row carries the cursor of its order: passing the cursor of the last order received in full as `after`
+#resumes the export right behind it.
+#Only the live tables are exported, not the order archive (food_app.archive): without a start the export begins at
+#the archive cutoff, and a range reaching before it is rejected rather than silently missing the archived orders.
+class OrderExport:
+    def __init__(self, start=None, end=None, user=None, after=None, format='csv', chunk_size=2000):
+        if format not in EXPORT_FORMATS:
+            raise InvalidExport(f'Nieznany format: {format}')
+        self.format = format
+        self.chunk_size = chunk_size
+
+        archived_before = order_archive().archived_before()
+        if archived_before is not None:
+            if (start is not None and start < archived_before) or (end is not None and end <= archived_before):
+                raise InvalidExport(
+                    f'Zamówienia sprzed {timezone.localtime(archived_before):%Y-%m-%d %H:%M} są w archiwum '
+                    f'i nie są eksportowane'
+                )
+            start = start or archived_before
+
+        queryset = Orders.objects.all()
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+        if user is not None:
+            queryset = user_orders(queryset, user)
+        self.paginator = KeysetPaginator(queryset, chunk_size, ordering=('created_at', 'id'))
+        try:
+            self.queryset = self.paginator.filter_after(self.paginator.queryset, after)
+        except InvalidCursor:
+            raise InvalidExport('Nieprawidłowy kursor')
+
+    #builds an export from the string values of request.GET: start, end, user (an id), after and format.
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        user = params.get('user') or None
+        if user is not None and not user.isdigit():
+            raise InvalidExport(f'Nieprawidłowy użytkownik: {user}')
+        return cls(
+            start=parse_moment(params.get('start')),
+            end=parse_moment(params.get('end')),
+            user=int(user) if user else None,
+            after=params.get('after') or None,
+            format=params.get('format') or 'csv',
+            **kwargs
+        )
+
+    @property
+    def content_type(self):
+        return EXPORT_FORMATS[self.format]
+
+    @property
+    def filename(self):
+        return f'orders.{self.format}'
+
+    def order_rows(self, order):
+        cursor = self.paginator.encode_cursor(order)
+        for line in order.summary:
+            yield {
+                'cursor': cursor,
+                'order_id': order.pk,
+                'created_at': order.created_at.isoformat(),
+                'customer_name': order.customer_name,
+                'customer_email': order.customer_email,
+                'customer_phone': order.customer_phone,
+                'customer_address': order.customer_address,
+                'order_total': str(order.total_price),
+                'dish_id': line['dish_id'],
+                'dish_name': line['name'],
+                'count': line['count'],
+                'unit_price': line['unit_price'],
+                'price': line['price'],
+            }
+
+    def header(self):
+        if self.format == 'csv':
+            return csv.writer(_Echo()).writerow(EXPORT_COLUMNS)
+        return ''
+
+    def encode(self, row):
+        if self.format == 'csv':
+            return csv.writer(_Echo()).writerow([
+                escape_formula(row[column]) if column in TEXT_COLUMNS else row[column] for column in EXPORT_COLUMNS
+            ])
+        return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    #the queryset pinned to the read replica when one is configured. The database is picked once, up front:
+    #holding read_replica() open across the yields below would leave the flag set in the code consuming the stream.
+    def replica_queryset(self):
+        with read_replica():
+            return self.queryset.using(self.queryset.db)
+
+    #the encoded export, one chunk per row.
+    def __iter__(self):
+        header = self.header()
+        if header:
+            yield header
+        for order in self.replica_queryset().iterator(chunk_size=self.chunk_size):
+            for row in self.order_rows(order):
+                yield self.encode(row)
+
+    #async version for the ASGI views: StreamingHttpResponse would load a sync iterator into memory there.
+    async def __aiter__(self):
+        header = self.header()
+        if header:
+            yield header
+        async for order in self.replica_queryset().aiterator(chunk_size=self.chunk_size):
+            for row in self.order_rows(order):
+                yield self.encode(row)
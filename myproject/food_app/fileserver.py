@@ -0,0 +1,267 @@
+import mimetypes
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+# Serves STATIC_ROOT and MEDIA_ROOT in front of Django, so a file request never goes through the middleware,
+# the URL resolver or a view. FileServer wraps the WSGI application and AsyncFileServer the ASGI one
+# (see myproject.wsgi and myproject.asgi, enabled by SERVE_FILES).
+#
+# - gzip/brotli variants precompressed by collectstatic (food_app.storage) are sent when the client accepts them;
+# - single byte ranges are answered with 206, so video or large downloads can resume;
+# - WSGI servers that support wsgi.file_wrapper (gunicorn, uWSGI) send the file with sendfile();
+# - names that can never change content get "Cache-Control: public, max-age=31536000, immutable": the hashed
+#   static names of the manifest, the dish image variants (stored under the hash of the photo) and media URLs
+#   carrying "?v=" (see Dish.image_src); anything else is revalidated with its ETag / Last-Modified.
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+CHUNK_SIZE = 64 * 1024
+
+_HASHED_STATIC = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+_MEDIA_VARIANT = re.compile(r'/variants/[0-9a-f]{16}/[^/]+$')
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+#a file chosen for a request: what to send (status, headers) and which part of which file.
+class FileResponse:
+    def __init__(self, status, headers, path=None, offset=0, length=0):
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+def _accepts(accept_encoding, coding):
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _etag(st):
+    return '"{:x}-{:x}"'.format(st.st_mtime_ns, st.st_size)
+
+
+def _not_modified(headers, etag, st):
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+#(start, length) of a single "bytes=" range, None for no (or an ignored) range, False if it cannot be satisfied.
+def _byte_range(value, size):
+    match = _RANGE.match(value.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = min(int(end), size)
+        return (size - length, length) if length else False
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end - start + 1
+
+
+#Maps URL prefixes (STATIC_URL, MEDIA_URL) to directories and picks the response for a GET or HEAD;
+#`headers` are the lower-cased request headers. Returns None for paths it does not serve.
+class FileResolver:
+    def __init__(self, roots):
+        self.roots = [(prefix, os.path.realpath(root), kind) for prefix, root, kind in roots if prefix and root]
+
+    @classmethod
+    def from_settings(cls):
+        return cls([
+            ('/' + settings.STATIC_URL.lstrip('/'), settings.STATIC_ROOT, 'static'),
+            ('/' + settings.MEDIA_URL.lstrip('/'), settings.MEDIA_ROOT, 'media'),
+        ])
+
+    def _locate(self, path):
+        for prefix, root, kind in self.roots:
+            if path.startswith(prefix):
+                #PATH_INFO and the ASGI path are already percent-decoded; decoding again would serve "a%20b" for "a%2520b"
+                full = os.path.realpath(os.path.join(root, path[len(prefix):]))
+                #".." or a symlink must not lead out of the root
+                if full.startswith(root + os.sep):
+                    return full, kind
+                return None, kind
+        return None
+
+    def _cache_control(self, path, kind, query):
+        if kind == 'static' and _HASHED_STATIC.search(path):
+            return IMMUTABLE
+        if kind == 'media' and (_MEDIA_VARIANT.search(path) or 'v' in parse_qs(query)):
+            return IMMUTABLE
+        return REVALIDATE
+
+    #the precompressed variant the client accepts, if collectstatic made one: (path, size, coding) or None.
+    def _variant(self, full, headers):
+        for coding, suffix in _ENCODINGS:
+            if _accepts(headers.get('accept-encoding', ''), coding):
+                try:
+                    return full + suffix, os.stat(full + suffix).st_size, coding
+                except OSError:
+                    continue
+        return None
+
+    def resolve(self, method, path, query, headers):
+        located = self._locate(path)
+        if located is None:
+            return None
+        full, kind = located
+        try:
+            st = os.stat(full) if full else None
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return FileResponse(404, [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '9')])
+        if method not in ('GET', 'HEAD'):
+            return FileResponse(405, [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+
+        content_type, _ = mimetypes.guess_type(full)
+        etag = _etag(st)
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+        response_headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control', self._cache_control(path, kind, query)),
+            ('Last-Modified', last_modified),
+            ('Accept-Ranges', 'bytes'),
+        ]
+
+        #ranges are served from the file itself: a byte range of a compressed variant is of no use to a client
+        requested = headers.get('range')
+        if requested and headers.get('if-range', etag) in (etag, last_modified):
+            byte_range = _byte_range(requested, st.st_size)
+            if byte_range is False:
+                return FileResponse(416, response_headers + [
+                    ('ETag', etag), ('Content-Range', f'bytes */{st.st_size}'), ('Content-Length', '0'),
+                ])
+            if byte_range is not None:
+                start, length = byte_range
+                return FileResponse(206, response_headers + [
+                    ('ETag', etag),
+                    ('Content-Range', f'bytes {start}-{start + length - 1}/{st.st_size}'),
+                    ('Content-Length', str(length)),
+                ], full, start, length)
+
+        size = st.st_size
+        if not (content_type or '').startswith(('image/', 'video/', 'audio/', 'font/')):
+            response_headers.append(('Vary', 'Accept-Encoding'))
+            variant = self._variant(full, headers)
+            if variant is not None:
+                full, size, coding = variant
+                response_headers.append(('Content-Encoding', coding))
+                #the variants are different bytes, so they get their own validator
+                etag = etag[:-1] + f'-{coding}"'
+        response_headers.append(('ETag', etag))
+        if _not_modified(headers, etag, st):
+            return FileResponse(304, [(name, value) for name, value in response_headers if name != 'Content-Encoding'])
+        return FileResponse(200, response_headers + [('Content-Length', str(size))], full, 0, size)
+
+
+_REASONS = {
+    200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 404: 'Not Found',
+    405: 'Method Not Allowed', 416: 'Range Not Satisfiable',
+}
+
+
+def _read_range(fh, length):
+    while length > 0:
+        chunk = fh.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            return
+        length -= len(chunk)
+        yield chunk
+
+
+class FileServer:
+    def __init__(self, application, resolver=None):
+        self.application = application
+        self.resolver = resolver or FileResolver.from_settings()
+
+    def __call__(self, environ, start_response):
+        headers = {
+            key[5:].replace('_', '-').lower(): value for key, value in environ.items() if key.startswith('HTTP_')
+        }
+        method = environ.get('REQUEST_METHOD', 'GET')
+        response = self.resolver.resolve(method, environ.get('PATH_INFO', ''), environ.get('QUERY_STRING', ''), headers)
+        if response is None:
+            return self.application(environ, start_response)
+        if response.path is None or method == 'HEAD':
+            start_response(f'{response.status} {_REASONS[response.status]}', response.headers)
+            return [b'Not Found' if response.status == 404 and method != 'HEAD' else b'']
+        fh = open(response.path, 'rb')
+        fh.seek(response.offset)
+        start_response(f'{response.status} {_REASONS[response.status]}', response.headers)
+        #the server's file wrapper sends the file with sendfile(). PEP 3333 does not bound it by Content-Length, and
+        #some wrappers (wsgiref's) read to the end of the file, so a range is sent as a bounded iterator instead.
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and response.status == 200:
+            return file_wrapper(fh, CHUNK_SIZE)
+        return _ClosingIterator(_read_range(fh, response.length), fh)
+
+
+class _ClosingIterator:
+    def __init__(self, iterator, fh):
+        self.iterator = iterator
+        self.fh = fh
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        self.fh.close()
+
+
+class AsyncFileServer:
+    def __init__(self, application, resolver=None):
+        self.application = application
+        self.resolver = resolver or FileResolver.from_settings()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        method = scope['method']
+        response = self.resolver.resolve(method, scope['path'], scope.get('query_string', b'').decode(), headers)
+        if response is None:
+            return await self.application(scope, receive, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(name.lower().encode(), value.encode()) for name, value in response.headers],
+        })
+        if response.path is None or method == 'HEAD':
+            body = b'Not Found' if response.status == 404 and method != 'HEAD' else b''
+            return await send({'type': 'http.response.body', 'body': body})
+        #the file is read in a thread, one chunk at a time, so a slow client does not block the event loop
+        fh = await sync_to_async(open, thread_sensitive=False)(response.path, 'rb')
+        try:
+            fh.seek(response.offset)
+            chunks = _read_range(fh, response.length)
+            read = sync_to_async(lambda: next(chunks, None), thread_sensitive=False)
+            chunk = await read()
+            while chunk is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await read()
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            fh.close()
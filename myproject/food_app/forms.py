@@ -1,4 +1,5 @@
 from django import forms
+from .menu_cache import get_menu
 from .models import Orders, OrdersDish, Dish
 
 
@@ -21,7 +22,7 @@ class OrdersForm(forms.ModelForm):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         #sets the initial value for each field of the "counts" form to "1"
-        self.initial['counts'] = [1] * len(self.fields['dishes'].queryset)
+        self.initial['counts'] = [1] * len(get_menu())
 
     def save(self, commit=True):
         order = super().save(commit=False)
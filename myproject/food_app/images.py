@@ -0,0 +1,86 @@
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+#(name used in Dish.image_variants, Pillow format, extension)
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'webp'),
+    ('jpeg', 'JPEG', 'jpg'),
+)
+
+#what generate_variants raises for a photo it cannot use: a missing or unreadable file, an unsupported format,
+#or one with more pixels than Pillow agrees to decode (twice Image.MAX_IMAGE_PIXELS, a decompression bomb).
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def variant_widths():
+    return tuple(sorted(getattr(settings, 'DISH_IMAGE_WIDTHS', (320, 640, 960))))
+
+
+def variant_formats():
+    return [fmt for fmt in VARIANT_FORMATS if fmt[0] != 'webp' or features.check('webp')]
+
+
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()[:16]
+
+
+#the variants live next to the original, in a directory named after the hash of its content,
+#so an unchanged photo never gets processed twice and a replaced one never reuses stale files.
+def variant_name(image_name, digest, width, extension):
+    return posixpath.join(posixpath.dirname(image_name), 'variants', digest, f'{width}w.{extension}')
+
+
+def variants_are_current(dish):
+    variants = dish.image_variants or {}
+    return bool(dish.image) and variants.get('source') == dish.image.name and bool(variants.get('hash'))
+
+
+#generates resized WebP/JPEG variants of dish.image and returns the description stored in Dish.image_variants:
+#{'source': <original name>, 'hash': <content hash>, 'webp': [[width, name], ...], 'jpeg': [[width, name], ...]}
+#Photos are never upscaled; a photo narrower than the smallest width gets a single variant at its own width.
+def generate_variants(dish):
+    if not dish.image:
+        return {}
+    storage = dish.image.storage
+    digest = content_hash(dish.image)
+
+    dish.image.open('rb')
+    try:
+        original = ImageOps.exif_transpose(Image.open(dish.image))
+        original.load()
+    finally:
+        dish.image.close()
+    if original.mode != 'RGB':
+        original = original.convert('RGB')
+
+    widths = [width for width in variant_widths() if width < original.width] or [original.width]
+    variants = {'source': dish.image.name, 'hash': digest}
+    for key, pillow_format, extension in variant_formats():
+        variants[key] = []
+        for width in widths:
+            name = variant_name(dish.image.name, digest, width, extension)
+            if not storage.exists(name):
+                height = max(1, round(original.height * width / original.width))
+                resized = original.resize((width, height), Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, pillow_format, quality=80, optimize=True)
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            variants[key].append([width, name])
+    return variants
+
+
+def srcset(storage, variants):
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in variants)
@@ -0,0 +1,45 @@
+from django.core.mail import send_mail
+from django.db.models import Exists, IntegerField, OuterRef
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.template.loader import render_to_string
+
+from .models import Orders, OrdersDish, Task
+from .popularity import record_order_lines
+from .tasks import task
+
+
+# The work that follows a placed order, run by the background worker (see food_app.tasks).
+
+
+#adds the lines of a placed order to the popularity counters.
+#Atomic, so the counters are bumped exactly once even when the task is retried.
+@task()
+def record_order_popularity(order_id):
+    record_order_lines(list(OrdersDish.objects.filter(orders_id=order_id).select_related('orders')))
+
+
+#the order lines already added to the popularity counters: all but those of the orders whose
+#record_order_popularity task is still queued or running, which that task will add. One statement,
+#so the lines and the tasks are read from the same snapshot.
+def counted_order_lines():
+    pending = Task.objects.filter(
+        name=record_order_popularity.task_name, status__in=(Task.QUEUED, Task.RUNNING)
+    ).annotate(
+        order_id=Cast(KeyTextTransform('order_id', 'kwargs'), IntegerField())
+    ).filter(order_id=OuterRef('orders_id'))
+    return OrdersDish.objects.exclude(Exists(pending))
+
+
+#e-mails the order summary to the customer. Not atomic: a retry after a lost worker may send it twice.
+@task(atomic=False)
+def send_order_confirmation(order_id):
+    order = Orders.objects.filter(pk=order_id).first()
+    if order is None or not order.customer_email:
+        return
+    send_mail(
+        f'Potwierdzenie zamówienia nr {order.pk}',
+        render_to_string('food_app/emails/order_confirmation.txt', {'order': order}),
+        None,
+        [order.customer_email],
+    )
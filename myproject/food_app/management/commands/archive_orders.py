@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from food_app.archive import ArchiveNotRolledUp, archive_orders, archive_root, retention_days
+from food_app.popularity import window_days
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the orders older than the retention window (ORDER_RETENTION_DAYS) from the database '
+        'into the compressed monthly archive under ORDER_ARCHIVE_DIR.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive the orders older than this many days.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders moved per transaction and segment.')
+
+    def handle(self, *args, **options):
+        days = retention_days() if options['days'] is None else options['days']
+        #the daily popularity buckets are checked against the live order lines of the window
+        if days < window_days():
+            raise CommandError(f'--days must cover the popularity window ({window_days()} days).')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        try:
+            archived, segments = archive_orders(
+                before=timezone.now() - timedelta(days=days), batch_size=options['batch_size']
+            )
+        except ArchiveNotRolledUp as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f'Archived {archived} orders in {len(segments)} segments under {archive_root()}.')
@@ -0,0 +1,163 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from food_app.benchmarks import fixtures, load, logins, micro, plans, sessions, startup
+from food_app.models import OrdersDish
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the ordering flow: optionally generates a synthetic dataset, then runs the view '
+        'micro-benchmarks and/or the concurrent load driver and saves the results as JSON. '
+        'It writes to the configured database, so never point it at production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', action='store_true', help='Generate a synthetic dataset first.')
+        parser.add_argument('--dishes', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders-per-user', type=int, default=50)
+        parser.add_argument('--max-lines', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--micro', action='store_true', help='Run the view micro-benchmarks.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--load', action='store_true', help='Run the concurrent load driver.')
+        parser.add_argument('--plans', action='store_true', help='EXPLAIN the hot queries and check their indexes.')
+        parser.add_argument('--startup', action='store_true', help='Time the first requests of cold and warm processes.')
+        parser.add_argument('--startup-runs', type=int, default=5)
+        parser.add_argument(
+            '--sessions', action='store_true', help='Count the session queries of the login/order flow per session tier.'
+        )
+        parser.add_argument('--session-rounds', type=int, default=20)
+        parser.add_argument('--logins', action='store_true', help='Measure logins per second per core.')
+        parser.add_argument('--login-attempts', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--output', help='Where to save the JSON results (default: benchmark_results/).')
+        parser.add_argument('--compare', help='A previous JSON result to compare the p95 latencies with.')
+
+    def handle(self, *args, **options):
+        result = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'commit': _git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+        }
+        if options['generate']:
+            self.stdout.write('Generating dataset...')
+            result['dataset'] = fixtures.generate(
+                dishes=options['dishes'], users=options['users'], orders_per_user=options['orders_per_user'],
+                max_lines=options['max_lines'], seed=options['seed'],
+            )
+            self.stdout.write(json.dumps(result['dataset']))
+
+        run_all = not (
+            options['micro'] or options['load'] or options['plans'] or options['startup'] or options['sessions']
+            or options['logins']
+        )
+        try:
+            if options['startup']:
+                self.stdout.write('Starting cold and warm processes...')
+                result['startup'] = startup.run(runs=options['startup_runs'])
+            if options['sessions']:
+                self.stdout.write('Running the login/order flow with every session tier...')
+                result['sessions'] = sessions.run(rounds=options['session_rounds'])
+            if options['logins']:
+                self.stdout.write('Logging in...')
+                result['logins'] = logins.run(attempts=options['login_attempts'])
+            if options['plans'] or run_all:
+                self.stdout.write('Checking query plans...')
+                result['plans'] = self._plans()
+            if options['micro'] or run_all:
+                self.stdout.write('Running micro-benchmarks...')
+                result['micro'] = micro.run(iterations=options['iterations'])
+            if options['load'] or run_all:
+                self.stdout.write('Running load driver...')
+                result['load'] = load.run(
+                    concurrency=options['concurrency'], requests=options['requests'], seed=options['seed']
+                )
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmark_results',
+            '{}-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S'), result['meta']['commit'] or 'local'),
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f'Results saved to {output}'))
+
+        self._report(result)
+        if options['compare']:
+            with open(options['compare']) as fh:
+                self._compare(json.load(fh), result)
+
+    def _plans(self):
+        busiest = (
+            OrdersDish.objects.values('user').annotate(orders=Count('orders', distinct=True)).order_by('-orders').first()
+        )
+        if busiest is None:
+            raise RuntimeError('No orders to explain; generate a dataset first.')
+        return plans.check_plans(busiest['user'])
+
+    def _report(self, result):
+        for mode, pages in result.get('startup', {}).items():
+            timings = '  '.join(f"{name} {stats['p50_ms']:.2f} ms" for name, stats in pages.items())
+            self.stdout.write(f'{mode} start: {timings}')
+        for tier, steps in result.get('sessions', {}).items():
+            flow = steps['flow']
+            self.stdout.write(
+                f"sessions {tier:10} {flow['session_writes']} writes  {flow['session_reads']} reads  "
+                f"{flow['queries']} queries per login/order flow"
+            )
+        for name, stats in result.get('logins', {}).items():
+            self.stdout.write(f"{name:20} {stats['per_core_second']} per second per core")
+        for name, check in result.get('plans', {}).items():
+            if check['missing']:
+                self.stdout.write(self.style.WARNING(f"{name:20} does not use {', '.join(check['missing'])}"))
+                self.stdout.write(check['plan'])
+            else:
+                self.stdout.write(f"{name:20} uses {', '.join(check['expected'])}")
+        for name, stats in result.get('micro', {}).items():
+            self.stdout.write(
+                f"{name:20} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                f"p99 {stats['p99_ms']:8.2f} ms  {stats['queries_per_request']} queries  "
+                f"{stats['bytes_per_response']} bytes"
+            )
+        if 'load' in result:
+            stats = result['load']
+            self.stdout.write(
+                f"load x{stats['concurrency']}: {stats['throughput_rps']} req/s  p50 {stats['p50_ms']} ms  "
+                f"p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms  {stats['errors']} errors"
+            )
+
+    def _compare(self, before, after):
+        pairs = [('micro ' + name, before.get('micro', {}).get(name), stats)
+                 for name, stats in after.get('micro', {}).items()]
+        pairs.append(('load', before.get('load'), after.get('load')))
+        for name, old, new in pairs:
+            if old and new and old.get('p95_ms') and new.get('p95_ms'):
+                change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+                self.stdout.write(f"{name:26} p95 {old['p95_ms']:8.2f} -> {new['p95_ms']:8.2f} ms ({change:+.1f}%)")
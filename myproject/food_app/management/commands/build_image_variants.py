@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from food_app.images import IMAGE_ERRORS, generate_variants, variants_are_current
+from food_app.menu_cache import bump_menu_version
+from food_app.models import Dish
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized WebP/JPEG variants for dishes whose photo has none yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate the variants description of every dish, even when it looks current.',
+        )
+
+    def handle(self, *args, **options):
+        built = skipped = failed = 0
+        for dish in Dish.objects.exclude(image='').only('pk', 'image', 'image_variants').iterator(chunk_size=200):
+            if not options['force'] and variants_are_current(dish):
+                skipped += 1
+                continue
+            try:
+                variants = generate_variants(dish)
+            except IMAGE_ERRORS as exc:
+                failed += 1
+                self.stderr.write(f'Dish {dish.pk} ({dish.image.name}): {exc}')
+                continue
+            Dish.objects.filter(pk=dish.pk).update(image_variants=variants)
+            built += 1
+
+        if built:
+            bump_menu_version()
+        self.stdout.write(f'Built variants for {built} dishes, {skipped} already current, {failed} failed.')
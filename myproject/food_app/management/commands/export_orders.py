@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from food_app.exports import EXPORT_FORMATS, InvalidExport, OrderExport, parse_moment
+
+
+class Command(BaseCommand):
+    help = 'Streams the orders with their lines as CSV or NDJSON, to stdout or to a file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument(
+            '--start', help='Only orders created at or after this date / ISO datetime (default: the archive cutoff).'
+        )
+        parser.add_argument('--end', help='Only orders created before this date / ISO datetime.')
+        parser.add_argument('--user', help='Only orders with lines of this username.')
+        parser.add_argument('--after', help='Resume behind the order with this cursor (the "cursor" column).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Orders fetched per database round trip.')
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Unknown user: {options["user"]}')
+        try:
+            export = OrderExport(
+                start=parse_moment(options['start']),
+                end=parse_moment(options['end']),
+                user=user,
+                after=options['after'],
+                format=options['format'],
+                chunk_size=options['chunk_size'],
+            )
+        except InvalidExport as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(export)
+        else:
+            for chunk in export:
+                self.stdout.write(chunk, ending='')
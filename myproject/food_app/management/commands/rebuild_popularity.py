@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from food_app import popularity
+from food_app.jobs import counted_order_lines
+from food_app.models import DishDailyPopularity, DishPopularity
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the dish popularity counters from the order lines and checks them against the live aggregate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the stored counters with the live aggregate, without rebuilding them.',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.localdate() - timedelta(days=popularity.window_days() - 1)
+
+        #the orders whose record_order_popularity task has not run yet are left to that task, and no task can
+        #change the counters while they are rebuilt and compared
+        with transaction.atomic():
+            popularity.lock_counters()
+            lines = counted_order_lines()
+            if not options['check']:
+                totals = popularity.live_totals(lines)
+                daily = popularity.live_daily(since, lines)
+                DishPopularity.objects.all().delete()
+                DishPopularity.objects.bulk_create(
+                    [DishPopularity(dish_id=dish_id, order_count=c, units=u) for dish_id, (c, u) in totals.items()],
+                    batch_size=1000,
+                )
+                #buckets older than the window are dropped, which keeps the daily table small.
+                DishDailyPopularity.objects.all().delete()
+                DishDailyPopularity.objects.bulk_create(
+                    [
+                        DishDailyPopularity(dish_id=dish_id, day=day, order_count=c, units=u)
+                        for (dish_id, day), (c, u) in daily.items()
+                    ],
+                    batch_size=1000,
+                )
+                self.stdout.write(f'Rebuilt counters for {len(totals)} dishes and {len(daily)} daily buckets.')
+
+            mismatches = self._compare('total', popularity.stored_totals(), popularity.live_totals(lines))
+            mismatches += self._compare('daily', popularity.stored_daily(since), popularity.live_daily(since, lines))
+        if mismatches:
+            raise CommandError(f'{mismatches} popularity counters differ from the live aggregate.')
+        self.stdout.write(self.style.SUCCESS('Popularity counters match the live aggregate.'))
+
+    def _compare(self, label, stored, live):
+        mismatches = 0
+        for key in sorted(set(stored) | set(live), key=str):
+            if stored.get(key) != live.get(key):
+                mismatches += 1
+                self.stderr.write(f'{label} {key}: stored {stored.get(key)}, live {live.get(key)}')
+        return mismatches
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from food_app import reporting
+from food_app.models import Orders
+
+
+class Command(BaseCommand):
+    help = 'Adds the orders created since the last run to the hourly and daily sales rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop the rollups and the watermark and roll up every live order again '
+                 '(the rollups before the archive horizon are kept).',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the stored rollups with the raw aggregates between the archive horizon and the watermark.',
+        )
+        parser.add_argument('--batch-hours', type=int, default=24, help='Hours rolled up per transaction.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            if options['rebuild']:
+                reporting.reset_rollups()
+            batches = reporting.roll_up(batch=timedelta(hours=options['batch_hours']))
+            if batches:
+                self.stdout.write(f'Rolled up {batches[0][0]} - {batches[-1][1]} in {len(batches)} batches.')
+            else:
+                self.stdout.write('Nothing new to roll up.')
+
+        until = reporting.processed_until()
+        first = Orders.objects.aggregate(first=Min('created_at'))['first']
+        if until is None or first is None:
+            self.stdout.write(self.style.SUCCESS('No rollups yet.'))
+            return
+        mismatches = 0
+        #both sides only cover the orders before the watermark, so the last day may be partial in both.
+        #The buckets before the archive horizon are final: their orders are in the order archive.
+        horizon = reporting.archive_horizon()
+        for period, start in (('hour', reporting.floor_hour(first)), ('day', reporting.day_start(timezone.localdate(first)))):
+            if horizon is not None and horizon > start:
+                start = horizon
+            mismatches += self._compare(
+                f'{period} totals', reporting.stored_totals(start, until, period),
+                reporting.raw_totals(start, until, period),
+            )
+            mismatches += self._compare(
+                f'{period} dishes', reporting.stored_dish_totals(start, until, period),
+                reporting.raw_dish_totals(start, until, period),
+            )
+        if mismatches:
+            raise CommandError(f'{mismatches} rollups differ from the raw aggregates.')
+        self.stdout.write(self.style.SUCCESS(f'Rollups match the raw aggregates up to {until}.'))
+
+    def _compare(self, label, stored, live):
+        mismatches = 0
+        for key in sorted(set(stored) | set(live), key=str):
+            if stored.get(key) != live.get(key):
+                mismatches += 1
+                self.stderr.write(f'{label} {key}: stored {stored.get(key)}, live {live.get(key)}')
+        return mismatches
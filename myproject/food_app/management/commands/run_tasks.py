@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from food_app.tasks import Worker, purge_finished
+
+
+class Command(BaseCommand):
+    help = 'Runs the background tasks queued in the database (order e-mails, popularity counters).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads per process.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Worker processes, each with --threads threads (forked, so Unix only).',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no task is due.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due instead of waiting.')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['processes'] < 1:
+            raise CommandError('--threads and --processes must be at least 1.')
+        purged = purge_finished()
+        if purged:
+            self.stdout.write(f'Purged {purged} finished tasks.')
+
+        if options['processes'] == 1:
+            processed = self._work(options)
+            self.stdout.write(f'Processed {processed} tasks.')
+            return
+
+        #the children must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=self._work, args=(options,)) for _ in range(options['processes'])]
+        for child in children:
+            child.start()
+
+        def stop_children(*args):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, stop_children)
+        signal.signal(signal.SIGINT, stop_children)
+        for child in children:
+            child.join()
+        self.stdout.write(f'{len(children)} worker processes stopped.')
+
+    #SIGTERM / SIGINT stop the worker after the tasks it is running, so a deploy does not cut a task in half.
+    def _work(self, options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'], burst=options['burst'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        return worker.run()
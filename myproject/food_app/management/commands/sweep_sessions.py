@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from food_app.sessions import sweep_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the expired sessions from the database in small batches '
+        '(a batched replacement for clearsessions, meant to be run from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per statement.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between the batches.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        deleted = sweep_expired_sessions(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(f'Deleted {deleted} expired sessions.')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from food_app.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Parses every food_app template, loads the URLconf and primes the shared menu cache. '
+        'Run it in a deploy step to fail on a broken template before any worker starts; the workers warm '
+        'their own in-memory caches when they start (WARM_UP_ON_START, ASGI lifespan).'
+    )
+
+    def handle(self, *args, **options):
+        timings = warm_up()
+        self.stdout.write(
+            f"{timings['templates']} templates in {timings['templates_ms']} ms, "
+            f"URLconf in {timings['urls_ms']} ms, menu in {timings['menu_ms']} ms."
+        )
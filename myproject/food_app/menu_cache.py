@@ -0,0 +1,133 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Dish
+
+
+MENU_VERSION_KEY = 'food_app:menu:version'
+MENU_KEY = 'food_app:menu:{}'
+MENU_MODIFIED_KEY = 'food_app:menu:modified'
+
+
+#A small thread-safe LRU kept in every worker process, in front of the shared Django cache.
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_menus = LRUCache(maxsize=getattr(settings, 'MENU_CACHE_LOCAL_SIZE', 4))
+_local_menu_maps = LRUCache(maxsize=getattr(settings, 'MENU_CACHE_LOCAL_SIZE', 4))
+
+
+#The menu version is a random token kept in the shared cache.
+#A token (instead of a counter) cannot collide with an older version when the key is evicted.
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+async def aget_menu_version():
+    version = await cache.aget(MENU_VERSION_KEY)
+    if version is None:
+        await cache.aadd(MENU_VERSION_KEY, uuid.uuid4().hex, None)
+        version = await cache.aget(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    cache.set_many({MENU_VERSION_KEY: uuid.uuid4().hex, MENU_MODIFIED_KEY: timezone.now()}, None)
+
+
+#when the menu last changed, for the Last-Modified header. It is set together with the version;
+#after an eviction it is recomputed once from the newest Dish.updated_at (a deleted dish leaves no trace there,
+#but the ETag, which follows the version, still changes).
+def get_menu_modified():
+    modified = cache.get(MENU_MODIFIED_KEY)
+    if modified is None:
+        modified = Dish.objects.using(DEFAULT_DB_ALIAS).aggregate(modified=Max('updated_at'))['modified']
+        if modified is not None:
+            cache.add(MENU_MODIFIED_KEY, modified, None)
+    return modified
+
+
+async def aget_menu_modified():
+    modified = await cache.aget(MENU_MODIFIED_KEY)
+    if modified is None:
+        modified = (await Dish.objects.using(DEFAULT_DB_ALIAS).aaggregate(modified=Max('updated_at')))['modified']
+        if modified is not None:
+            await cache.aadd(MENU_MODIFIED_KEY, modified, None)
+    return modified
+
+
+#returns the whole menu as a tuple of Dish instances.
+#The per-process LRU is checked first, then the shared cache, and only then the database.
+#The returned dishes are shared between requests, so callers must not modify them.
+#The menu is always read from the primary database: a lagging replica would get cached under the new version.
+def get_menu():
+    version = get_menu_version()
+    menu = _local_menus.get(version)
+    if menu is None:
+        menu = cache.get(MENU_KEY.format(version))
+        if menu is None:
+            menu = tuple(Dish.objects.using(DEFAULT_DB_ALIAS).order_by('pk'))
+            cache.set(MENU_KEY.format(version), menu, getattr(settings, 'MENU_CACHE_TIMEOUT', None))
+        _local_menus.set(version, menu)
+    return menu
+
+
+async def aget_menu():
+    version = await aget_menu_version()
+    menu = _local_menus.get(version)
+    if menu is None:
+        menu = await cache.aget(MENU_KEY.format(version))
+        if menu is None:
+            menu = tuple([dish async for dish in Dish.objects.using(DEFAULT_DB_ALIAS).order_by('pk')])
+            await cache.aset(MENU_KEY.format(version), menu, getattr(settings, 'MENU_CACHE_TIMEOUT', None))
+        _local_menus.set(version, menu)
+    return menu
+
+
+#the menu as {dish id: Dish}, built once per menu version and process.
+def get_menu_by_id():
+    version = get_menu_version()
+    menu = _local_menu_maps.get(version)
+    if menu is None:
+        menu = {dish.pk: dish for dish in get_menu()}
+        _local_menu_maps.set(version, menu)
+    return menu
+
+
+def clear_local_menu_cache():
+    _local_menus.clear()
+    _local_menu_maps.clear()
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+#The address of the client that sent the request. Behind TRUSTED_PROXY_COUNT reverse proxies REMOTE_ADDR is
+#the nearest proxy's, and each proxy appends the address it was connected from to X-Forwarded-For, so the client
+#is the entry that many places from the right. Anything left of it was sent by the client and is not trusted.
+#A request with fewer entries than proxies did not come through all of them and is taken at its REMOTE_ADDR.
+def client_ip(request):
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        forwarded = [address for address in forwarded if address]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+#Wraps every statement executed while a request is handled (connection.execute_wrapper)
+#and records how many there were, how long they took and how often the same SQL was repeated.
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.templates[sql] += 1
+            self.statements[sql, repr(params)] += 1
+
+    #the same statement with the same parameters, run more than once.
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+    #the same SQL run again with different parameters: the N+1 signature.
+    @property
+    def repeated(self):
+        return sum(n - 1 for n in self.templates.values() if n > 1)
+
+
+class ViewStats:
+    FIELDS = ('requests', 'seconds', 'max_seconds', 'db_queries', 'db_seconds', 'duplicate_queries',
+              'repeated_queries', 'budget_exceeded')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def record(self, view, elapsed, recorder, over_budget):
+        with self._lock:
+            stats = self._views[view]
+            stats['requests'] += 1
+            stats['seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+            stats['db_queries'] += recorder.count
+            stats['db_seconds'] += recorder.time
+            stats['duplicate_queries'] += recorder.duplicates
+            stats['repeated_queries'] += recorder.repeated
+            stats['budget_exceeded'] += int(over_budget)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(stats) for view, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+def _view_name(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return (view_class or view_func).__name__
+
+
+#Records the wall time, DB query count, DB time and repeated SQL of every request, per view.
+#Views declare their budget as a `query_budget` class attribute; a request that runs more queries
+#is logged, and raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is on (the test runner turns it on).
+#In DEBUG the numbers are also sent back as X-View-* / X-DB-* response headers.
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with self._recording(recorder):
+            response = self.get_response(request)
+        return self._finish(request, response, recorder, time.perf_counter() - start)
+
+    #under ASGI the middleware stays async, so async views are not pushed through a sync adapter.
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with self._recording(recorder):
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder, time.perf_counter() - start)
+
+    @contextmanager
+    def _recording(self, recorder):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            yield
+
+    def _finish(self, request, response, recorder, elapsed):
+        view = getattr(request, '_profiled_view', None)
+        if view is None:
+            return response
+        name, budget = view
+        over_budget = budget is not None and recorder.count > budget
+        view_stats.record(name, elapsed, recorder, over_budget)
+
+        if settings.DEBUG:
+            response['X-View-Name'] = name
+            response['X-View-Time-Ms'] = f'{elapsed * 1000:.1f}'
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f'{recorder.time * 1000:.1f}'
+            response['X-DB-Duplicate-Queries'] = str(recorder.duplicates)
+            response['X-DB-Repeated-Queries'] = str(recorder.repeated)
+
+        if over_budget:
+            message = f'{name} ran {recorder.count} queries, its budget is {budget} ({request.method} {request.path})'
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request._profiled_view = (_view_name(view_func), getattr(view_class, 'query_budget', None))
+
+
+def prometheus_text(snapshot):
+    metrics = (
+        ('requests', 'food_app_view_requests_total', 'counter', 'Requests handled by the view.'),
+        ('seconds', 'food_app_view_seconds_total', 'counter', 'Wall time spent in the view.'),
+        ('max_seconds', 'food_app_view_seconds_max', 'gauge', 'Slowest request handled by the view.'),
+        ('db_queries', 'food_app_view_db_queries_total', 'counter', 'Database queries run by the view.'),
+        ('db_seconds', 'food_app_view_db_seconds_total', 'counter', 'Time spent in database queries.'),
+        ('duplicate_queries', 'food_app_view_duplicate_queries_total', 'counter',
+         'Identical queries (same SQL and parameters) run more than once in a request.'),
+        ('repeated_queries', 'food_app_view_repeated_queries_total', 'counter',
+         'Queries with the same SQL run more than once in a request (N+1 signature).'),
+        ('budget_exceeded', 'food_app_view_budget_exceeded_total', 'counter',
+         'Requests that ran more queries than the view query_budget.'),
+    )
+    lines = []
+    for field, metric, kind, description in metrics:
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for view in sorted(snapshot):
+            lines.append(f'{metric}{{view="{view}"}} {snapshot[view][field]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+from django.db import migrations, router
+
+
+# Migration operations for the large order tables. A migration using them must set atomic = False.
+
+
+#AddIndex that builds the index with CREATE INDEX CONCURRENTLY on PostgreSQL, so the table stays writable
+#while the index is built; other databases (SQLite in development and the tests) get a plain CREATE INDEX.
+#The migration state is the same as AddIndex's, so makemigrations sees no difference.
+class AddIndexConcurrently(migrations.AddIndex):
+    atomic = False
+
+    def _postgres_operation(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+
+        return PostgresAddIndexConcurrently(self.model_name, self.index)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        operation = self._postgres_operation(schema_editor) or super()
+        operation.database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        operation = self._postgres_operation(schema_editor) or super()
+        operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return 'Concurrently create index %s on field(s) %s of model %s' % (
+            self.index.name, ', '.join(self.index.fields), self.model_name,
+        )
+
+
+#AddConstraint for a CheckConstraint that on PostgreSQL is added NOT VALID, which only takes a short lock and checks
+#the rows written from then on, and then validated with a separate statement that scans the existing rows without
+#blocking writes. Other databases add it like AddConstraint does.
+class AddCheckConstraintNotValid(migrations.AddConstraint):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        check = self.constraint._get_check_sql(model, schema_editor)
+        schema_editor.execute(
+            str(schema_editor._create_check_sql(model, self.constraint.name, check)) + ' NOT VALID'
+        )
+        schema_editor.execute('ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(
+            schema_editor.quote_name(model._meta.db_table), schema_editor.quote_name(self.constraint.name),
+        ))
+
+
+#CREATE EXTENSION that only runs when the extension is not installed yet: creating one takes a superuser (or, for a
+#trusted extension on PostgreSQL 13+, CREATE on the database), so a database where a superuser created it beforehand
+#migrates with the application's own user. Migrating back leaves the extension in place, since other objects in the
+#database may use it. Other databases skip it.
+class EnsureExtension(migrations.operations.base.Operation):
+    reversible = True
+
+    def __init__(self, name):
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql' or not router.allow_migrate(connection.alias, app_label):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_extension WHERE extname = %s', [self.name])
+            if cursor.fetchone():
+                return
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS {}'.format(schema_editor.quote_name(self.name)))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        pass
+
+    def describe(self):
+        return 'Create extension %s if it is not installed' % self.name
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:10
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dish',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=24)),
+                ('description', models.TextField()),
+                ('net_price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('image', models.ImageField(upload_to='')),
+            ],
+            options={
+                'db_table': 'food_app_dish',
+            },
+        ),
+        migrations.CreateModel(
+            name='Orders',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=24)),
+                ('customer_email', models.EmailField(max_length=254)),
+                ('customer_phone', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer_address', models.CharField(max_length=32)),
+                ('total_price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8)),
+            ],
+            options={
+                'db_table': 'food_app_orders',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrdersDish',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food_app.dish')),
+                ('orders', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food_app.orders')),
+                ('user', models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'food_app_orders_dish',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+from food_app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    #the indexes are built concurrently on PostgreSQL, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('food_app', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='orders',
+            index=models.Index(fields=['created_at', 'id'], name='orders_created_at_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ordersdish',
+            index=models.Index(fields=['user', 'orders'], name='ordersdish_user_orders_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_app', '0002_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishPopularity',
+            fields=[
+                ('dish', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='food_app.dish')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'food_app_dish_popularity',
+            },
+        ),
+        migrations.CreateModel(
+            name='DishDailyPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food_app.dish')),
+            ],
+            options={
+                'db_table': 'food_app_dish_daily_popularity',
+                'indexes': [models.Index(fields=['day', 'dish'], name='dish_daily_popularity_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dishdailypopularity',
+            constraint=models.UniqueConstraint(fields=('dish', 'day'), name='dish_daily_popularity_unique'),
+        ),
+    ]
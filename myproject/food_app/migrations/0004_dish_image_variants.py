@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_app', '0003_dish_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
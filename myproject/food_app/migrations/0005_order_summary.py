@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:24
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+#fills Orders.summary for the orders placed before it existed, from the prices stored on their lines.
+def backfill_summaries(apps, schema_editor):
+    Orders = apps.get_model('food_app', 'Orders')
+    OrdersDish = apps.get_model('food_app', 'OrdersDish')
+    cent = Decimal('0.01')
+
+    batch = []
+    for order in Orders.objects.only('pk').iterator(chunk_size=500):
+        lines = OrdersDish.objects.filter(orders_id=order.pk).select_related('dish').order_by('pk')
+        order.summary = [
+            {
+                'dish_id': line.dish_id,
+                'name': line.dish.name,
+                'count': line.count,
+                'unit_price': str((line.price / (line.count or 1)).quantize(cent)),
+                'price': str(line.price.quantize(cent)),
+            }
+            for line in lines
+        ]
+        batch.append(order)
+        if len(batch) >= 500:
+            Orders.objects.bulk_update(batch, ['summary'])
+            batch = []
+    if batch:
+        Orders.objects.bulk_update(batch, ['summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_app', '0004_dish_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='summary',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+from food_app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    #the indexes are built concurrently on PostgreSQL, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('food_app', '0005_order_summary'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='orders',
+            index=models.Index(fields=['customer_email'], name='orders_customer_email_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='orders',
+            index=models.Index(fields=['customer_name'], name='orders_customer_name_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='orders',
+            index=models.Index(fields=['customer_phone'], name='orders_customer_phone_idx'),
+        ),
+    ]
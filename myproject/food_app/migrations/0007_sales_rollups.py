@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:30
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_app', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Godzina'), ('day', 'Dzień')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+            ],
+            options={
+                'db_table': 'food_app_dish_sales_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('processed_until', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'food_app_rollup_watermark',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Godzina'), ('day', 'Dzień')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+            ],
+            options={
+                'db_table': 'food_app_sales_rollup',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'start'), name='sales_rollup_unique'),
+        ),
+        migrations.AddField(
+            model_name='dishsalesrollup',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food_app.dish'),
+        ),
+        migrations.AddConstraint(
+            model_name='dishsalesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'start', 'dish'), name='dish_sales_rollup_unique'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:40
+
+from django.db import IntegrityError, migrations, models
+
+from food_app.migration_operations import AddCheckConstraintNotValid, AddIndexConcurrently
+
+
+#the old order form accepted any quantity. Lines of zero or fewer dishes are not deleted here: they belong to
+#placed orders, their totals, the popularity counters and the sales rollups, so they have to be fixed by hand.
+def check_empty_lines(apps, schema_editor):
+    OrdersDish = apps.get_model('food_app', 'OrdersDish')
+    empty = OrdersDish.objects.filter(count__lt=1).order_by('pk')
+    total = empty.count()
+    if total:
+        rows = ', '.join(
+            f'line {pk} (order {orders_id}, count {count})'
+            for pk, orders_id, count in empty.values_list('pk', 'orders_id', 'count')[:50]
+        )
+        raise IntegrityError(
+            f'food_app_orders_dish has {total} order lines with a count below 1, which the ordersdish_count_positive '
+            f'constraint would reject (first 50: {rows}). Correct or remove them, together with the totals of '
+            f'their orders, before running this migration again.'
+        )
+
+
+class Migration(migrations.Migration):
+    #the index is built concurrently on PostgreSQL, which cannot run inside a transaction, and the constraint is
+    #validated in a transaction of its own
+    atomic = False
+
+    dependencies = [
+        ('food_app', '0009_task_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_empty_lines, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='ordersdish',
+            index=models.Index(fields=['dish', 'count'], name='ordersdish_dish_count_idx'),
+        ),
+        AddCheckConstraintNotValid(
+            model_name='ordersdish',
+            constraint=models.CheckConstraint(check=models.Q(('count__gt', 0)), name='ordersdish_count_positive'),
+        ),
+    ]
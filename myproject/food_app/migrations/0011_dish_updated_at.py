@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_app', '0010_order_line_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:05
+
+from django.db import migrations
+
+from food_app.migration_operations import EnsureExtension
+
+
+# The indexes behind food_app.search on PostgreSQL; other databases use the in-memory index and skip them.
+# The tsvector expression must stay identical to the one in search._postgres_search, or the index is not used.
+#
+# Prerequisite: the trigram index needs the pg_trgm extension. EnsureExtension only creates it when it is not
+# installed yet, which takes a superuser (or, from PostgreSQL 13, a user with CREATE on the database, pg_trgm being
+# a trusted extension). When the application user has neither, have a superuser run
+# "CREATE EXTENSION IF NOT EXISTS pg_trgm;" in the database before migrating.
+#
+# The indexes are built with CREATE INDEX CONCURRENTLY, so the dish table stays writable meanwhile; that cannot
+# run inside a transaction, hence atomic = False. A build that is interrupted leaves an INVALID index behind,
+# which IF NOT EXISTS would keep: drop it (DROP INDEX CONCURRENTLY ...) before running the migration again.
+CREATE_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS dish_search_idx ON food_app_dish "
+    "USING GIN (to_tsvector('simple', name || ' ' || description))",
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS dish_name_trgm_idx ON food_app_dish USING GIN (name gin_trgm_ops)',
+]
+DROP_INDEXES = [
+    'DROP INDEX CONCURRENTLY IF EXISTS dish_name_trgm_idx',
+    'DROP INDEX CONCURRENTLY IF EXISTS dish_search_idx',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('food_app', '0011_dish_updated_at'),
+    ]
+
+    operations = [
+        EnsureExtension('pg_trgm'),
+        migrations.RunPython(_run(CREATE_INDEXES), _run(DROP_INDEXES)),
+    ]
@@ -1,17 +1,43 @@
 from decimal import Decimal
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .images import srcset
+
 
 class Dish(models.Model):
     name = models.CharField(max_length=24)
     description = models.TextField()
     net_price = models.DecimalField(max_digits=5, decimal_places=2)
     image = models.ImageField()
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    #srcset attributes of the resized variants, used by the templates instead of the original upload.
+    @property
+    def webp_srcset(self):
+        return srcset(self.image.storage, self.image_variants.get('webp', []))
+
+    @property
+    def jpeg_srcset(self):
+        return srcset(self.image.storage, self.image_variants.get('jpeg', []))
+
+    #the variants are stored under the hash of the photo, so their URLs never change content; the original gets
+    #the hash (or the time of the last change) as ?v=, so all of them can be cached forever (food_app.fileserver).
+    @property
+    def image_src(self):
+        jpeg = self.image_variants.get('jpeg')
+        if jpeg:
+            return self.image.storage.url(jpeg[-1][1])
+        if not self.image:
+            return ''
+        version = self.image_variants.get('hash') or (int(self.updated_at.timestamp()) if self.updated_at else None)
+        return f'{self.image.url}?v={version}' if version else self.image.url
+
     class Meta:
         db_table = 'food_app_dish'
 
@@ -23,19 +49,43 @@ class Orders(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     customer_address = models.CharField(max_length=32, blank=False)
     total_price = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
-
-    def save(self, *args, **kwargs):
-        if not self.pk:
-            orders_dishes = OrdersDish.objects.filter(orders=self)
-            total_price = sum([od.price for od in orders_dishes])
-            self.total_price = total_price
-        super().save(*args, **kwargs)
+    #a copy of the order lines (dish name, count, unit price, line price) written when the order is placed,
+    #so the order is shown without reading OrdersDish and Dish, with the prices it was placed at.
+    summary = models.JSONField(default=list, blank=True, editable=False)
 
     def __str__(self):
         return f'{self.customer_name} ({self.created_at})'
 
+    #builds the summary entries from OrdersDish rows whose dish is already loaded.
+    #Prices are stored as strings, because JSON has no decimal type.
+    @staticmethod
+    def summarize(lines):
+        return [
+            {
+                'dish_id': line.dish_id,
+                'name': line.dish.name,
+                'count': line.count,
+                'unit_price': str((Decimal(line.price) / (line.count or 1)).quantize(Decimal('0.01'))),
+                'price': str(Decimal(line.price).quantize(Decimal('0.01'))),
+            }
+            for line in lines
+        ]
+
+    #rebuilds the summary from the stored lines, for lines added or changed after the order was placed.
+    @classmethod
+    def refresh_summary(cls, order_id):
+        lines = OrdersDish.objects.filter(orders_id=order_id).select_related('dish').order_by('pk')
+        cls.objects.filter(pk=order_id).update(summary=cls.summarize(lines))
+
     class Meta:
         db_table = 'food_app_orders'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='orders_created_at_id_idx'),
+            #the admin searches: prefix lookups on PostgreSQL need the pattern operator class to use an index.
+            models.Index(fields=['customer_email'], name='orders_customer_email_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['customer_name'], name='orders_customer_name_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['customer_phone'], name='orders_customer_phone_idx'),
+        ]
 
 
 class OrdersDish(models.Model):
@@ -53,4 +103,141 @@ class OrdersDish(models.Model):
 
     class Meta:
         db_table = 'food_app_orders_dish'
+        constraints = [
+            models.CheckConstraint(check=models.Q(count__gt=0), name='ordersdish_count_positive'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'orders'], name='ordersdish_user_orders_idx'),
+            #covers the per-dish line counts and unit sums (popularity.live_totals) without reading the table.
+            models.Index(fields=['dish', 'count'], name='ordersdish_dish_count_idx'),
+        ]
+
+
+
+#Denormalized popularity counters, maintained incrementally whenever OrdersDish rows are created.
+#order_count equals Count('ordersdish') and units equals Sum('ordersdish__count') for the dish.
+class DishPopularity(models.Model):
+    dish = models.OneToOneField(Dish, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
 
+    def __str__(self):
+        return f'{self.dish_id}: {self.order_count}'
+
+    class Meta:
+        db_table = 'food_app_dish_popularity'
+
+
+#Per-day popularity buckets, used for the rolling "recently popular" window.
+class DishDailyPopularity(models.Model):
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
+    day = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.dish_id} {self.day}: {self.order_count}'
+
+    class Meta:
+        db_table = 'food_app_dish_daily_popularity'
+        constraints = [
+            models.UniqueConstraint(fields=['dish', 'day'], name='dish_daily_popularity_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'dish'], name='dish_daily_popularity_day_idx'),
+        ]
+
+
+#One row per idempotency key sent with the order form (see services.place_order).
+#The primary key makes a second submission with the same key fail, so it returns the order of the first one.
+class OrderSubmission(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.OneToOneField(Orders, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.key}: {self.order_id}'
+
+    class Meta:
+        db_table = 'food_app_order_submission'
+
+
+#Pre-aggregated sales, filled incrementally by the rollup_sales command (see food_app.reporting).
+#period is "hour" or "day" and start is the beginning of the bucket (local midnight for days).
+class SalesRollup(models.Model):
+    PERIODS = (('hour', 'Godzina'), ('day', 'Dzień'))
+
+    period = models.CharField(max_length=4, choices=PERIODS)
+    start = models.DateTimeField()
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f'{self.period} {self.start}: {self.revenue}'
+
+    class Meta:
+        db_table = 'food_app_sales_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start'], name='sales_rollup_unique'),
+        ]
+
+
+#The same buckets per dish: order_count is the number of order lines, revenue the sum of their prices.
+class DishSalesRollup(models.Model):
+    period = models.CharField(max_length=4, choices=SalesRollup.PERIODS)
+    start = models.DateTimeField()
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f'{self.period} {self.start} {self.dish_id}: {self.revenue}'
+
+    class Meta:
+        db_table = 'food_app_dish_sales_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start', 'dish'], name='dish_sales_rollup_unique'),
+        ]
+
+
+#How far the rollups have been filled: every order created before processed_until is in them.
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=32, primary_key=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.processed_until}'
+
+    class Meta:
+        db_table = 'food_app_rollup_watermark'
+
+
+#A job for the background worker (see food_app.tasks). run_after is when a queued task may start;
+#while a task is running it is the end of its visibility timeout, after which another worker may take it over.
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = ((QUEUED, 'W kolejce'), (RUNNING, 'W trakcie'), (DONE, 'Wykonane'), (FAILED, 'Nieudane'))
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+    class Meta:
+        db_table = 'food_app_task'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
@@ -0,0 +1,133 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Http404):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, cursor, next_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+#Pages a queryset with a cursor on its ordering columns instead of LIMIT/OFFSET.
+#Every page is a single indexed range scan ("WHERE (created_at, id) < cursor ORDER BY ... LIMIT n"),
+#so the cost of a page does not grow with how deep the user has paged.
+#The ordering must end with a unique column (usually "id") so that the cursor is unambiguous.
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.fields = [self.queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor('Nieprawidłowy kursor strony')
+
+    #builds "(a, b) < (x, y)" as "a <= x AND (a < x OR (a = x AND b < y))", which every database backend understands.
+    #The redundant "a <= x" is what the planner can use as the start of the index range scan: the OR alone is
+    #only applied as a filter, so a deep page would still read every row before the cursor.
+    def _after(self, values):
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            column = name.lstrip('-')
+            lookup = '__lt' if name.startswith('-') else '__gt'
+            condition |= equal & Q(**{column + lookup: value})
+            equal &= Q(**{column: value})
+        first = self.ordering[0]
+        bound = '__lte' if first.startswith('-') else '__gte'
+        return Q(**{first.lstrip('-') + bound: values[0]}) & condition
+
+    def filter_after(self, queryset, cursor):
+        if not cursor:
+            return queryset
+        return queryset.filter(self._after(self.decode_cursor(cursor)))
+
+    def page(self, cursor=None):
+        queryset = self.filter_after(self.queryset, cursor)
+        return self._page(list(queryset[:self.per_page + 1]), cursor)
+
+    async def apage(self, cursor=None):
+        queryset = self.filter_after(self.queryset, cursor)
+        return self._page([obj async for obj in queryset[:self.per_page + 1]], cursor)
+
+    #a page of objects loaded some other way (e.g. from the order archive): up to per_page + 1 of them, in order.
+    def page_of(self, object_list, cursor=None):
+        return self._page(object_list, cursor)
+
+    def _page(self, object_list, cursor):
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, cursor or None, next_cursor)
+
+
+#returns the planner's estimate of how many rows the queryset would return, or None when it is not available.
+#On PostgreSQL an unfiltered table is read from pg_class.reltuples and a filtered one from EXPLAIN;
+#both are kept up to date by (auto)vacuum and cost a catalog lookup instead of a scan.
+def estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+#A Paginator for tables with millions of rows (used by the admin changelists).
+#Above exact_count_limit rows the count is the planner's estimate instead of a COUNT(*) over the whole result,
+#so the last page number is approximate but every page loads in constant time.
+class EstimatedCountPaginator(Paginator):
+    exact_count_limit = 100000
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > self.exact_count_limit:
+            return estimate
+        return super().count
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import order_archive
+from .models import Dish, DishDailyPopularity, DishPopularity, OrdersDish
+
+
+def window_days():
+    return getattr(settings, 'POPULARITY_WINDOW_DAYS', 30)
+
+
+def _increment(values):
+    #builds "CASE WHEN <match> THEN <n> ... ELSE 0 END" so every counter is bumped by one UPDATE statement.
+    return Case(
+        *[When(then=Value(amount), **match) for match, amount in values],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+#adds the given OrdersDish rows to the all-time counters and to the daily buckets.
+#Costs four queries no matter how many lines or dishes are involved:
+#missing counter rows are created with one INSERT ... ON CONFLICT DO NOTHING and then bumped with one UPDATE.
+def record_order_lines(lines, day=None):
+    totals = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0])
+    for line in lines:
+        line_day = day or timezone.localdate(line.orders.created_at)
+        for bucket in (totals[line.dish_id], daily[line.dish_id, line_day]):
+            bucket[0] += 1
+            bucket[1] += line.count
+    if not totals:
+        return
+
+    DishPopularity.objects.bulk_create(
+        [DishPopularity(dish_id=dish_id) for dish_id in totals], ignore_conflicts=True
+    )
+    DishPopularity.objects.filter(dish_id__in=list(totals)).update(
+        order_count=F('order_count') + _increment(({'dish_id': d}, c[0]) for d, c in totals.items()),
+        units=F('units') + _increment(({'dish_id': d}, c[1]) for d, c in totals.items()),
+    )
+
+    DishDailyPopularity.objects.bulk_create(
+        [DishDailyPopularity(dish_id=dish_id, day=bucket_day) for dish_id, bucket_day in daily], ignore_conflicts=True
+    )
+    buckets = [({'dish_id': dish_id, 'day': bucket_day}, c) for (dish_id, bucket_day), c in daily.items()]
+    DishDailyPopularity.objects.filter(
+        dish_id__in={dish_id for dish_id, _ in daily}, day__in={bucket_day for _, bucket_day in daily}
+    ).update(
+        order_count=F('order_count') + _increment((match, c[0]) for match, c in buckets),
+        units=F('units') + _increment((match, c[1]) for match, c in buckets),
+    )
+
+
+#returns {dish_id: number of order lines} from the counters, in one query over the (small) counter table.
+def order_counts():
+    return dict(DishPopularity.objects.values_list('dish_id', 'order_count'))
+
+
+#returns [(dish_id, number of order lines)] for the most ordered dishes of the last `days` days.
+def recently_popular(limit=5, days=None):
+    return [(row['dish_id'], row['total']) for row in _recently_popular(limit, days)]
+
+
+async def arecently_popular(limit=5, days=None):
+    return [(row['dish_id'], row['total']) async for row in _recently_popular(limit, days)]
+
+
+def _recently_popular(limit, days):
+    since = timezone.localdate() - timedelta(days=(days or window_days()) - 1)
+    return (
+        DishDailyPopularity.objects.filter(day__gte=since)
+        .values('dish_id')
+        .annotate(total=Sum('order_count'))
+        .order_by('-total', 'dish_id')[:limit]
+    )
+
+
+#keeps record_order_lines from changing the counters until the current transaction ends, so a rebuild or a
+#check sees no task commit halfway through. Reads go on; SQLite has a single writer anyway.
+def lock_counters():
+    if connection.vendor != 'postgresql':
+        return
+    tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in (DishPopularity, DishDailyPopularity))
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {tables} IN EXCLUSIVE MODE')
+
+
+#the live aggregates of `lines` (default: every OrdersDish row) the counters must agree with. The lines of archived
+#orders count too; their totals per dish are kept in the archive's indexes (see food_app.archive).
+def live_totals(lines=None):
+    lines = OrdersDish.objects.all() if lines is None else lines
+    rows = lines.values('dish_id').annotate(order_count=Count('*'), units=Sum('count'))
+    totals = {row['dish_id']: (row['order_count'], row['units']) for row in rows}
+    archived = order_archive().dish_totals()
+    for dish_id in Dish.objects.filter(pk__in=archived).values_list('pk', flat=True):
+        order_count, units = totals.get(dish_id, (0, 0))
+        totals[dish_id] = (order_count + archived[dish_id][0], units + archived[dish_id][1])
+    return totals
+
+
+def live_daily(since, lines=None):
+    lines = OrdersDish.objects.all() if lines is None else lines
+    rows = (
+        lines.filter(orders__created_at__date__gte=since)
+        .values('dish_id', day=TruncDate('orders__created_at'))
+        .annotate(order_count=Count('id'), units=Sum('count'))
+    )
+    return {(row['dish_id'], row['day']): (row['order_count'], row['units']) for row in rows}
+
+
+def stored_totals():
+    return {
+        dish_id: (order_count, units)
+        for dish_id, order_count, units in DishPopularity.objects.values_list('dish_id', 'order_count', 'units')
+        if order_count or units
+    }
+
+
+def stored_daily(since):
+    return {
+        (dish_id, day): (order_count, units)
+        for dish_id, day, order_count, units in DishDailyPopularity.objects.filter(day__gte=since).values_list(
+            'dish_id', 'day', 'order_count', 'units'
+        )
+        if order_count or units
+    }
@@ -0,0 +1,220 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .archive import order_archive
+from .exports import InvalidExport, parse_moment
+from .models import DishSalesRollup, Orders, OrdersDish, RollupWatermark, SalesRollup
+
+
+WATERMARK = 'sales'
+
+
+class InvalidReport(ValueError):
+    pass
+
+
+#orders are only rolled up once they are this old, so a transaction that commits an order a little after
+#its created_at was set is not skipped by a watermark that has already moved past it.
+def settle_seconds():
+    return getattr(settings, 'REPORTING_SETTLE_SECONDS', 300)
+
+
+def floor_hour(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+#hours are bucketed in UTC, days at local midnight (TIME_ZONE), so every hour falls into exactly one day.
+def _trunc(period, field):
+    if period == 'hour':
+        return TruncHour(field, tzinfo=dt_timezone.utc)
+    return TruncDay(field)
+
+
+#the live aggregates over the raw tables for [start, end): {bucket: (orders, revenue)}.
+def raw_totals(start, end, period='hour'):
+    rows = (
+        Orders.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(bucket=_trunc(period, 'created_at'))
+        .values('bucket')
+        .annotate(order_count=Count('id'), revenue=Sum('total_price'))
+        .order_by()
+    )
+    return {row['bucket']: (row['order_count'], row['revenue']) for row in rows}
+
+
+#{(bucket, dish_id): (order lines, units, revenue)}
+def raw_dish_totals(start, end, period='hour'):
+    rows = (
+        OrdersDish.objects.filter(orders__created_at__gte=start, orders__created_at__lt=end)
+        .annotate(bucket=_trunc(period, 'orders__created_at'))
+        .values('bucket', 'dish_id')
+        .annotate(order_count=Count('id'), units=Sum('count'), revenue=Sum('price'))
+        .order_by()
+    )
+    return {(row['bucket'], row['dish_id']): (row['order_count'], row['units'], row['revenue']) for row in rows}
+
+
+def stored_totals(start, end, period='hour'):
+    rows = SalesRollup.objects.filter(period=period, start__gte=start, start__lt=end)
+    return {row.start: (row.order_count, row.revenue) for row in rows}
+
+
+def stored_dish_totals(start, end, period='hour'):
+    rows = DishSalesRollup.objects.filter(period=period, start__gte=start, start__lt=end)
+    return {(row.start, row.dish_id): (row.order_count, row.units, row.revenue) for row in rows}
+
+
+#the local days that contain [start, end), as the [first midnight, last midnight) range.
+def _days_of(start, end):
+    first = timezone.localdate(start)
+    last = timezone.localdate(end - timedelta(microseconds=1))
+    return day_start(first), day_start(last + timedelta(days=1))
+
+
+#replaces the hourly rollups of [start, end) (whole hours) with the aggregates of the raw tables,
+#then rebuilds the daily rollups of the days it touches from the hourly ones.
+#Must run inside a transaction, so the rollups never show a half processed range.
+def roll_up_range(start, end):
+    SalesRollup.objects.filter(period='hour', start__gte=start, start__lt=end).delete()
+    DishSalesRollup.objects.filter(period='hour', start__gte=start, start__lt=end).delete()
+    SalesRollup.objects.bulk_create([
+        SalesRollup(period='hour', start=bucket, order_count=count, revenue=revenue)
+        for bucket, (count, revenue) in raw_totals(start, end).items()
+    ], batch_size=1000)
+    DishSalesRollup.objects.bulk_create([
+        DishSalesRollup(period='hour', start=bucket, dish_id=dish_id, order_count=count, units=units, revenue=revenue)
+        for (bucket, dish_id), (count, units, revenue) in raw_dish_totals(start, end).items()
+    ], batch_size=1000)
+
+    first_day, last_day = _days_of(start, end)
+    hours = SalesRollup.objects.filter(period='hour', start__gte=first_day, start__lt=last_day)
+    dish_hours = DishSalesRollup.objects.filter(period='hour', start__gte=first_day, start__lt=last_day)
+    day_totals = (
+        hours.annotate(bucket=TruncDay('start')).values('bucket')
+        .annotate(total_orders=Sum('order_count'), total_revenue=Sum('revenue')).order_by()
+    )
+    dish_day_totals = (
+        dish_hours.annotate(bucket=TruncDay('start')).values('bucket', 'dish_id')
+        .annotate(total_orders=Sum('order_count'), total_units=Sum('units'), total_revenue=Sum('revenue')).order_by()
+    )
+    days = [
+        SalesRollup(period='day', start=row['bucket'], order_count=row['total_orders'], revenue=row['total_revenue'])
+        for row in day_totals
+    ]
+    dish_days = [
+        DishSalesRollup(period='day', start=row['bucket'], dish_id=row['dish_id'], order_count=row['total_orders'],
+                        units=row['total_units'], revenue=row['total_revenue'])
+        for row in dish_day_totals
+    ]
+    SalesRollup.objects.filter(period='day', start__gte=first_day, start__lt=last_day).delete()
+    DishSalesRollup.objects.filter(period='day', start__gte=first_day, start__lt=last_day).delete()
+    SalesRollup.objects.bulk_create(days, batch_size=1000)
+    DishSalesRollup.objects.bulk_create(dish_days, batch_size=1000)
+
+
+#the start of the rollups that can still be rebuilt from the live tables. The orders before it were moved to the
+#order archive (whose cutoff is always a local midnight, see food_app.archive), so the rollups before it are final.
+def archive_horizon():
+    return order_archive().archived_before()
+
+
+def processed_until():
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    return watermark.processed_until if watermark else None
+
+
+#rolls up every whole hour between the watermark and now (minus settle_seconds), batch by batch.
+#Each batch is one transaction that also moves the watermark, with the watermark row locked,
+#so an interrupted run or two runs at the same time never count an hour twice.
+#Returns the (start, end) of every processed batch.
+def roll_up(now=None, batch=timedelta(hours=24)):
+    until = floor_hour((now or timezone.now()) - timedelta(seconds=settle_seconds()))
+    processed = []
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+            if watermark is None:
+                first_order = Orders.objects.aggregate(first=Min('created_at'))['first']
+                if first_order is None:
+                    return processed
+                horizon = archive_horizon()
+                first_hour = floor_hour(first_order)
+                watermark, _ = RollupWatermark.objects.get_or_create(
+                    name=WATERMARK, defaults={'processed_until': max(first_hour, horizon) if horizon else first_hour}
+                )
+            start = watermark.processed_until
+            if start >= until:
+                return processed
+            end = min(start + batch, until)
+            roll_up_range(start, end)
+            watermark.processed_until = end
+            watermark.save(update_fields=['processed_until'])
+        processed.append((start, end))
+
+
+#drops the rollups and the watermark, so the next roll_up starts again from the first order.
+#The rollups before the archive horizon are kept: their orders are no longer in the database.
+def reset_rollups():
+    horizon = archive_horizon()
+    with transaction.atomic():
+        if horizon is None:
+            SalesRollup.objects.all().delete()
+            DishSalesRollup.objects.all().delete()
+            RollupWatermark.objects.filter(name=WATERMARK).delete()
+            return
+        SalesRollup.objects.filter(start__gte=horizon).delete()
+        DishSalesRollup.objects.filter(start__gte=horizon).delete()
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'processed_until': horizon})
+
+
+#reads the reporting range from request.GET style values: start and end are dates or ISO datetimes,
+#period is "day" (default) or "hour". Without a start the report covers the last 30 days.
+def parse_report_params(params, now=None):
+    period = params.get('period') or 'day'
+    if period not in dict(SalesRollup.PERIODS):
+        raise InvalidReport(f'Nieznany okres: {period}')
+    try:
+        end = parse_moment(params.get('end'))
+        start = parse_moment(params.get('start'))
+    except InvalidExport as exc:
+        raise InvalidReport(str(exc))
+    if end is None:
+        end = day_start(timezone.localdate(now or timezone.now()) + timedelta(days=1))
+    if start is None:
+        start = end - timedelta(days=30)
+    if start >= end:
+        raise InvalidReport('Początek okresu musi być przed jego końcem')
+    return period, start, end
+
+
+#Everything below reads only from the rollup tables, never from the orders.
+def sales_report(period, start, end):
+    return list(
+        SalesRollup.objects.filter(period=period, start__gte=start, start__lt=end)
+        .order_by('start').values('start', 'order_count', 'revenue')
+    )
+
+
+def dish_report(start, end, limit=20):
+    return list(
+        DishSalesRollup.objects.filter(period='day', start__gte=start, start__lt=end)
+        .values('dish_id', 'dish__name')
+        .annotate(order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'dish_id')[:limit]
+    )
+
+
+def report_totals(start, end):
+    totals = SalesRollup.objects.filter(period='day', start__gte=start, start__lt=end).aggregate(
+        order_count=Sum('order_count'), revenue=Sum('revenue')
+    )
+    return {'order_count': totals['order_count'] or 0, 'revenue': totals['revenue'] or 0}
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_read_replica = ContextVar('food_app_read_replica', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+#routes the food_app reads made inside the block to the read replica (when one is configured).
+#The flag lives in a ContextVar, so it follows the request into sync_to_async threads.
+@contextmanager
+def read_replica():
+    token = _read_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+#Sends food_app reads to the replica, but only inside read_replica() - i.e. in the read-only views -
+#and only outside a transaction on the primary.
+#Writes, and the auth/session tables (which must see a login immediately), always use the primary.
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'food_app' or not _read_replica.get():
+            return None
+        #inside a transaction on the primary, the replica would not see our own uncommitted writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+#Routes the GET/HEAD requests of a view to the read replica.
+class ReadReplicaMixin:
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        if getattr(self, 'view_is_async', False):
+            return self._adispatch(request, *args, **kwargs)
+        with read_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch(self, request, *args, **kwargs):
+        with read_replica():
+            return await super().dispatch(request, *args, **kwargs)
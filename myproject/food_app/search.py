@@ -0,0 +1,171 @@
+import bisect
+import heapq
+import itertools
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .menu_cache import LRUCache, get_menu, get_menu_by_id, get_menu_version
+
+
+# Dish search for the menu pages and the API: prefix and typo tolerant, ranked.
+#
+# On PostgreSQL it uses the indexes of migration 0012: a GIN index on the tsvector of name + description
+# (whole words and prefixes, ranked with ts_rank) and a trigram index on the name (typos, pg_trgm similarity).
+# Elsewhere (SQLite in development and tests) an inverted index of the menu is built in memory, once per menu
+# version, so it is rebuilt after every Dish change like the cached menu itself.
+
+MIN_SIMILARITY = 0.3
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+_TRANSLITERATE = str.maketrans({'ł': 'l', 'Ł': 'L'})
+_WORD = re.compile(r'\w+')
+
+
+#lowercase words, by default without diacritics, so "Zapiekankę" and "zapiekanke" meet.
+def tokenize(text, fold=True):
+    text = (text or '').lower()
+    if fold:
+        text = unicodedata.normalize('NFKD', text.translate(_TRANSLITERATE))
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text)
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b)
+
+
+#An inverted index of the menu: word -> {dish id: weight}, the sorted vocabulary for prefix lookups
+#and trigram -> words for the typo tolerant ones.
+class MenuIndex:
+    def __init__(self, dishes):
+        self.postings = defaultdict(dict)
+        for dish in dishes:
+            for weight, text in ((NAME_WEIGHT, dish.name), (DESCRIPTION_WEIGHT, dish.description)):
+                for word in tokenize(text):
+                    postings = self.postings[word]
+                    postings[dish.pk] = max(postings.get(dish.pk, 0), weight)
+        self.vocabulary = sorted(self.postings)
+        self.trigram_words = defaultdict(set)
+        for word in self.vocabulary:
+            for trigram in trigrams(word):
+                self.trigram_words[trigram].add(word)
+
+    #{word: match quality} for one query term: the word itself and the words it starts (the last term is
+    #usually still being typed), or, when there are none, the words that look like it (a typo).
+    def expand(self, term):
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for word in itertools.islice(self.vocabulary, start, None):
+            if not word.startswith(term):
+                break
+            matches[word] = 1.0 if word == term else 0.8
+        if matches or len(term) < 3 or term.isdigit():
+            return matches
+        #a word at MIN_SIMILARITY shares at least that part of the term's trigrams
+        term_trigrams = trigrams(term)
+        hits = Counter()
+        for trigram in term_trigrams:
+            hits.update(self.trigram_words.get(trigram, ()))
+        needed = MIN_SIMILARITY * len(term_trigrams)
+        for word, shared in hits.items():
+            if shared >= needed:
+                score = shared / (len(term_trigrams) + len(trigrams(word)) - shared)
+                if score >= MIN_SIMILARITY:
+                    matches[word] = 0.6 * score
+        return matches
+
+    #[(dish id, score)] of the dishes matching every term, best first.
+    #The term with the fewest postings goes first; the next ones only probe the dishes still in the running
+    #when that is cheaper than walking their postings, so a common word ("ser") does not cost a full scan.
+    def search(self, terms, limit):
+        expanded = [self.expand(term) for term in terms]
+        expanded.sort(key=lambda words: sum(len(self.postings[word]) for word in words))
+        scores = None
+        for words in expanded:
+            postings = [(self.postings[word], quality) for word, quality in words.items()]
+            if scores is not None and len(scores) * len(postings) < sum(len(dishes) for dishes, _ in postings):
+                probed = {}
+                for dish_id, score in scores.items():
+                    best = max((quality * dishes[dish_id] for dishes, quality in postings if dish_id in dishes), default=0)
+                    if best:
+                        probed[dish_id] = score + best
+                scores = probed
+            else:
+                term_scores = defaultdict(float)
+                for dishes, quality in postings:
+                    for dish_id, weight in dishes.items():
+                        term_scores[dish_id] = max(term_scores[dish_id], quality * weight)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        dish_id: score + term_scores[dish_id] for dish_id, score in scores.items()
+                        if dish_id in term_scores
+                    }
+            if not scores:
+                return []
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+_menu_indexes = LRUCache(maxsize=2)
+
+
+def menu_index():
+    version = get_menu_version()
+    index = _menu_indexes.get(version)
+    if index is None:
+        index = MenuIndex(get_menu())
+        _menu_indexes.set(version, index)
+    return index
+
+
+def clear_menu_indexes():
+    _menu_indexes.clear()
+
+
+def _postgres_search(terms, limit):
+    #"pizz:* & wiej:*"; the terms are \w+ words, so nothing in them is tsquery syntax
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    name = ' '.join(terms)
+    sql = '''
+        SELECT id, ts_rank(to_tsvector('simple', name || ' ' || description), query) + similarity(name, %s) AS score
+        FROM food_app_dish, to_tsquery('simple', %s) AS query
+        WHERE to_tsvector('simple', name || ' ' || description) @@ query OR name %% %s
+        ORDER BY score DESC, id
+        LIMIT %s
+    '''
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(sql, [name, tsquery, name, limit])
+        return [(dish_id, float(score)) for dish_id, score in cursor.fetchall()]
+
+
+def use_database():
+    backend = getattr(settings, 'DISH_SEARCH_BACKEND', None)
+    if backend:
+        return backend == 'database'
+    return connections[DEFAULT_DB_ALIAS].vendor == 'postgresql'
+
+
+#returns [(dish, score)] for the query, best first; the dishes come from the menu cache.
+#The "simple" text search configuration keeps diacritics, so on PostgreSQL a word typed without them
+#is found through the trigram similarity of the name only; the in-memory index folds them on both sides.
+def search_dishes(query, limit=20):
+    if use_database():
+        terms = tokenize(query, fold=False)
+        results = _postgres_search(terms, limit) if terms else []
+    else:
+        terms = tokenize(query)
+        results = menu_index().search(terms, limit) if terms else []
+    menu = get_menu_by_id()
+    return [(menu[dish_id], score) for dish_id, score in results if dish_id in menu]
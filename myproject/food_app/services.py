@@ -0,0 +1,157 @@
+import re
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Dish, OrderSubmission, Orders, OrdersDish
+from .jobs import record_order_popularity, send_order_confirmation
+from .tasks import enqueue
+
+
+CUSTOMER_FIELDS = ('customer_name', 'customer_email', 'customer_phone', 'customer_address')
+IDEMPOTENCY_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class InvalidOrder(ValueError):
+    pass
+
+
+#narrows an Orders queryset to the orders that contain at least one line owned by the user.
+#An EXISTS subquery instead of a join, so an order is never repeated and no DISTINCT is needed.
+def user_orders(queryset, user):
+    user_lines = OrdersDish.objects.filter(orders=OuterRef('pk'), user=user)
+    return queryset.filter(Exists(user_lines))
+
+
+#reads the customer details from the submitted order form.
+def parse_customer(data):
+    return {field: data.get(field, '') for field in CUSTOMER_FIELDS}
+
+
+#reads the selected dishes and their quantities from the submitted order form in a single pass.
+#The quantity of every dish is posted as "counts_<dish id>", so it does not depend on the menu order.
+#Returns a {dish_id: count} dict.
+def parse_order_lines(data):
+    lines = {}
+    for raw_dish_id in data.getlist('dishes'):
+        try:
+            dish_id = int(raw_dish_id)
+            count = int(data.get('counts_{}'.format(raw_dish_id), 1))
+        except (TypeError, ValueError):
+            raise InvalidOrder('Nieprawidłowe zamówienie')
+        if count < 1:
+            raise InvalidOrder('Nieprawidłowa ilość')
+        lines[dish_id] = lines.get(dish_id, 0) + count
+    return lines
+
+
+#prices the lines in memory from the already resolved dishes.
+#Returns the total price and the unsaved OrdersDish rows.
+def price_order_lines(user, dishes, lines):
+    if not lines:
+        raise InvalidOrder('Zamówienie nie zawiera żadnych dań')
+    missing = set(lines) - set(dishes)
+    if missing:
+        raise InvalidOrder('Wybrane danie nie istnieje')
+
+    total_price = Decimal('0.00')
+    order_lines = []
+    for dish_id, count in lines.items():
+        dish = dishes[dish_id]
+        price = dish.net_price * count
+        total_price += price
+        order_lines.append(OrdersDish(dish=dish, count=count, user=user, price=price))
+    return total_price, order_lines
+
+
+#reads the idempotency key the order form was rendered with (see new_idempotency_key).
+#Forms without one (older clients) are placed without duplicate protection.
+def parse_idempotency_key(data):
+    key = data.get('idempotency_key') or None
+    if key is not None and not IDEMPOTENCY_KEY_RE.match(key):
+        raise InvalidOrder('Nieprawidłowy formularz zamówienia')
+    return key
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def _submitted_order(submission, user):
+    if submission is None:
+        return None
+    if submission.user_id != user.pk:
+        raise InvalidOrder('Nieprawidłowy formularz zamówienia')
+    return submission.order
+
+
+#returns the order already placed with this key, or None: one indexed lookup, so a replayed form is cheap.
+def submitted_order(user, key):
+    return _submitted_order(OrderSubmission.objects.select_related('order').filter(key=key).first(), user)
+
+
+async def asubmitted_order(user, key):
+    return _submitted_order(await OrderSubmission.objects.select_related('order').filter(key=key).afirst(), user)
+
+
+#inserts the OrderSubmission row for the key, inside the order transaction.
+#A concurrent submission with the same key blocks on the primary key until this transaction ends,
+#and then fails with IntegrityError, so only one of them writes the order. Returns False for the loser.
+def _claim_submission(user, key):
+    try:
+        with transaction.atomic():
+            OrderSubmission.objects.create(key=key, user=user)
+    except IntegrityError:
+        return False
+    return True
+
+
+#writes the Orders row (with its final total_price and summary), all OrdersDish rows and the follow-up tasks
+#(popularity counters, confirmation e-mail) in one transaction. With an idempotency key the key is claimed first; when another submission already
+#holds it, nothing is written and the order of that submission is returned instead.
+def write_order(customer, total_price, order_lines, user=None, idempotency_key=None):
+    with transaction.atomic():
+        if idempotency_key and not _claim_submission(user, idempotency_key):
+            order = None
+        else:
+            order = Orders.objects.create(total_price=total_price, summary=Orders.summarize(order_lines), **customer)
+            for line in order_lines:
+                line.orders = order
+            OrdersDish.objects.bulk_create(order_lines)
+            enqueue(record_order_popularity, order_id=order.pk)
+            enqueue(send_order_confirmation, order_id=order.pk)
+            if idempotency_key:
+                OrderSubmission.objects.filter(key=idempotency_key).update(order=order)
+    if order is None:
+        return submitted_order(user, idempotency_key)
+    return order
+
+
+#places an order with a constant number of queries, no matter how many lines it has:
+#every dish is resolved with one in_bulk lookup, the lines are priced in memory
+#and everything is written by write_order in one transaction.
+#A form submitted again with the same idempotency key (a double tap, a retry after a timeout)
+#returns the order of the first submission instead of placing another one.
+def place_order(user, customer, lines, idempotency_key=None):
+    if idempotency_key:
+        order = submitted_order(user, idempotency_key)
+        if order is not None:
+            return order
+    dishes = Dish.objects.in_bulk(list(lines))
+    total_price, order_lines = price_order_lines(user, dishes, lines)
+    return write_order(customer, total_price, order_lines, user, idempotency_key)
+
+
+#async version of place_order: the dishes are resolved with the async ORM,
+#the write runs in a worker thread because Django transactions are not available in async code.
+async def aplace_order(user, customer, lines, idempotency_key=None):
+    if idempotency_key:
+        order = await asubmitted_order(user, idempotency_key)
+        if order is not None:
+            return order
+    dishes = await Dish.objects.ain_bulk(list(lines))
+    total_price, order_lines = price_order_lines(user, dishes, lines)
+    return await sync_to_async(write_order)(customer, total_price, order_lines, user, idempotency_key)
@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+
+# The session engine of the "cached_db" tier (SESSION_ENGINE = 'food_app.sessions').
+#
+# Sessions are read from the shared cache and written through to the database, like Django's cached_db
+# engine, but a session that was marked modified without a real change (e.g. the cart saved with the same
+# lines) is not written at all. An unchanged session is still written once every SESSION_WRITE_INTERVAL
+# seconds, so its expiry in the database keeps up with the cookie the browser gets on every such response.
+# A new key (login cycles it) is inserted together with the rest of the request's changes, not right away.
+
+WRITTEN_AT_KEY = '_food_app_written_at'
+
+
+def write_interval():
+    return getattr(settings, 'SESSION_WRITE_INTERVAL', 24 * 60 * 60)
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        data = super().load()
+        self._stored = self._fingerprint(data)
+        return data
+
+    #the serialized session without the write time, to compare what was loaded with what is saved.
+    def _fingerprint(self, data):
+        return self.serializer().dumps({key: value for key, value in data.items() if key != WRITTEN_AT_KEY})
+
+    #like SessionBase.cycle_key, but the row under the new key is only inserted by the save at the end of the request.
+    def cycle_key(self):
+        data = self._session
+        key = self.session_key
+        self._session_key = self._get_new_session_key()
+        self._session_cache = data
+        self._pending_create = True
+        self.modified = True
+        if key:
+            self.delete(key)
+
+    def save(self, must_create=False):
+        if getattr(self, '_pending_create', False):
+            self._pending_create = False
+            must_create = True
+        data = self._get_session(no_load=must_create)
+        fingerprint = self._fingerprint(data)
+        now = int(time.time())
+        if (
+            not must_create
+            and self.session_key is not None
+            and fingerprint == getattr(self, '_stored', None)
+            and now - data.get(WRITTEN_AT_KEY, 0) < write_interval()
+        ):
+            return
+        data[WRITTEN_AT_KEY] = now
+        super().save(must_create)
+        self._stored = fingerprint
+
+
+#Deletes the expired sessions of the database-backed tiers, `batch_size` rows per statement and transaction,
+#so the sweep never holds long locks on the table the logged-in requests read and write; returns the count.
+#The cached copies expire on their own, with the same expiry.
+def sweep_expired_sessions(batch_size=1000, pause=0, now=None):
+    now = now or timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now)
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,64 @@
+import logging
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .images import IMAGE_ERRORS, generate_variants, variants_are_current
+from .menu_cache import bump_menu_version
+from .models import Dish, Orders, OrdersDish
+from .popularity import record_order_lines
+
+
+logger = logging.getLogger(__name__)
+
+
+#invalidates the cached menu whenever staff edit a Dish.
+#The version is bumped right away, so nobody keeps serving the old menu,
+#and once more after the commit, so a menu read before the transaction committed is never cached as current.
+@receiver([post_save, post_delete], sender=Dish)
+def invalidate_menu(sender, **kwargs):
+    bump_menu_version()
+    transaction.on_commit(bump_menu_version)
+
+
+#keeps the popularity counters up to date for order lines saved one by one (e.g. in the admin).
+#Lines written with bulk_create do not send post_save; place_order records those itself.
+@receiver(post_save, sender=OrdersDish)
+def count_order_line(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_order_lines([instance])
+
+
+#the delete started from an order (or a queryset of orders), which takes its lines with it.
+def _deleting_orders(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Orders
+
+
+#keeps Orders.summary in sync with order lines saved or deleted one by one (e.g. in the admin).
+#place_order writes the summary together with the order, and bulk_create does not send post_save.
+#Lines removed by the cascade of a deleted order are skipped, so deleting an order does not rebuild
+#its summary once per line right before the order itself is gone.
+@receiver([post_save, post_delete], sender=OrdersDish)
+def refresh_order_summary(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleting_orders(origin):
+        Orders.refresh_summary(instance.orders_id)
+
+
+#generates the resized image variants when a Dish is saved with a new photo.
+#They are stored with update() so saving them does not send post_save again,
+#and the menu version is bumped once more so the cached menu picks them up.
+@receiver(post_save, sender=Dish)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image or variants_are_current(instance):
+        return
+    try:
+        instance.image_variants = generate_variants(instance)
+    except IMAGE_ERRORS:
+        #a missing, unreadable or oversized photo must not block saving the dish; the page falls back to the original.
+        logger.warning('Could not build image variants for dish %s', instance.pk, exc_info=True)
+        return
+    Dish.objects.filter(pk=instance.pk).update(image_variants=instance.image_variants)
+    bump_menu_version()
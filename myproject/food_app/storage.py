@@ -0,0 +1,51 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#the text formats worth compressing; images and fonts are compressed already.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+#smaller files gain less than the Content-Encoding header and the extra lookup cost
+MIN_COMPRESS_SIZE = 256
+
+
+def compressed_variants(data):
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    #a variant is only kept when it saves at least 5%
+    return [(suffix, compressed) for suffix, compressed in variants if len(compressed) < len(data) * 0.95]
+
+
+#ManifestStaticFilesStorage ("app.css" -> "app.3f2a9c1b7d4e.css", listed in staticfiles.json) that also writes
+#"<name>.gz" (and "<name>.br" when the brotli package is installed) next to every compressible file at collectstatic
+#time, so food_app.fileserver can send them without compressing anything per request.
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self._compressible_names():
+            path = self.path(name)
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            for suffix, compressed in compressed_variants(data):
+                with open(path + suffix, 'wb') as fh:
+                    fh.write(compressed)
+            yield name, name, True
+
+    #the hashed names from the manifest and the plain names they were made from (both are served).
+    def _compressible_names(self):
+        names = set()
+        for original, hashed in self.hashed_files.items():
+            names.update((original, hashed))
+        return sorted(
+            name for name in names
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name) and os.path.getsize(self.path(name)) >= MIN_COMPRESS_SIZE
+        )
@@ -0,0 +1,181 @@
+import logging
+import random
+import threading
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+# A small task queue kept in the project database, so the work that follows an order (the confirmation
+# e-mail, the popularity counters) is taken off the checkout request without an external broker.
+#
+# Functions decorated with @task are queued with enqueue(func, **kwargs) and run by `manage.py run_tasks`.
+# A task is delivered at least once: a worker that dies mid-task loses it after TASK_VISIBILITY_TIMEOUT and
+# another worker runs it again. Tasks declared atomic (the default) run in one transaction with their
+# "done" mark, so their database work is applied exactly once; other tasks (e.g. e-mails) must tolerate a repeat.
+
+
+class TaskLost(Exception):
+    pass
+
+
+def visibility_timeout():
+    return timedelta(seconds=getattr(settings, 'TASK_VISIBILITY_TIMEOUT', 300))
+
+
+def default_max_attempts():
+    return getattr(settings, 'TASK_MAX_ATTEMPTS', 5)
+
+
+#exponential backoff with jitter: about TASK_RETRY_BACKOFF seconds after the first failure, doubled after
+#every next one, at most an hour, so a failing dependency is not hammered by all workers at the same moment.
+def retry_delay(attempts):
+    base = getattr(settings, 'TASK_RETRY_BACKOFF', 10)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600) * random.uniform(0.5, 1.0))
+
+
+#registers a function as a task; its name in the queue is "<module>.<function>".
+def task(max_attempts=None, atomic=True):
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        func.atomic = atomic
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+#queues a task with JSON serializable keyword arguments.
+#The row is inserted in the caller's transaction: it becomes visible to the workers only when that transaction
+#commits (so a task never sees an order that is not there yet) and disappears with it on a rollback.
+def enqueue(func, delay=None, **kwargs):
+    return Task.objects.create(
+        name=func.task_name,
+        kwargs=kwargs,
+        max_attempts=func.max_attempts or default_max_attempts(),
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+#takes the next due task: a queued one whose run_after has passed, or a running one whose worker
+#let its visibility timeout expire. The conditional UPDATE makes sure only one worker gets it;
+#on PostgreSQL, SKIP LOCKED also keeps the workers from waiting on each other's candidates.
+def claim_task(now=None, batch=10):
+    now = now or timezone.now()
+    candidates = Task.objects.filter(status__in=(Task.QUEUED, Task.RUNNING), run_after__lte=now)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        for task in candidates.order_by('run_after', 'id')[:batch]:
+            if task.attempts >= task.max_attempts:
+                _close(task, Task.FAILED, now, task.last_error or 'Przekroczony czas wykonania')
+                continue
+            claimed = Task.objects.filter(pk=task.pk, status=task.status, attempts=task.attempts).update(
+                status=Task.RUNNING, attempts=F('attempts') + 1, run_after=now + visibility_timeout()
+            )
+            if claimed:
+                task.status = Task.RUNNING
+                task.attempts += 1
+                return task
+    return None
+
+
+#updates the task only if no other worker has taken it over since it was claimed.
+def _close(task, status, now, error='', run_after=None):
+    fields = {'status': status, 'last_error': error}
+    if status in (Task.DONE, Task.FAILED):
+        fields['finished_at'] = now
+    if run_after is not None:
+        fields['run_after'] = run_after
+    return Task.objects.filter(pk=task.pk, attempts=task.attempts).update(**fields)
+
+
+def run_task(task):
+    func = _registry.get(task.name)
+    if func is None:
+        _close(task, Task.FAILED, timezone.now(), f'Nieznane zadanie: {task.name}')
+        return False
+    try:
+        with transaction.atomic() if func.atomic else nullcontext():
+            func(**task.kwargs)
+            if func.atomic and not _close(task, Task.DONE, timezone.now()):
+                raise TaskLost(task.pk)
+    except TaskLost:
+        logger.warning('Task %s was taken over by another worker, its work was rolled back', task.pk)
+        return False
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            logger.error('Task %s (%s) failed for good after %s attempts', task.pk, task.name, task.attempts)
+            _close(task, Task.FAILED, now, error)
+        else:
+            logger.warning('Task %s (%s) failed, retrying', task.pk, task.name, exc_info=True)
+            _close(task, Task.QUEUED, now, error, run_after=now + retry_delay(task.attempts))
+        return False
+    if not func.atomic:
+        _close(task, Task.DONE, timezone.now())
+    return True
+
+
+#deletes the tasks that finished successfully more than `days` ago; failed ones are kept for inspection.
+def purge_finished(days=None):
+    days = getattr(settings, 'TASK_KEEP_FINISHED_DAYS', 7) if days is None else days
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+#Runs tasks in `threads` threads until stop() is called, or, with burst=True, until no task is due.
+class Worker:
+    def __init__(self, threads=1, poll_interval=1.0, burst=False):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.processed = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def run(self):
+        if self.threads == 1:
+            self._loop()
+            return self.processed
+        workers = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.processed
+
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                #like a request: drop a broken connection or one older than CONN_MAX_AGE (not in a test transaction).
+                if not connection.in_atomic_block:
+                    close_old_connections()
+                task = claim_task()
+                if task is None:
+                    if self.burst:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    continue
+                run_task(task)
+                with self._lock:
+                    self.processed += 1
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
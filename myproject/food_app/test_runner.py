@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+#The default test runner with QUERY_BUDGET_STRICT turned on,
+#so any view that runs more queries than its query_budget fails the test that requested it.
+class QueryBudgetTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budget_strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        settings.QUERY_BUDGET_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self._query_budget_strict
+        super().teardown_test_environment(**kwargs)
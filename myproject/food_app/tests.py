@@ -5,9 +5,62 @@ from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.messages import get_messages
-from django.test import Client, TestCase
+from django.contrib.sessions.models import Session
+from decimal import Decimal
+import csv
+import gzip
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import time as datetime_time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from wsgiref.util import FileWrapper
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError as DatabaseIntegrityError, connection, connections, transaction
+from django.db import models
+from django.db.models import QuerySet, Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Dish, Orders, OrdersDish
+from django.utils import timezone
+from PIL import Image
+from .async_views import AsyncHomeView, AsyncOrderExportView, AsyncOrderHistoryView, AsyncOrderSuccessView, AsyncOrderView
+from . import reporting
+from .archive import ArchiveNotRolledUp, OrderArchive, archive_cutoff, archive_orders, order_archive, retention_days
+from .benchmarks import fixtures, load, logins, micro, plans, sessions, startup
+from .benchmarks.stats import percentile
+from .exports import InvalidExport, OrderExport
+from .fileserver import IMMUTABLE, REVALIDATE, AsyncFileServer, FileResolver, FileServer
+from .menu_cache import clear_local_menu_cache, get_menu
+from .migration_operations import AddIndexConcurrently, EnsureExtension
+from .middleware import ProfilingMiddleware, QueryBudgetExceeded, view_stats
+from .models import Dish, DishPopularity, OrderSubmission, Orders, OrdersDish, SalesRollup, Task
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .popularity import order_counts, recently_popular
+from .routers import ReadReplicaRouter, _read_replica, read_replica
+from .search import MenuIndex, search_dishes, tokenize
+from .sessions import WRITTEN_AT_KEY, SessionStore, sweep_expired_sessions
+from .services import InvalidOrder, new_idempotency_key, place_order
+from .throttle import TokenBucket
+from .tasks import Worker, claim_task, enqueue, run_task, task
+from .warmup import app_templates, lifespan, warm_up, warm_up_worker
+
+
+def run_tasks():
+    return Worker(burst=True).run()
 
 
 class RegisterViewGetTestCase(TestCase):
@@ -84,6 +137,80 @@ class LoginViewTestCase(TestCase):
         self.assertContains(response, '<button type="submit">Zaloguj się</button>', html=True)
 
 
+@override_settings(LOGIN_THROTTLE={'ip': (4, 60), 'user_ip': (2, 60), 'username': (3, 60)})
+class LoginThrottleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='throttleuser', password='testpassword')
+
+    def tearDown(self):
+        # the emptied buckets would outlive the override and throttle the logins of the other tests
+        cache.clear()
+
+    def login(self, username, password='wrongpassword', client=None):
+        return (client or self.client).post(reverse('login'), {'username': username, 'password': password})
+
+    def test_password_is_checked_once_per_login(self):
+        with mock.patch.object(User, 'check_password', autospec=True, side_effect=User.check_password) as check:
+            response = self.login('throttleuser', 'testpassword')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(check.call_count, 1)
+        self.assertContains(self.client.get(reverse('home')), 'Zalogowałeś się jako throttleuser')
+
+    def test_token_bucket_refills(self):
+        bucket = TokenBucket('test', capacity=2, refill=10)
+        self.assertEqual([bucket.take('a', now=0), bucket.take('a', now=0), bucket.take('a', now=0)], [0, 0, 10])
+        self.assertEqual(bucket.take('b', now=0), 0)
+        self.assertEqual(bucket.take('a', now=5), 5)
+        self.assertEqual(bucket.take('a', now=10), 0)
+
+    def test_username_is_throttled_before_hashing(self):
+        self.assertEqual(self.login('throttleuser').status_code, 200)
+        self.assertEqual(self.login(' ThrottleUser').status_code, 200)
+        with mock.patch.object(User, 'check_password') as check:
+            response = self.login('throttleuser', 'testpassword')
+        check.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertContains(response, 'Zbyt wiele prób logowania', status_code=429)
+        self.assertEqual(self.login('otheruser').status_code, 200)
+
+    def test_address_is_throttled_across_usernames(self):
+        for i in range(4):
+            self.assertEqual(self.login(f'user{i}').status_code, 200)
+        self.assertEqual(self.login('throttleuser', 'testpassword').status_code, 429)
+        other_address = Client(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(self.login('throttleuser', 'testpassword', other_address).status_code, 302)
+
+    def test_successful_logins_are_not_throttled(self):
+        for _ in range(6):
+            self.assertEqual(self.login('throttleuser', 'testpassword').status_code, 302)
+            self.client.logout()
+
+    def test_one_address_cannot_lock_the_user_out_of_another(self):
+        attacker = Client(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(self.login('throttleuser', client=attacker).status_code, 200)
+        self.assertEqual(self.login('throttleuser', client=attacker).status_code, 200)
+        self.assertEqual(self.login('throttleuser', 'testpassword', attacker).status_code, 429)
+        self.assertEqual(self.login('throttleuser', 'testpassword').status_code, 302)
+
+    def test_username_has_a_ceiling_across_addresses(self):
+        for i in range(3):
+            self.assertEqual(self.login('throttleuser', client=Client(REMOTE_ADDR=f'10.0.1.{i}')).status_code, 200)
+        self.assertEqual(self.login('throttleuser', 'testpassword', Client(REMOTE_ADDR='10.0.1.9')).status_code, 429)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_address_behind_the_proxy_comes_from_x_forwarded_for(self):
+        for i in range(4):
+            client = Client(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'1.2.3.{i}, 203.0.113.7')
+            self.assertEqual(self.login(f'user{i}', client=client).status_code, 200)
+        # the proxy's address and a forged leftmost entry do not matter, the entry the proxy appended does
+        forged = Client(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.7')
+        self.assertEqual(self.login('throttleuser', 'testpassword', forged).status_code, 429)
+        other_client = Client(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.8')
+        self.assertEqual(self.login('throttleuser', 'testpassword', other_client).status_code, 302)
+
+
 class LogoutViewTestCase(TestCase):
     def setUp(self):
         self.client = Client()
@@ -144,14 +271,244 @@ class OrderViewTestCase(TestCase):
 
         response = self.client.post('/order/', data=order_data)
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, 'Your order has been successfully submitted')
+        self.assertContains(response, 'Zamówienie złożone!')
         self.assertEqual(Orders.objects.count(), 1)
         self.assertEqual(OrdersDish.objects.count(), 2)
 
 
+class CartTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.user = get_user_model().objects.create_user(username='cartuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Opis')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+
+    def test_cart_changes_return_the_cart_with_its_total(self):
+        get_menu()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('cart_add'), {'dish': self.pizza.pk, 'count': 2})
+        self.assertFalse([q for q in ctx.captured_queries if '"food_app_dish"' in q['sql']])
+        self.assertEqual(response.json()['total'], '50.00')
+
+        self.client.post(reverse('cart_add'), {'dish': self.burger.pk})
+        response = self.client.post(reverse('cart_update'), json.dumps({'dish': self.pizza.pk, 'count': 1}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['total'], '40.00')
+        self.assertEqual(response.json()['count'], 2)
+
+        response = self.client.post(reverse('cart_remove'), {'dish': self.burger.pk})
+        self.assertEqual(response.json()['lines'], [
+            {'dish_id': self.pizza.pk, 'name': 'Pizza', 'count': 1, 'unit_price': '25.00', 'price': '25.00'},
+        ])
+        self.assertEqual(self.client.get(reverse('cart')).json()['total'], '25.00')
+
+    def test_invalid_changes_are_rejected(self):
+        for data in ({'dish': 999999}, {'dish': self.pizza.pk, 'count': -1}, {'dish': 'x'}):
+            response = self.client.post(reverse('cart_add'), data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(reverse('cart')).json()['lines'], [])
+
+    def test_menu_change_reprices_the_cart(self):
+        self.client.post(reverse('cart_add'), {'dish': self.pizza.pk, 'count': 2})
+        self.client.post(reverse('cart_add'), {'dish': self.burger.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.net_price = 30
+            self.pizza.save()
+            self.burger.delete()
+        cart = self.client.get(reverse('cart')).json()
+        self.assertEqual((cart['total'], len(cart['lines'])), ('60.00', 1))
+
+    def test_checkout_places_the_order_and_empties_the_cart(self):
+        self.client.post(reverse('cart_add'), {'dish': self.pizza.pk, 'count': 2})
+        response = self.client.post(reverse('cart_checkout'), self.customer)
+        self.assertEqual(response.status_code, 403)
+
+        # the cart is kept when the visitor logs in
+        self.client.force_login(self.user)
+        self.client.post(reverse('cart_add'), {'dish': self.burger.pk, 'count': 1})
+        key = new_idempotency_key()
+        response = self.client.post(reverse('cart_checkout'), dict(self.customer, idempotency_key=key))
+        order = Orders.objects.get()
+        self.assertEqual(response.json(), {
+            'order_id': order.pk, 'total': '65.00', 'url': reverse('order_success', args=[order.pk]),
+        })
+        self.assertEqual(OrdersDish.objects.filter(orders=order, user=self.user).count(), 2)
+        self.assertEqual(self.client.get(reverse('cart')).json()['lines'], [])
+
+        # the cart is empty now; a retry with the same key gets the order it placed
+        response = self.client.post(reverse('cart_checkout'), dict(self.customer, idempotency_key=key))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['order_id'], order.pk)
+        self.assertEqual(Orders.objects.count(), 1)
+
+        response = self.client.post(reverse('cart_checkout'), dict(self.customer, idempotency_key=new_idempotency_key()))
+        self.assertEqual(response.status_code, 400)
+
+
+class JsonApiTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.user = get_user_model().objects.create_user(username='apiuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Opis')
+        self.customer = {'customer_name': 'Test User', 'customer_email': 'testuser@test.com'}
+
+    def test_dishes_with_sparse_fields_and_etag(self):
+        response = self.client.get(reverse('api_dishes'), {'fields': 'name,net_price'})
+        self.assertEqual(response.content.decode(), '{"dishes":[{"name":"Pizza","net_price":"25.00"},'
+                                                    '{"name":"Burger","net_price":"15.00"}]}')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse('api_dishes'), {'fields': 'name,net_price'},
+                                    HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_dishes'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.net_price = 30
+            self.pizza.save()
+        changed = self.client.get(reverse('api_dishes'), {'fields': 'name,net_price'},
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['dishes'][0]['net_price'], '30.00')
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api_dishes'), {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_orders_are_projected_and_paged(self):
+        self.assertEqual(self.client.get(reverse('api_orders')).status_code, 403)
+        self.client.force_login(self.user)
+        orders = [place_order(self.user, self.customer, {self.pizza.pk: i + 1}) for i in range(25)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_orders'), {'fields': 'id,total_price'})
+        page_sql = [q['sql'] for q in ctx.captured_queries if '"food_app_orders"' in q['sql']]
+        self.assertNotIn('customer_email', page_sql[0])
+        data = response.json()
+        self.assertEqual(data['orders'][0], {'id': orders[-1].pk, 'total_price': '625.00'})
+        self.assertEqual(len(data['orders']), 20)
+
+        rest = self.client.get(reverse('api_orders'), {'fields': 'id,lines', 'cursor': data['next']}).json()
+        self.assertEqual([order['id'] for order in rest['orders']], [order.pk for order in orders[4::-1]])
+        self.assertEqual(rest['orders'][-1]['lines'][0]['name'], 'Pizza')
+        self.assertIsNone(rest['next'])
+
+        self.assertEqual(self.client.get(reverse('api_orders'), {'cursor': 'zzz'}).status_code, 400)
+        again = self.client.get(reverse('api_orders'), {'fields': 'id,total_price'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_large_payloads_are_gzipped(self):
+        for i in range(20):
+            Dish.objects.create(name=f'Danie {i}', net_price=10, description='Opis ' * 20)
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        response = self.client.get(reverse('api_dishes'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+
+def session_writes(queries):
+    return [q['sql'] for q in queries if 'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+
+class SessionStorageTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.user = get_user_model().objects.create_user(username='sessionuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+
+    def test_cached_db_tier_is_the_default(self):
+        self.assertEqual(settings.SESSION_ENGINE, 'food_app.sessions')
+        self.assertEqual(settings.MESSAGE_STORAGE, 'django.contrib.messages.storage.cookie.CookieStorage')
+
+    def test_login_writes_the_session_once_and_messages_go_to_a_cookie(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('login'), {'username': 'sessionuser', 'password': 'testpassword'})
+        self.assertEqual(len(session_writes(ctx.captured_queries)), 1)
+        self.assertIn('messages', response.cookies)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Zalogowałeś się jako sessionuser')
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+
+    def test_login_replaces_the_previous_session(self):
+        self.client.post(reverse('cart_add'), {'dish': self.pizza.pk})
+        old_key = self.client.session.session_key
+        self.client.post(reverse('login'), {'username': 'sessionuser', 'password': 'testpassword'})
+        self.assertNotEqual(self.client.session.session_key, old_key)
+        self.assertFalse(Session.objects.filter(session_key=old_key).exists())
+        self.assertEqual(self.client.get(reverse('cart')).json()['count'], 1)
+
+    def test_unchanged_session_is_not_written(self):
+        self.client.post(reverse('cart_add'), {'dish': self.pizza.pk, 'count': 2})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('cart_update'), {'dish': self.pizza.pk, 'count': 2})
+        self.assertEqual(session_writes(ctx.captured_queries), [])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('cart_update'), {'dish': self.pizza.pk, 'count': 3})
+        self.assertEqual(len(session_writes(ctx.captured_queries)), 1)
+        self.assertEqual(SessionStore(self.client.session.session_key).load()['food_app_cart']['lines'][str(self.pizza.pk)][1], 3)
+
+    def test_unchanged_session_is_written_after_the_interval(self):
+        store = SessionStore()
+        store['key'] = 'value'
+        store.save()
+        session = Session.objects.get(session_key=store.session_key)
+        Session.objects.filter(pk=session.pk).update(expire_date=session.expire_date - timedelta(days=3))
+        cache.clear()
+
+        store = SessionStore(session.session_key)
+        store['key'] = 'value'
+        store.save()
+        self.assertEqual(Session.objects.get(pk=session.pk).expire_date, session.expire_date - timedelta(days=3))
+
+        store = SessionStore(session.session_key)
+        store[WRITTEN_AT_KEY] = store[WRITTEN_AT_KEY] - settings.SESSION_WRITE_INTERVAL
+        store.save()
+        self.assertGreater(Session.objects.get(pk=session.pk).expire_date, session.expire_date - timedelta(days=3))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db',
+                       MESSAGE_STORAGE='django.contrib.messages.storage.fallback.FallbackStorage')
+    def test_db_tier(self):
+        client = Client()
+        client.post(reverse('login'), {'username': 'sessionuser', 'password': 'testpassword'})
+        self.assertContains(client.get(reverse('home')), 'Zalogowany jako: sessionuser')
+        self.assertTrue(Session.objects.exists())
+
+    def test_expired_sessions_are_swept_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i:025}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='valid'.ljust(32, '0'), session_data='', expire_date=now + timedelta(days=1))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sweep_expired_sessions(batch_size=2), 5)
+        self.assertEqual(len(session_writes(ctx.captured_queries)), 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['valid'.ljust(32, '0')])
+
+        out = StringIO()
+        call_command('sweep_sessions', stdout=out)
+        self.assertIn('Deleted 0 expired sessions.', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('sweep_sessions', batch_size=0)
+
+
 class OrderSuccessViewTestCase(TestCase):
     def setUp(self):
         self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
         self.dish_1 = Dish.objects.create(
             name='Pizza',
             net_price=25,
@@ -172,18 +529,19 @@ class OrderSuccessViewTestCase(TestCase):
         self.order_dish_1 = self.order.ordersdish_set.create(
             dish=self.dish_1,
             count=2,
-            user=None,
+            user=self.user,
             price=50,
         )
         self.order_dish_2 = self.order.ordersdish_set.create(
             dish=self.dish_2,
             count=3,
-            user=None,
+            user=self.user,
             price=35,
         )
+        self.client.login(username='testuser', password='testpassword')
 
     def test_order_success_view(self):
-        url = reverse('order-success', args=[self.order.pk])
+        url = reverse('order_success', args=[self.order.pk])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'food_app/order_success.html')
@@ -197,14 +555,30 @@ class OrderSuccessViewTestCase(TestCase):
         self.assertContains(response, '3')
         self.assertContains(response, '85')
 
+    def test_order_of_another_user_returns_404(self):
+        get_user_model().objects.create_user(username='otheruser', password='testpassword')
+        self.client.login(username='otheruser', password='testpassword')
+        response = self.client.get(reverse('order_success', args=[self.order.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('order_success', args=[self.order.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertNotContains(response, 'testuser@test.com', status_code=302)
+
 
 class OrderHistoryViewTestCase(TestCase):
     def setUp(self):
         self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        dish = Dish.objects.create(name='Pizza', net_price=10, description='Opis')
         self.orders = Orders.objects.create(customer_name='Test Customer', customer_email='test@example.com',
                                             customer_phone='1234567890', customer_address='Test Address',
                                             total_price='10')
-        self.url = reverse('order-history')
+        OrdersDish.objects.create(orders=self.orders, dish=dish, count=1, user=self.user, price=10)
+        self.client.force_login(self.user)
+        self.url = reverse('order_history')
 
     def test_order_history_view(self):
         response = self.client.get(self.url)
@@ -215,7 +589,1480 @@ class OrderHistoryViewTestCase(TestCase):
         self.assertContains(response, '1234567890')
         self.assertContains(response, 'Test Address')
         self.assertContains(response, '10')
-        self.assertQuerysetEqual(response.context['orders'], [repr(self.orders)])
+        self.assertEqual(list(response.context['orders']), [self.orders])
+
+
+class PlaceOrderTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.dishes = [
+            Dish.objects.create(name='Danie {}'.format(i), net_price=10 + i, description='Opis')
+            for i in range(12)
+        ]
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+
+    def _count_queries(self, lines):
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(self.user, self.customer, lines)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_number_of_lines(self):
+        one_line = self._count_queries({self.dishes[0].pk: 1})
+        twelve_lines = self._count_queries({dish.pk: 2 for dish in self.dishes})
+        self.assertEqual(one_line, twelve_lines)
+        # in_bulk lookup, Orders insert, one bulk insert of the lines,
+        # the two follow-up task inserts and the savepoint pair
+        self.assertLessEqual(twelve_lines, 7)
+
+    def test_order_is_inserted_with_final_total_price(self):
+        order = place_order(self.user, self.customer, {self.dishes[0].pk: 2, self.dishes[1].pk: 3})
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal('53.00'))
+        self.assertEqual(OrdersDish.objects.filter(orders=order, user=self.user).count(), 2)
+
+    def test_unknown_dish_is_rejected_without_writing(self):
+        with self.assertRaises(InvalidOrder):
+            place_order(self.user, self.customer, {self.dishes[0].pk: 1, 999999: 1})
+        self.assertEqual(Orders.objects.count(), 0)
+        self.assertEqual(OrdersDish.objects.count(), 0)
+
+    def test_order_without_lines_is_rejected_without_writing(self):
+        with self.assertRaises(InvalidOrder):
+            place_order(self.user, self.customer, {})
+        self.assertEqual(Orders.objects.count(), 0)
+        self.assertEqual(Task.objects.count(), 0)
+
+
+class OrderSummaryTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Opis')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+        self.client.force_login(self.user)
+
+    def test_summary_is_written_with_the_order(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 2, self.burger.pk: 1})
+        order.refresh_from_db()
+        self.assertEqual(order.summary, [
+            {'dish_id': self.pizza.pk, 'name': 'Pizza', 'count': 2, 'unit_price': '25.00', 'price': '50.00'},
+            {'dish_id': self.burger.pk, 'name': 'Burger', 'count': 1, 'unit_price': '15.00', 'price': '15.00'},
+        ])
+
+    def test_summary_keeps_the_price_the_order_was_placed_at(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 2})
+        self.pizza.net_price = 99
+        self.pizza.save()
+        response = self.client.get(reverse('order_success', args=[order.pk]))
+        self.assertContains(response, '50.00 zł')
+        self.assertNotContains(response, '198')
+
+    def test_success_page_is_rendered_from_one_row(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 2, self.burger.pk: 1})
+        # the user and the order; the session comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order_success', args=[order.pk]))
+        self.assertContains(response, 'Pizza - 2 sztuk')
+        self.assertContains(response, 'Burger - 1 sztuk')
+
+    def test_unknown_order_returns_404(self):
+        response = self.client.get(reverse('order_success', args=[999999]))
+        self.assertEqual(response.status_code, 404)
 
+    def test_lines_saved_one_by_one_refresh_the_summary(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 1})
+        line = order.ordersdish_set.create(dish=self.burger, count=3, user=self.user, price=45)
+        order.refresh_from_db()
+        self.assertEqual([entry['name'] for entry in order.summary], ['Pizza', 'Burger'])
+        line.delete()
+        order.refresh_from_db()
+        self.assertEqual([entry['name'] for entry in order.summary], ['Pizza'])
 
+    def test_deleting_an_order_does_not_rebuild_its_summary(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 1, self.burger.pk: 2})
+        with mock.patch.object(Orders, 'refresh_summary') as refresh:
+            order.delete()
+            place_order(self.user, self.customer, {self.pizza.pk: 1})
+            Orders.objects.all().delete()
+        refresh.assert_not_called()
+        self.assertFalse(OrdersDish.objects.exists())
 
+
+class IdempotentOrderTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+        self.key = new_idempotency_key()
+
+    def test_replayed_submission_returns_the_first_order(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 2}, self.key)
+        with self.assertNumQueries(1):
+            replay = place_order(self.user, self.customer, {self.pizza.pk: 5}, self.key)
+        self.assertEqual(replay.pk, order.pk)
+        self.assertEqual(Orders.objects.count(), 1)
+        run_tasks()
+        self.assertEqual(order_counts(), {self.pizza.pk: 1})
+
+    def test_key_of_another_user_is_rejected(self):
+        place_order(self.user, self.customer, {self.pizza.pk: 1}, self.key)
+        other = get_user_model().objects.create_user(username='other', password='testpassword')
+        with self.assertRaises(InvalidOrder):
+            place_order(other, self.customer, {self.pizza.pk: 1}, self.key)
+
+    def test_failed_order_releases_the_key(self):
+        with self.assertRaises(InvalidOrder):
+            place_order(self.user, self.customer, {999999: 1}, self.key)
+        order = place_order(self.user, self.customer, {self.pizza.pk: 1}, self.key)
+        self.assertEqual(OrderSubmission.objects.get(key=self.key).order, order)
+
+    def test_form_double_submit_places_one_order(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('order'))
+        key = response.context['idempotency_key']
+        self.assertContains(response, 'name="idempotency_key" value="{}"'.format(key))
+        data = dict(self.customer, dishes=[self.pizza.pk], idempotency_key=key)
+        data['counts_{}'.format(self.pizza.pk)] = 2
+        first = self.client.post(reverse('order'), data)
+        second = self.client.post(reverse('order'), data)
+        self.assertEqual(first.context['order'].pk, second.context['order'].pk)
+        self.assertEqual(Orders.objects.count(), 1)
+
+        response = self.client.post(reverse('order'), dict(data, idempotency_key='<script>'))
+        self.assertRedirects(response, reverse('order'))
+
+
+class ConcurrentOrderSubmissionTestCase(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('the in-memory SQLite test database cannot serve concurrent writers (set DB_TEST_NAME)')
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+
+    def test_parallel_submissions_place_one_order(self):
+        key = new_idempotency_key()
+        threads = 8
+        barrier = threading.Barrier(threads)
+        results = []
+        errors = []
+
+        def submit():
+            try:
+                barrier.wait()
+                results.append(place_order(self.user, {'customer_name': 'Test User'}, {self.pizza.pk: 1}, key).pk)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=submit) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), threads)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(Orders.objects.count(), 1)
+        self.assertEqual(OrdersDish.objects.count(), 1)
+        run_tasks()
+        self.assertEqual(order_counts(), {self.pizza.pk: 1})
+
+
+@task(max_attempts=2)
+def flaky_task(key, fail_times):
+    if cache.incr(key) <= fail_times:
+        raise RuntimeError('temporary failure')
+    Dish.objects.create(name=key, net_price=1, description='Opis')
+
+
+class TaskQueueTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+
+    def _flaky(self, fail_times):
+        cache.set('flaky', 0)
+        return enqueue(flaky_task, key='flaky', fail_times=fail_times)
+
+    def test_placed_order_queues_the_confirmation_email(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 2})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(run_tasks(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['testuser@test.com'])
+        self.assertIn('Pizza - 2 sztuk - 50.00 zł', mail.outbox[0].body)
+        self.assertIn(str(order.pk), mail.outbox[0].subject)
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {Task.DONE})
+
+    def test_rolled_back_order_queues_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                place_order(self.user, self.customer, {self.pizza.pk: 1})
+                raise RuntimeError
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        queued = self._flaky(fail_times=1)
+        run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.QUEUED, 1))
+        self.assertIn('temporary failure', queued.last_error)
+        self.assertGreater(queued.run_after, timezone.now())
+
+        Task.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertTrue(Dish.objects.filter(name='flaky').exists())
+
+    def test_task_fails_after_max_attempts(self):
+        queued = self._flaky(fail_times=5)
+        for _ in range(2):
+            Task.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+            run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.FAILED, 2))
+
+    def test_failed_atomic_task_leaves_no_partial_work(self):
+        queued = self._flaky(fail_times=1)
+        with mock.patch('food_app.tests.Dish.objects.create', side_effect=RuntimeError('late failure')):
+            run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertFalse(Dish.objects.filter(name='flaky').exists())
+
+    def test_expired_visibility_timeout_hands_the_task_to_another_worker(self):
+        queued = self._flaky(fail_times=0)
+        first = claim_task()
+        self.assertIsNone(claim_task())
+        second = claim_task(now=timezone.now() + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT + 1))
+        self.assertEqual((first.pk, second.pk), (queued.pk, queued.pk))
+        # the first worker finishes late: its work is rolled back, the second one's counts
+        self.assertFalse(run_task(first))
+        self.assertFalse(Dish.objects.filter(name='flaky').exists())
+        self.assertTrue(run_task(second))
+        self.assertEqual(Dish.objects.filter(name='flaky').count(), 1)
+
+    def test_command_runs_due_tasks(self):
+        place_order(self.user, self.customer, {self.pizza.pk: 1})
+        out = StringIO()
+        call_command('run_tasks', '--burst', '--threads=1', stdout=out)
+        self.assertIn('Processed 2 tasks', out.getvalue())
+        self.assertEqual(order_counts(), {self.pizza.pk: 1})
+
+
+class OrderHistoryKeysetTestCase(TestCase):
+    def setUp(self):
+        self.password = 'testpassword'
+        self.user = get_user_model().objects.create_user(username='historyuser', password=self.password)
+        self.other_user = get_user_model().objects.create_user(username='otheruser', password=self.password)
+        self.dishes = [
+            Dish.objects.create(name='Danie {}'.format(i), net_price=10, description='Opis') for i in range(4)
+        ]
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+        self.orders = [
+            place_order(self.user, self.customer, {dish.pk: 1 for dish in self.dishes[:1 + i % 4]})
+            for i in range(25)
+        ]
+        place_order(self.other_user, self.customer, {self.dishes[0].pk: 1})
+        self.client.login(username=self.user.username, password=self.password)
+        self.url = reverse('order_history')
+
+    def test_page_costs_a_fixed_number_of_queries(self):
+        # user and one page of orders; the session comes from the cache and the lines from Orders.summary
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['orders']), 10)
+
+    def test_cursor_walks_every_order_once_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            seen.extend(order.pk for order in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        expected = [order.pk for order in sorted(self.orders, key=lambda o: (o.created_at, o.pk), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_cursor_bounds_the_leading_column(self):
+        paginator = KeysetPaginator(Orders.objects.all(), 10)
+        cursor = paginator.encode_cursor(self.orders[10])
+        sql = str(paginator.filter_after(paginator.queryset, cursor).query)
+        self.assertIn('"created_at" <=', sql)
+        self.assertEqual(
+            list(paginator.filter_after(paginator.queryset, cursor)),
+            [order for order in paginator.queryset if (order.created_at, order.pk) < (self.orders[10].created_at, self.orders[10].pk)],
+        )
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderArchiveTestCase(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        settings_override = override_settings(ORDER_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(username='archiveuser', password='testpassword')
+        self.other_user = get_user_model().objects.create_user(username='otheruser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+        self.customer = {'customer_name': 'Test User', 'customer_email': 'testuser@test.com'}
+        now = timezone.now()
+        # 5 recent orders and 7 from two months over a year ago, newest first
+        self.moments = [now - timedelta(days=i) for i in range(5)]
+        self.moments += [now - timedelta(days=400 + 20 * i) for i in range(7)]
+        self.orders = []
+        for i, moment in enumerate(self.moments):
+            order = place_order(self.user, self.customer, {self.pizza.pk: i + 1})
+            Orders.objects.filter(pk=order.pk).update(created_at=moment)
+            self.orders.append(order)
+        self.other_order = place_order(self.other_user, self.customer, {self.pizza.pk: 1})
+        Orders.objects.filter(pk=self.other_order.pk).update(created_at=self.moments[-1])
+        # archive_orders only takes the orders the sales rollups have counted
+        reporting.roll_up(batch=timedelta(days=1000))
+        self.client.force_login(self.user)
+
+    def test_old_orders_move_to_monthly_segments(self):
+        archived, segments = archive_orders(batch_size=3)
+        self.assertEqual(archived, 8)
+        self.assertEqual(len({segment.split('/')[0] for segment in segments}), len(segments))
+        self.assertEqual(Orders.objects.count(), 5)
+        self.assertFalse(OrdersDish.objects.filter(orders_id=self.other_order.pk).exists())
+        for segment in segments:
+            with open(f'{self.archive_dir}/{segment}.ndjson.gz', 'rb') as fh:
+                self.assertEqual(fh.read(2), b'\x1f\x8b')
+        archived_orders = order_archive().user_orders(self.user.pk, limit=20)
+        self.assertEqual([order.pk for order in archived_orders], [order.pk for order in self.orders[5:]])
+        self.assertEqual(archived_orders[0].summary, self.orders[5].summary)
+        self.assertEqual(archived_orders[0].total_price, Decimal('150.00'))
+        self.assertEqual(archive_orders(), (0, []))
+
+    def test_history_pages_into_the_archive(self):
+        archive_orders()
+        response = self.client.get(reverse('order_history'))
+        self.assertEqual([order.pk for order in response.context['orders']], [order.pk for order in self.orders[:10]])
+        self.assertContains(response, 'Starsze zamówienia')
+        response = self.client.get(reverse('order_history'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual([order.pk for order in response.context['orders']], [order.pk for order in self.orders[10:]])
+        self.assertFalse(response.context['page_obj'].has_next)
+        self.assertContains(response, 'Test User')
+
+    def test_archive_is_not_read_while_there_are_live_orders(self):
+        archive_orders()
+        for _ in range(6):
+            place_order(self.user, self.customer, {self.pizza.pk: 1})
+        with mock.patch('food_app.archive.order_archive') as archive:
+            response = self.client.get(reverse('order_history'))
+        archive.assert_not_called()
+        self.assertTrue(response.context['page_obj'].has_next)
+
+    def test_popularity_counts_archived_lines(self):
+        run_tasks()
+        archive_orders()
+        call_command('rebuild_popularity', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_popularity', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(DishPopularity.objects.get(dish=self.pizza).order_count, 13)
+
+    def test_only_recent_segment_indexes_stay_in_memory(self):
+        archive_orders(batch_size=1)
+        archive = OrderArchive(self.archive_dir)
+        archive._indexes.maxsize = 2
+        self.assertEqual(len(archive.user_orders(self.user.pk, limit=20)), 7)
+        self.assertGreater(len(archive.segments()), 2)
+        self.assertEqual(len(archive._indexes._data), 2)
+
+    def test_cutoff_is_a_local_midnight(self):
+        archive_orders()
+        horizon = order_archive().archived_before()
+        self.assertEqual(horizon, archive_cutoff(timezone.now() - timedelta(days=retention_days())))
+        self.assertEqual(timezone.localtime(horizon).time(), datetime_time.min)
+
+    def test_sales_rollups_survive_archiving(self):
+        reporting.roll_up()
+        totals = reporting.report_totals(self.moments[-1] - timedelta(days=1), timezone.now() + timedelta(days=1))
+        archive_orders()
+        call_command('rollup_sales', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rollup_sales', '--rebuild', stdout=StringIO())
+        call_command('rollup_sales', '--check', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            reporting.report_totals(self.moments[-1] - timedelta(days=1), timezone.now() + timedelta(days=1)), totals
+        )
+
+    def test_orders_are_archived_only_once_rolled_up(self):
+        reporting.reset_rollups()
+        reporting.roll_up(now=self.moments[-2], batch=timedelta(days=1000))
+        with self.assertRaisesMessage(ArchiveNotRolledUp, 'rollup_sales'):
+            archive_orders()
+        with self.assertRaisesMessage(CommandError, 'rollup_sales'):
+            call_command('archive_orders', stdout=StringIO())
+        self.assertEqual(Orders.objects.count(), 13)
+        self.assertIsNone(order_archive().archived_before())
+
+        reporting.roll_up(batch=timedelta(days=1000))
+        start, end = self.moments[-1] - timedelta(days=1), timezone.now() + timedelta(days=1)
+        totals = reporting.report_totals(start, end)
+        archive_orders()
+        self.assertEqual(reporting.report_totals(start, end), totals)
+        self.assertEqual(reporting.report_totals(start, order_archive().archived_before())['order_count'], 8)
+
+    def test_export_starts_at_the_archive_cutoff(self):
+        archive_orders()
+        rows = [json.loads(line) for line in ''.join(OrderExport(format='ndjson')).splitlines()]
+        self.assertEqual({row['order_id'] for row in rows}, {order.pk for order in self.orders[:5]})
+        with self.assertRaises(InvalidExport):
+            OrderExport(start=self.moments[-1])
+        with self.assertRaises(InvalidExport):
+            OrderExport(end=order_archive().archived_before())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_orders', stdout=out)
+        self.assertIn('Archived 8 orders', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archive_orders', days=1)
+
+
+class OrderAdminTestCase(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(username='admin', password='adminpassword')
+        self.client.login(username='admin', password='adminpassword')
+        self.dish = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.customer = {
+            'customer_name': 'Jan Kowalski',
+            'customer_email': 'jan@example.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+
+    def _changelist_queries(self, model_name, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:food_app_{}_changelist'.format(model_name)), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        place_order(self.admin, self.customer, {self.dish.pk: 1})
+        orders = self._changelist_queries('orders')
+        lines = self._changelist_queries('ordersdish')
+        for _ in range(20):
+            place_order(self.admin, self.customer, {self.dish.pk: 2})
+        self.assertEqual(self._changelist_queries('orders'), orders)
+        self.assertEqual(self._changelist_queries('ordersdish'), lines)
+
+    def test_date_filter_is_a_range_on_created_at(self):
+        recent = place_order(self.admin, self.customer, {self.dish.pk: 1})
+        old = place_order(self.admin, self.customer, {self.dish.pk: 1})
+        Orders.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:food_app_orders_changelist'), {'created': '30d'})
+        self.assertEqual(list(response.context['cl'].result_list), [recent])
+        self.assertFalse([query for query in ctx.captured_queries if 'DISTINCT' in query['sql'] or 'MIN(' in query['sql']])
+
+    def test_search_uses_prefix_and_order_number_lookups(self):
+        order = place_order(self.admin, self.customer, {self.dish.pk: 1})
+        response = self.client.get(reverse('admin:food_app_orders_changelist'), {'q': 'jan@'})
+        self.assertEqual(list(response.context['cl'].result_list), [order])
+        response = self.client.get(reverse('admin:food_app_ordersdish_changelist'), {'q': str(order.pk)})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        response = self.client.get(reverse('admin:food_app_ordersdish_changelist'), {'q': 'Pizza'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+
+    def test_change_form_does_not_list_every_related_row(self):
+        order = place_order(self.admin, self.customer, {self.dish.pk: 1})
+        line = order.ordersdish_set.get()
+        response = self.client.get(reverse('admin:food_app_ordersdish_change', args=[line.pk]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_paginator_uses_the_estimate_only_for_huge_results(self):
+        for _ in range(3):
+            place_order(self.admin, self.customer, {self.dish.pk: 1})
+        queryset = Orders.objects.order_by('-id')
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        with mock.patch('food_app.pagination.estimated_count', return_value=5000000):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(paginator.count, 5000000)
+        with mock.patch('food_app.pagination.estimated_count', return_value=50):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+
+
+class OrderExportTestCase(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(username='finance', password='testpassword', is_staff=True)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Opis')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+        self.orders = [
+            place_order(self.user, self.customer, {self.pizza.pk: 1, self.burger.pk: 2}),
+            place_order(self.staff, self.customer, {self.pizza.pk: 3}),
+            place_order(self.user, self.customer, {self.burger.pk: 1}),
+        ]
+        self.url = reverse('order_export')
+
+    def _export(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_csv_has_one_row_per_line(self):
+        rows = list(csv.DictReader(StringIO(self._export())))
+        self.assertEqual([(int(row['order_id']), row['dish_name'], row['count'], row['price']) for row in rows], [
+            (self.orders[0].pk, 'Pizza', '1', '25.00'),
+            (self.orders[0].pk, 'Burger', '2', '30.00'),
+            (self.orders[1].pk, 'Pizza', '3', '75.00'),
+            (self.orders[2].pk, 'Burger', '1', '15.00'),
+        ])
+
+    def test_csv_escapes_formulas(self):
+        customer = dict(self.customer, customer_name='=HYPERLINK("http://example.com")', customer_phone='+48123456789')
+        order = place_order(self.user, customer, {self.pizza.pk: 1})
+        rows = [row for row in csv.DictReader(StringIO(self._export())) if int(row['order_id']) == order.pk]
+        self.assertEqual(rows[0]['customer_name'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(rows[0]['customer_phone'], "'+48123456789")
+        ndjson = [json.loads(line) for line in self._export(format='ndjson').splitlines()]
+        self.assertEqual(ndjson[-1]['customer_name'], '=HYPERLINK("http://example.com")')
+
+    def test_replica_flag_is_not_held_while_the_stream_is_consumed(self):
+        rows = iter(OrderExport(format='ndjson', chunk_size=1))
+        next(rows)
+        self.assertFalse(_read_replica.get())
+
+    def test_ndjson_filtered_by_user_and_range(self):
+        rows = [json.loads(line) for line in self._export(format='ndjson', user=self.user.pk).splitlines()]
+        self.assertEqual({row['order_id'] for row in rows}, {self.orders[0].pk, self.orders[2].pk})
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self._export(format='ndjson', start=tomorrow), '')
+        self.assertEqual(len(self._export(format='ndjson', end=tomorrow).splitlines()), 4)
+
+    def test_export_resumes_behind_the_cursor(self):
+        first = [json.loads(line) for line in self._export(format='ndjson').splitlines()]
+        rows = [json.loads(line) for line in self._export(format='ndjson', after=first[0]['cursor']).splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.orders[1].pk, self.orders[2].pk])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.client.force_login(self.staff)
+        for params in ({'format': 'xml'}, {'start': 'yesterday'}, {'after': 'not-a-cursor'}, {'user': 'x'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_command_streams_in_chunks(self):
+        out = StringIO()
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=QuerySet.iterator) as iterator:
+            call_command('export_orders', format='ndjson', user='testuser', chunk_size=1, stdout=out)
+        self.assertEqual(iterator.call_args.kwargs['chunk_size'], 1)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class MenuCacheTestCase(TestCase):
+    def setUp(self):
+        # the test database is rolled back between tests without any signal, so start from an empty cache
+        cache.clear()
+        clear_local_menu_cache()
+        self.dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+
+    def test_menu_is_served_from_memory(self):
+        self.assertEqual([dish.name for dish in get_menu()], ['Pizza'])
+        with self.assertNumQueries(0):
+            self.assertEqual([dish.name for dish in get_menu()], ['Pizza'])
+
+    def test_menu_is_shared_between_processes_through_the_cache(self):
+        get_menu()
+        clear_local_menu_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual([dish.name for dish in get_menu()], ['Pizza'])
+
+    def test_dish_changes_invalidate_the_menu(self):
+        get_menu()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.net_price = 30
+            self.dish.save()
+            Dish.objects.create(name='Burger', net_price=15, description='Juicy burger')
+        self.assertEqual([(dish.name, dish.net_price) for dish in get_menu()], [('Pizza', 30), ('Burger', 15)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.delete()
+        self.assertEqual([dish.name for dish in get_menu()], ['Burger'])
+
+    def test_home_and_order_pages_do_not_query_dishes(self):
+        get_menu()
+        user = get_user_model().objects.create_user(username='menuuser', password='testpassword')
+        self.client.force_login(user)
+        for url in (reverse('home'), reverse('order')):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertContains(response, 'Pizza')
+            self.assertFalse([q for q in ctx.captured_queries if '"food_app_dish"' in q['sql']])
+
+
+class ConditionalMenuTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+        self.user = get_user_model().objects.create_user(username='menuuser', password='testpassword')
+
+    def test_unchanged_menu_returns_not_modified_without_rendering(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with mock.patch('food_app.views.render') as render:
+            again = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        render.assert_not_called()
+
+        since = self.client.get(reverse('home'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_menu_change_or_another_user_gets_a_fresh_page(self):
+        etag = self.client.get(reverse('home'))['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Zalogowany jako: menuuser')
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.name = 'Calzone'
+            self.dish.save()
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Calzone')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pending_messages_are_not_hidden_behind_not_modified(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(reverse('home'))['ETag']
+        self.client.post(reverse('login'), {'username': 'menuuser', 'password': 'testpassword'})
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Zalogowałeś się jako menuuser')
+
+    def test_menu_fragment_is_rendered_once_per_menu_version(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+        self.client.get(reverse('order'))
+        # the cached fragments are used as long as the version is the same, whatever the dishes in the context
+        renamed = (Dish(pk=self.dish.pk, name='Calzone', net_price=25, description='Opis'),)
+        with mock.patch('food_app.views.get_menu', return_value=renamed):
+            for url in (reverse('home'), reverse('order')):
+                response = self.client.get(url)
+                self.assertContains(response, 'Pizza')
+                self.assertNotContains(response, 'Calzone')
+
+        # the per-user parts around the fragment stay per request
+        response = self.client.get(reverse('order'))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotEqual(response.context['idempotency_key'], self.client.get(reverse('order')).context['idempotency_key'])
+
+
+class DishSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.pizza = Dish.objects.create(name='Pizza wiejska', net_price=25, description='Z boczkiem i cebulą')
+        self.zapiekanka = Dish.objects.create(name='Zapiekanka', net_price=18, description='Z pieczarkami i serem')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Wołowina, ser i pikle')
+
+    def names(self, query):
+        return [dish.name for dish, _ in search_dishes(query)]
+
+    def test_words_are_folded(self):
+        self.assertEqual(tokenize('Zapiekankę z ŁOSOSIEM!'), ['zapiekanke', 'z', 'lososiem'])
+        self.assertEqual(tokenize('Zapiekankę', fold=False), ['zapiekankę'])
+
+    def test_prefix_typo_and_diacritics(self):
+        self.assertEqual(self.names('piz'), ['Pizza wiejska'])
+        self.assertEqual(self.names('zapiekanak'), ['Zapiekanka'])
+        self.assertEqual(self.names('cebula'), ['Pizza wiejska'])
+        self.assertEqual(self.names('wolowina'), ['Burger'])
+        self.assertEqual(self.names('pizza ser'), [])
+        self.assertEqual(self.names('xyz'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_name_matches_rank_above_description_matches(self):
+        serowa = Dish.objects.create(name='Pizza serowa', net_price=22, description='Cztery sery')
+        index = MenuIndex([self.zapiekanka, self.burger, serowa])
+        self.assertEqual([dish_id for dish_id, _ in index.search(['ser'], 10)][0], serowa.pk)
+        self.assertEqual(len(index.search(['ser'], 10)), 3)
+        self.assertEqual(len(index.search(['ser'], 2)), 2)
+
+    def test_index_follows_dish_changes(self):
+        self.assertEqual(self.names('kebab'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.create(name='Kebab', net_price=20, description='W bułce')
+            self.burger.delete()
+        self.assertEqual(self.names('kebab'), ['Kebab'])
+        self.assertEqual(self.names('burger'), [])
+
+    def test_menu_pages_filter_by_query(self):
+        self.client.force_login(get_user_model().objects.create_user(username='searchuser', password='testpassword'))
+        for url in (reverse('home'), reverse('order')):
+            response = self.client.get(url, {'q': 'zapiekanka'})
+            self.assertContains(response, 'Zapiekanka')
+            self.assertNotContains(response, 'Burger')
+            self.assertContains(response, 'value="zapiekanka"')
+            response = self.client.get(url, {'q': 'sushi'})
+            self.assertContains(response, 'Brak dań pasujących do „sushi”.')
+            # the cached full menu is not affected by a search
+            self.assertContains(self.client.get(url), 'Burger')
+
+    def test_search_changes_the_home_etag(self):
+        etag = self.client.get(reverse('home'))['ETag']
+        response = self.client.get(reverse('home'), {'q': 'burger'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_returns_scored_results(self):
+        response = self.client.get(reverse('api_dishes'), {'q': 'ser', 'fields': 'name'})
+        dishes = response.json()['dishes']
+        self.assertEqual({dish['name'] for dish in dishes}, {'Zapiekanka', 'Burger'})
+        self.assertTrue(all(dish['score'] > 0 for dish in dishes))
+        self.assertNotEqual(response['ETag'], self.client.get(reverse('api_dishes'), {'fields': 'name'})['ETag'])
+
+    def test_database_backend_is_only_used_on_postgresql(self):
+        if connection.vendor != 'postgresql':
+            with override_settings(DISH_SEARCH_BACKEND=None):
+                self.assertEqual(self.names('piz'), ['Pizza wiejska'])
+            with override_settings(DISH_SEARCH_BACKEND='memory'), self.assertNumQueries(0):
+                self.assertEqual(self.names('piz'), ['Pizza wiejska'])
+
+
+class WarmUpTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+
+    def test_warm_up_parses_templates_and_primes_the_menu(self):
+        timings = warm_up()
+        self.assertEqual(timings['templates'], len(app_templates()))
+        self.assertIn('food_app/home.html', app_templates())
+        with self.assertNumQueries(0):
+            self.assertEqual([dish.name for dish in get_menu()], ['Pizza'])
+
+    def test_command_reports_the_warm_up(self):
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        self.assertIn(f'{len(app_templates())} templates', out.getvalue())
+
+    def _run_lifespan(self):
+        messages_in = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages_in.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch('food_app.warmup.warm_up', side_effect=lambda: sent.append('warm_up') or {}):
+            async_to_sync(lifespan)(receive, send)
+        return sent
+
+    @override_settings(WARM_UP_ON_START=True)
+    def test_lifespan_completes_startup_after_the_warm_up(self):
+        self.assertEqual(self._run_lifespan(), ['warm_up', 'lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    @override_settings(WARM_UP_ON_START=False)
+    def test_lifespan_skips_the_warm_up_when_it_is_off(self):
+        self.assertEqual(self._run_lifespan(), ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    def test_failed_warm_up_does_not_block_the_startup(self):
+        with mock.patch('food_app.warmup.warm_up', side_effect=OSError), self.assertLogs('food_app.warmup', 'ERROR'):
+            warm_up_worker()
+
+    def test_startup_benchmark_measures_first_requests(self):
+        result = startup.first_requests(warm=True)
+        self.assertEqual(set(result), {'warm_up', *startup.FIRST_REQUEST_PAGES})
+
+
+class DishPopularityTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Juicy burger')
+        self.customer = {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+        }
+
+    def test_counters_follow_placed_orders(self):
+        place_order(self.user, self.customer, {self.pizza.pk: 2, self.burger.pk: 1})
+        place_order(self.user, self.customer, {self.pizza.pk: 1})
+        self.assertEqual(order_counts(), {})
+        run_tasks()
+        self.assertEqual(order_counts(), {self.pizza.pk: 2, self.burger.pk: 1})
+        self.assertEqual(DishPopularity.objects.get(dish=self.pizza).units, 3)
+        self.assertEqual(recently_popular(), [(self.pizza.pk, 2), (self.burger.pk, 1)])
+
+    def test_counters_follow_lines_saved_one_by_one(self):
+        order = place_order(self.user, self.customer, {self.pizza.pk: 1})
+        run_tasks()
+        OrdersDish.objects.create(orders=order, dish=self.burger, count=4, user=self.user, price=60)
+        self.assertEqual(order_counts(), {self.pizza.pk: 1, self.burger.pk: 1})
+
+    def test_rebuild_command_restores_drifted_counters(self):
+        place_order(self.user, self.customer, {self.pizza.pk: 2, self.burger.pk: 1})
+        run_tasks()
+        DishPopularity.objects.filter(dish=self.pizza).update(order_count=42)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_popularity', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_popularity', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(order_counts(), {self.pizza.pk: 1, self.burger.pk: 1})
+        call_command('rebuild_popularity', '--check', stdout=StringIO(), stderr=StringIO())
+
+    def test_rebuild_leaves_queued_orders_to_their_task(self):
+        place_order(self.user, self.customer, {self.pizza.pk: 2})
+        run_tasks()
+        place_order(self.user, self.customer, {self.pizza.pk: 1, self.burger.pk: 1})
+        call_command('rebuild_popularity', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_popularity', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(order_counts(), {self.pizza.pk: 1})
+        run_tasks()
+        self.assertEqual(order_counts(), {self.pizza.pk: 2, self.burger.pk: 1})
+        call_command('rebuild_popularity', '--check', stdout=StringIO(), stderr=StringIO())
+
+
+class SalesReportingTestCase(TestCase):
+    def setUp(self):
+        fixtures.generate(dishes=6, users=4, orders_per_user=15, max_lines=3, days=6, seed=3)
+        self.staff = get_user_model().objects.create_user(username='finance', password='testpassword', is_staff=True)
+        self.now = timezone.now()
+        self.first = reporting.floor_hour(Orders.objects.order_by('created_at').first().created_at)
+
+    def assertRollupsMatchRawAggregates(self, until):
+        for period, start in (('hour', self.first), ('day', reporting.day_start(timezone.localdate(self.first)))):
+            self.assertEqual(reporting.stored_totals(start, until, period), reporting.raw_totals(start, until, period))
+            self.assertEqual(
+                reporting.stored_dish_totals(start, until, period), reporting.raw_dish_totals(start, until, period)
+            )
+
+    def test_rollups_match_raw_aggregates(self):
+        reporting.roll_up(now=self.now)
+        until = reporting.processed_until()
+        self.assertEqual(until, reporting.floor_hour(self.now - timedelta(seconds=reporting.settle_seconds())))
+        self.assertRollupsMatchRawAggregates(until)
+        self.assertEqual(
+            reporting.report_totals(self.first - timedelta(days=1), until)['revenue'],
+            Orders.objects.filter(created_at__lt=until).aggregate(total=Sum('total_price'))['total'],
+        )
+
+    @override_settings(TIME_ZONE='Europe/Warsaw')
+    def test_days_follow_the_local_time_zone(self):
+        reporting.roll_up(now=self.now)
+        self.assertRollupsMatchRawAggregates(reporting.processed_until())
+        for row in SalesRollup.objects.filter(period='day'):
+            self.assertEqual(timezone.localtime(row.start).hour, 0)
+
+    def test_only_new_ranges_are_processed(self):
+        reporting.roll_up(now=self.now - timedelta(days=3))
+        middle = reporting.processed_until()
+        batches = reporting.roll_up(now=self.now)
+        self.assertEqual(batches[0][0], middle)
+        self.assertEqual(reporting.roll_up(now=self.now), [])
+        self.assertRollupsMatchRawAggregates(reporting.processed_until())
+
+    def test_recent_orders_wait_for_the_settle_time(self):
+        reporting.roll_up(now=self.now)
+        before = reporting.report_totals(self.first, self.now + timedelta(days=1))
+        place_order(self.staff, {'customer_name': 'Nowy'}, {Dish.objects.first().pk: 1})
+        reporting.roll_up(now=self.now)
+        self.assertEqual(reporting.report_totals(self.first, self.now + timedelta(days=1)), before)
+        reporting.roll_up(now=self.now + timedelta(hours=2))
+        self.assertEqual(reporting.report_totals(self.first, self.now + timedelta(days=1))['order_count'],
+                         before['order_count'] + 1)
+
+    def test_command_checks_and_rebuilds(self):
+        call_command('rollup_sales', stdout=StringIO())
+        call_command('rollup_sales', '--check', stdout=StringIO())
+        SalesRollup.objects.filter(period='day').update(revenue=0)
+        with self.assertRaises(CommandError):
+            call_command('rollup_sales', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rollup_sales', '--rebuild', stdout=StringIO())
+
+    def test_report_views_read_only_the_rollups(self):
+        reporting.roll_up(now=self.now)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('sales_report'), {'start': (self.now - timedelta(days=10)).date()})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if '"food_app_orders' in q['sql']])
+        data = response.json()
+        self.assertEqual(sum(row['order_count'] for row in data['sales']), data['totals']['order_count'])
+        self.assertEqual(sum(Decimal(row['revenue']) for row in data['sales']), Decimal(data['totals']['revenue']))
+
+        response = self.client.get(reverse('sales_dashboard'))
+        self.assertContains(response, 'Sprzedaż dzienna')
+        self.assertEqual(self.client.get(reverse('sales_report'), {'period': 'week'}).status_code, 400)
+
+    def test_report_views_are_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user(username='testuser', password='testpassword'))
+        self.assertEqual(self.client.get(reverse('sales_report')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('sales_dashboard')).status_code, 403)
+
+
+class DishImageVariantsTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, DISH_IMAGE_WIDTHS=(320, 640))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        clear_local_menu_cache()
+
+    def _upload(self, width=1200, height=800):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), (200, 80, 40)).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_generated_when_dish_is_saved(self):
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza', image=self._upload())
+        dish.refresh_from_db()
+        self.assertEqual([width for width, _ in dish.image_variants['webp']], [320, 640])
+        for width, name in dish.image_variants['jpeg']:
+            self.assertTrue(name.startswith('variants/{}/'.format(dish.image_variants['hash'])))
+            with dish.image.storage.open(name) as variant:
+                self.assertEqual(Image.open(variant).size, (width, round(800 * width / 1200)))
+
+    def test_small_photos_are_not_upscaled(self):
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Pizza', image=self._upload(200, 100))
+        dish.refresh_from_db()
+        self.assertEqual([width for width, _ in dish.image_variants['jpeg']], [200])
+
+    def test_decompression_bomb_is_logged_and_the_dish_is_saved(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with self.assertLogs('food_app.signals', 'WARNING') as logs:
+                dish = Dish.objects.create(name='Pizza', net_price=25, description='Pizza', image=self._upload())
+        dish.refresh_from_db()
+        self.assertEqual(dish.image_variants, {})
+        self.assertIn('DecompressionBombError', logs.output[0])
+
+    def test_home_page_renders_srcset(self):
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza', image=self._upload())
+        dish.refresh_from_db()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, dish.webp_srcset)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertNotContains(response, 'src="{}"'.format(dish.image.url))
+
+    def test_command_backfills_existing_dishes(self):
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza', image=self._upload())
+        Dish.objects.filter(pk=dish.pk).update(image_variants={})
+        call_command('build_image_variants', stdout=StringIO())
+        dish.refresh_from_db()
+        self.assertEqual(len(dish.image_variants['jpeg']), 2)
+
+
+class FileServingTestCase(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'food_app.storage.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(f'{self.static_root}/staticfiles.json') as fh:
+            self.css = json.load(fh)['paths']['admin/css/base.css']
+        with open(f'{self.static_root}/{self.css}', 'rb') as fh:
+            self.css_content = fh.read()
+        self.server = FileServer(self._django, FileResolver.from_settings())
+
+    def _django(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'django']
+
+    def get(self, path, query='', method='GET', file_wrapper=None, **headers):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query}
+        if file_wrapper is not None:
+            environ['wsgi.file_wrapper'] = file_wrapper
+        environ.update({'HTTP_' + name.upper(): value for name, value in headers.items()})
+        started = {}
+
+        def start_response(status, response_headers):
+            started['status'] = int(status.split()[0])
+            started['headers'] = dict(response_headers)
+
+        body = self.server(environ, start_response)
+        content = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return started['status'], started['headers'], content
+
+    def test_collectstatic_writes_hashed_and_precompressed_files(self):
+        self.assertRegex(self.css, r'^admin/css/base\.[0-9a-f]{12}\.css$')
+        with open(f'{self.static_root}/{self.css}.gz', 'rb') as fh:
+            compressed = fh.read()
+        self.assertLess(len(compressed), len(self.css_content))
+        self.assertEqual(gzip.decompress(compressed), self.css_content)
+
+    def test_hashed_static_files_are_cached_forever_and_sent_compressed(self):
+        status, headers, content = self.get(f'/static/{self.css}', accept_encoding='br;q=0, gzip')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(content), self.css_content)
+        self.assertEqual(int(headers['Content-Length']), len(content))
+
+        status, headers, content = self.get('/static/admin/css/base.css')
+        self.assertEqual(headers['Cache-Control'], REVALIDATE)
+        self.assertNotIn('Content-Encoding', headers)
+        with open(f'{self.static_root}/admin/css/base.css', 'rb') as fh:
+            self.assertEqual(content, fh.read())
+        status, _, content = self.get('/static/admin/css/base.css', if_none_match=headers['ETag'])
+        self.assertEqual((status, content), (304, b''))
+
+    def test_byte_ranges(self):
+        status, headers, content = self.get(f'/static/{self.css}', range='bytes=10-19', accept_encoding='gzip')
+        self.assertEqual(status, 206)
+        self.assertEqual(content, self.css_content[10:20])
+        self.assertEqual(headers['Content-Range'], f'bytes 10-19/{len(self.css_content)}')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(self.get(f'/static/{self.css}', range='bytes=-5')[2], self.css_content[-5:])
+        self.assertEqual(self.get(f'/static/{self.css}', range=f'bytes={len(self.css_content)}-')[0], 416)
+        # a range of an older version is answered with the whole file
+        self.assertEqual(self.get(f'/static/{self.css}', range='bytes=0-9', if_range='"old"')[0], 200)
+
+    def test_file_wrapper_is_only_used_for_whole_files(self):
+        wrapper = mock.Mock(side_effect=FileWrapper)
+        status, _, content = self.get(f'/static/{self.css}', range='bytes=10-19', file_wrapper=wrapper)
+        self.assertEqual((status, content), (206, self.css_content[10:20]))
+        wrapper.assert_not_called()
+        status, _, content = self.get(f'/static/{self.css}', file_wrapper=wrapper)
+        self.assertEqual((status, content), (200, self.css_content))
+        wrapper.assert_called_once()
+
+    def test_path_is_not_decoded_twice(self):
+        for name in ('a%2520b.txt', 'a%20b.txt'):
+            with open(f'{self.media_root}/{name}', 'w') as fh:
+                fh.write(name)
+        self.assertEqual(self.get('/media/a%2520b.txt')[2], b'a%2520b.txt')
+
+    def test_media_urls_and_paths_outside_the_roots(self):
+        os.makedirs(f'{self.media_root}/variants/0123456789abcdef')
+        for name in ('photo.jpg', 'variants/0123456789abcdef/320w.jpg'):
+            with open(f'{self.media_root}/{name}', 'wb') as fh:
+                fh.write(b'jpeg')
+        self.assertEqual(self.get('/media/photo.jpg')[1]['Cache-Control'], REVALIDATE)
+        self.assertEqual(self.get('/media/photo.jpg', 'v=abc')[1]['Cache-Control'], IMMUTABLE)
+        self.assertEqual(self.get('/media/variants/0123456789abcdef/320w.jpg')[1]['Cache-Control'], IMMUTABLE)
+        self.assertEqual(self.get('/media/photo.jpg', method='HEAD')[2], b'')
+        self.assertEqual(self.get('/media/photo.jpg', method='POST')[0], 405)
+        self.assertEqual(self.get('/media/missing.jpg')[0], 404)
+        self.assertEqual(self.get('/media/../static/staticfiles.json')[0], 404)
+        self.assertEqual(self.get('/order/')[2], b'django')
+
+    def test_wsgi_file_wrapper_is_used(self):
+        wrapped = []
+
+        def file_wrapper(fh, block_size):
+            wrapped.append(fh.tell())
+            return [fh.read()]
+
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': f'/static/{self.css}', 'wsgi.file_wrapper': file_wrapper}
+        body = self.server(environ, lambda status, headers: None)
+        self.assertEqual(b''.join(body), self.css_content)
+        self.assertEqual(wrapped, [0])
+
+    async def test_asgi(self):
+        async def django(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'django'})
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        server = AsyncFileServer(django, FileResolver.from_settings())
+        scope = {'type': 'http', 'method': 'GET', 'path': f'/static/{self.css}', 'headers': [(b'range', b'bytes=0-9')]}
+        await server(scope, None, send)
+        self.assertEqual(messages[0]['status'], 206)
+        self.assertEqual(b''.join(message.get('body', b'') for message in messages[1:]), self.css_content[:10])
+        self.assertFalse(messages[-1].get('more_body', False))
+
+        messages.clear()
+        await server({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []}, None, send)
+        self.assertEqual(messages[-1]['body'], b'django')
+
+    def test_original_dish_photo_url_is_versioned(self):
+        dish = Dish(name='Pizza', net_price=25, description='Pizza', image='photo.jpg', updated_at=timezone.now())
+        self.assertEqual(dish.image_src, f'/media/photo.jpg?v={int(dish.updated_at.timestamp())}')
+        dish.image_variants = {'hash': '0123456789abcdef'}
+        self.assertEqual(dish.image_src, '/media/photo.jpg?v=0123456789abcdef')
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+    def setUp(self):
+        view_stats.reset()
+        cache.clear()
+        clear_local_menu_cache()
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers_report_queries_per_view(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-View-Name'], 'HomeView')
+        self.assertIn('X-DB-Queries', response)
+        self.assertIn('X-View-Time-Ms', response)
+
+    def test_no_headers_without_debug(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('X-DB-Queries', response)
+
+    def test_repeated_sql_is_reported(self):
+        def n_plus_one(request):
+            for pk in (1, 2, 3):
+                list(Dish.objects.filter(pk=pk))
+            list(Dish.objects.filter(pk=3))
+            return HttpResponse()
+        n_plus_one.query_budget = None
+        middleware = ProfilingMiddleware(n_plus_one)
+        request = RequestFactory().get('/')
+        middleware.process_view(request, n_plus_one, (), {})
+        middleware(request)
+        stats = view_stats.snapshot()['n_plus_one']
+        self.assertEqual(stats['db_queries'], 4)
+        self.assertEqual(stats['repeated_queries'], 3)
+        self.assertEqual(stats['duplicate_queries'], 1)
+
+    def test_view_over_budget_fails_the_test_suite(self):
+        user = get_user_model().objects.create_user(username='budgetuser', password='testpassword')
+        self.client.force_login(user)
+        with mock.patch('food_app.views.OrderHistoryView.query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('order_history'))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'food_app_view_requests_total{view="HomeView"} 1')
+        response = self.client.get(reverse('metrics'), {'format': 'json'})
+        self.assertEqual(response.json()['views']['HomeView']['requests'], 1)
+
+    def test_metrics_endpoint_is_not_public(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_metrics_endpoint_checks_the_client_behind_the_proxy(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTestCase(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        fixtures.generate(dishes=20, users=10, orders_per_user=20, max_lines=3, seed=1)
+        user = OrdersDish.objects.first().user
+        results = plans.check_plans(user)
+        self.assertEqual(set(results), {'order_history', 'export_range', 'popularity_totals', 'due_tasks'})
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(result['missing'], [], result['plan'])
+
+    def test_order_lines_must_have_a_positive_count(self):
+        user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        order = Orders.objects.create(customer_name='A', customer_email='a@test.com', customer_phone='1',
+                                      customer_address='Adres')
+        with self.assertRaises(DatabaseIntegrityError), transaction.atomic():
+            OrdersDish.objects.create(orders=order, dish=dish, user=user, count=0, price=0)
+
+
+class MigrationOperationsTestCase(TestCase):
+    def _add_index(self, vendor):
+        operation = AddIndexConcurrently('orders', models.Index(fields=['created_at'], name='orders_test_idx'))
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = vendor
+        schema_editor.connection.alias = 'default'
+        schema_editor.connection.in_atomic_block = False
+        state = mock.Mock()
+        state.apps.get_model.return_value = Orders
+        operation.database_forwards('food_app', schema_editor, state, state)
+        return operation, schema_editor
+
+    def test_index_is_built_concurrently_on_postgresql(self):
+        operation, schema_editor = self._add_index('postgresql')
+        schema_editor.add_index.assert_called_once_with(Orders, operation.index, concurrently=True)
+
+    def test_other_databases_get_a_plain_index(self):
+        operation, schema_editor = self._add_index('sqlite')
+        schema_editor.add_index.assert_called_once_with(Orders, operation.index)
+
+    def _ensure_extension(self, vendor, installed):
+        schema_editor = mock.MagicMock()
+        schema_editor.connection.vendor = vendor
+        schema_editor.connection.alias = 'default'
+        schema_editor.connection.cursor.return_value.__enter__.return_value.fetchone.return_value = (1,) if installed else None
+        schema_editor.quote_name.side_effect = lambda name: f'"{name}"'
+        EnsureExtension('pg_trgm').database_forwards('food_app', schema_editor, None, None)
+        return schema_editor
+
+    def test_extension_is_created_only_when_missing(self):
+        self.assertEqual(self._ensure_extension('postgresql', installed=False).execute.call_args_list,
+                         [mock.call('CREATE EXTENSION IF NOT EXISTS "pg_trgm"')])
+        self.assertFalse(self._ensure_extension('postgresql', installed=True).execute.called)
+        self.assertFalse(self._ensure_extension('sqlite', installed=False).connection.cursor.called)
+
+    @skipUnless(connection.vendor == 'sqlite', 'writes a row the check constraint rejects')
+    def test_constraint_migration_refuses_to_run_over_empty_lines(self):
+        migration = importlib.import_module('food_app.migrations.0010_order_line_constraints')
+        user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Opis')
+        order = Orders.objects.create(customer_name='A', total_price=0)
+        migration.check_empty_lines(django_apps, None)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA ignore_check_constraints = ON')
+            try:
+                line = OrdersDish.objects.create(orders=order, dish=dish, user=user, count=0, price=0)
+            finally:
+                cursor.execute('PRAGMA ignore_check_constraints = OFF')
+        with self.assertRaisesMessage(DatabaseIntegrityError, f'line {line.pk} (order {order.pk}, count 0)'):
+            migration.check_empty_lines(django_apps, None)
+        self.assertTrue(OrdersDish.objects.filter(pk=line.pk).exists())
+
+class BenchmarkTestCase(TransactionTestCase):
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_fixture_generator_is_reproducible(self):
+        counts = fixtures.generate(dishes=6, users=3, orders_per_user=4, max_lines=3, seed=1)
+        self.assertEqual((counts['dishes'], counts['users'], counts['orders']), (6, 3, 12))
+        self.assertEqual(OrdersDish.objects.count(), counts['order_lines'])
+        order = Orders.objects.first()
+        self.assertEqual(order.total_price, sum(line.price for line in order.ordersdish_set.all()))
+
+    def test_micro_benchmarks_and_load_driver_run(self):
+        fixtures.generate(dishes=6, users=3, orders_per_user=4, max_lines=3, seed=1)
+        results = micro.run(iterations=2, warmup=1, history_depth=1)
+        self.assertEqual(set(results), {'home', 'order_form', 'place_order', 'history_first_page', 'api_menu',
+                                        'api_history_first_page'})
+        self.assertLess(results['api_menu']['bytes_per_response'], results['home']['bytes_per_response'])
+        self.assertEqual(results['home']['count'], 2)
+
+        # SQLite locks whole tables, so the driver runs a single worker thread here
+        stats = load.run(concurrency=1, requests=20, users=3)
+        self.assertEqual(stats['count'], 20)
+        self.assertEqual(stats['errors'], 0)
+        self.assertIn('p99_ms', stats['scenarios']['home'])
+
+    def test_login_benchmark_runs(self):
+        fixtures.generate(dishes=1, users=1, orders_per_user=1, max_lines=1, seed=1)
+        results = logins.run(attempts=2)
+        self.assertEqual(set(results), {'login', 'password_hash', 'throttled'})
+        self.assertEqual(results['login']['count'], 2)
+        self.assertGreater(results['throttled']['per_core_second'], results['login']['per_core_second'])
+
+    def test_session_benchmark_counts_session_writes(self):
+        fixtures.generate(dishes=3, users=1, orders_per_user=1, max_lines=1, seed=1)
+        results = sessions.run(rounds=1, tiers=['db', 'cached_db'])
+        self.assertEqual(results['db']['cart_unchanged']['session_writes'], 1)
+        self.assertEqual(results['cached_db']['cart_unchanged']['session_writes'], 0)
+        self.assertLess(results['cached_db']['flow']['session_writes'], results['db']['flow']['session_writes'])
+        self.assertLess(results['cached_db']['flow']['session_reads'], results['db']['flow']['session_reads'])
+
+
+@override_settings(ROOT_URLCONF='myproject.urls_async')
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.user = get_user_model().objects.create_user(username='asyncuser', password='testpassword')
+        self.pizza = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+        self.burger = Dish.objects.create(name='Burger', net_price=15, description='Juicy burger')
+        self.async_client.force_login(self.user)
+
+    def test_views_are_async(self):
+        for view in (AsyncHomeView, AsyncOrderView, AsyncOrderSuccessView, AsyncOrderHistoryView, AsyncOrderExportView):
+            self.assertTrue(view.view_is_async)
+
+    async def test_home_view(self):
+        response = await self.async_client.get('/')
+        self.assertContains(response, 'Pizza')
+        self.assertContains(response, 'asyncuser')
+
+    async def test_home_view_search(self):
+        response = await self.async_client.get('/', {'q': 'burg'})
+        self.assertContains(response, 'Burger')
+        self.assertNotContains(response, 'Delicious pizza')
+
+    async def test_order_view_requires_login(self):
+        response = await AsyncClient().get('/order/')
+        self.assertEqual(response.status_code, 302)
+
+    async def test_order_form_and_submission(self):
+        response = await self.async_client.get('/order/')
+        self.assertContains(response, 'name="counts_{}"'.format(self.pizza.pk))
+
+        response = await self.async_client.post('/order/', {
+            'customer_name': 'Test User',
+            'customer_email': 'testuser@test.com',
+            'customer_phone': '123456789',
+            'customer_address': 'Test Address',
+            'dishes': [self.pizza.pk, self.burger.pk],
+            'counts_{}'.format(self.pizza.pk): 2,
+            'counts_{}'.format(self.burger.pk): 3,
+        })
+        self.assertContains(response, 'Pizza - 2 sztuk')
+        order = await Orders.objects.aget()
+        self.assertEqual(order.total_price, Decimal('95.00'))
+        self.assertEqual(await OrdersDish.objects.filter(orders=order, user=self.user).acount(), 2)
+
+        response = await self.async_client.get('/order_success/{}/'.format(order.pk))
+        self.assertContains(response, 'Burger - 3 sztuk')
+
+        response = await self.async_client.get('/order_history/')
+        self.assertContains(response, 'Test User')
+        self.assertEqual([o.pk for o in response.context['orders']], [order.pk])
+
+    async def test_unknown_order_returns_404(self):
+        response = await self.async_client.get('/order_success/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_order_of_another_user_returns_404(self):
+        other = await sync_to_async(get_user_model().objects.create_user)(username='otheruser', password='testpassword')
+        order = await sync_to_async(place_order)(other, {'customer_name': 'Other User'}, {self.pizza.pk: 1})
+        response = await self.async_client.get('/order_success/{}/'.format(order.pk))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_export_streams_asynchronously(self):
+        await sync_to_async(place_order)(self.user, {'customer_name': 'Test User'}, {self.pizza.pk: 2})
+        response = await self.async_client.get('/orders/export/')
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        await self.user.asave()
+        response = await self.async_client.get('/orders/export/', {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([json.loads(line)['dish_name'] for line in body.splitlines()], ['Pizza'])
+
+
+class ReadReplicaRouterTestCase(TestCase):
+    def test_reads_go_to_the_primary_outside_read_only_views(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Orders))
+        self.assertEqual(router.db_for_write(Orders), 'default')
+
+    @override_settings(READ_REPLICA_ALIAS='missing')
+    def test_no_replica_configured(self):
+        with read_replica():
+            self.assertIsNone(ReadReplicaRouter().db_for_read(Orders))
+            self.assertEqual(Orders.objects.all().db, 'default')
+
+
+# a TransactionTestCase, because inside the TestCase transaction every read stays on the primary
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias (set DB_REPLICA_NAME or DB_REPLICA_HOST)')
+class ReadReplicaRoutingTestCase(TransactionTestCase):
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        clear_local_menu_cache()
+        self.user = get_user_model().objects.create_user(username='replicauser', password='testpassword')
+        self.client.force_login(self.user)
+
+    def test_food_app_reads_use_the_replica_inside_read_replica(self):
+        with read_replica():
+            self.assertEqual(Orders.objects.all().db, 'replica')
+            self.assertEqual(Dish.objects.all().db, 'replica')
+            # sessions and users must see a fresh login, so they stay on the primary
+            self.assertEqual(get_user_model().objects.all().db, 'default')
+            with transaction.atomic():
+                self.assertEqual(Orders.objects.all().db, 'default')
+        self.assertEqual(Orders.objects.all().db, 'default')
+
+    def test_writes_always_use_the_primary(self):
+        router = ReadReplicaRouter()
+        with read_replica():
+            self.assertEqual(router.db_for_write(Orders), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'food_app'))
+        self.assertTrue(router.allow_migrate('default', 'food_app'))
+
+    def test_history_view_reads_from_the_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(reverse('order_history'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue([q for q in replica_queries.captured_queries if 'food_app_orders' in q['sql']])
+
+    def test_order_submission_writes_to_the_primary(self):
+        dish = Dish.objects.create(name='Pizza', net_price=25, description='Delicious pizza')
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.post(reverse('order'), {
+                'customer_name': 'Test User',
+                'customer_email': 'testuser@test.com',
+                'customer_phone': '123456789',
+                'customer_address': 'Test Address',
+                'dishes': [dish.pk],
+                'counts_{}'.format(dish.pk): 1,
+            })
+        self.assertFalse([q for q in replica_queries.captured_queries if 'INSERT' in q['sql']])
+        self.assertEqual(Orders.objects.count(), 1)
@@ -0,0 +1,80 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .middleware import client_ip
+
+
+# Login throttling, checked before the password is hashed, so a credential-stuffing burst costs a cache
+# lookup per attempt instead of a PBKDF2 run.
+#
+# Every client IP, every (username, IP) pair and every username has a token bucket in the shared cache:
+# a failed login takes a token, and tokens come back one every `refill` seconds up to `capacity`; an attempt
+# is refused while one of its buckets is empty. Successful logins cost nothing, so a user logging in again and
+# again is never locked out. The tight limit is on (username, IP), so guessing a password from one address cannot
+# lock the user out of another; the per-username bucket is a higher ceiling for guesses spread over many addresses.
+# The cache has no atomic read-modify-write for this, so concurrent attempts may get a few extra tokens between
+# them; the buckets bound the rate, they do not count it exactly.
+
+THROTTLE_KEY = 'food_app:throttle:{}:{}'
+
+
+class TokenBucket:
+    def __init__(self, name, capacity, refill):
+        self.name = name
+        self.capacity = capacity
+        self.refill = refill
+
+    def _key(self, identity):
+        return THROTTLE_KEY.format(self.name, hashlib.sha1(identity.encode()).hexdigest())
+
+    def _tokens(self, key, now):
+        tokens, updated = cache.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) / self.refill)
+
+    #returns 0 when `identity` has a token left, otherwise the seconds until the next one; takes nothing.
+    def wait(self, identity, now=None):
+        now = time.time() if now is None else now
+        tokens = self._tokens(self._key(identity), now)
+        return math.ceil((1 - tokens) * self.refill) if tokens < 1 else 0
+
+    #takes a token for `identity`; returns 0 when it got one, otherwise the seconds until the next token.
+    def take(self, identity, now=None):
+        now = time.time() if now is None else now
+        key = self._key(identity)
+        tokens = self._tokens(key, now)
+        if tokens < 1:
+            cache.set(key, (tokens, now), math.ceil(self.capacity * self.refill))
+            return math.ceil((1 - tokens) * self.refill)
+        #a bucket left alone long enough to be full again is the same as no entry
+        cache.set(key, (tokens - 1, now), math.ceil(self.capacity * self.refill))
+        return 0
+
+
+#the buckets of settings.LOGIN_THROTTLE ({'ip', 'user_ip' or 'username': (capacity, refill seconds)}), in its order.
+def login_buckets():
+    rates = getattr(settings, 'LOGIN_THROTTLE', {})
+    return [TokenBucket(name, capacity, refill) for name, (capacity, refill) in rates.items()]
+
+
+def _identities(request, username):
+    ip = client_ip(request)
+    username = (username or '').strip().lower()
+    return {'ip': ip, 'user_ip': f'{username}\n{ip}', 'username': username}
+
+
+#returns 0 if the login attempt may go on, otherwise the seconds the client should wait (for Retry-After).
+#Only looks at the buckets; record_failed_login takes the tokens once the password turned out wrong.
+def throttle_login(request, username):
+    identities = _identities(request, username)
+    return max((bucket.wait(identities[bucket.name]) for bucket in login_buckets()), default=0)
+
+
+#charges a failed login to the address, the username on that address and the username.
+def record_failed_login(request, username):
+    identities = _identities(request, username)
+    for bucket in login_buckets():
+        bucket.take(identities[bucket.name])
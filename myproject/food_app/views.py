@@ -1,22 +1,88 @@
+import hashlib
+import json
+from calendar import timegm
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count
-from django.http import HttpResponseNotAllowed
-from django.shortcuts import render, redirect
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.utils.decorators import method_decorator
 from django.views.generic import View, ListView, TemplateView
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib import messages
-from .models import Dish, Orders, OrdersDish
+from .archive import extend_page
+from .cart import Cart
+from .menu_cache import get_menu, get_menu_by_id, get_menu_modified, get_menu_version
+from .middleware import client_ip, prometheus_text, view_stats
+from .models import Orders
+from .exports import InvalidExport, OrderExport
 from .forms import OrdersForm
-
-
-class HomeView(View):
+from .pagination import KeysetPaginator
+from .popularity import recently_popular
+from .reporting import InvalidReport, dish_report, parse_report_params, processed_until, report_totals, sales_report
+from .routers import ReadReplicaMixin
+from .search import search_dishes
+from .throttle import record_failed_login, throttle_login
+from .services import (
+    InvalidOrder, new_idempotency_key, parse_customer, parse_idempotency_key, parse_order_lines, place_order,
+    submitted_order, user_orders,
+)
+
+
+#The validators of the home page for a conditional GET: the ETag follows the menu version and the user
+#the page is rendered for (the greeting, the admin link), Last-Modified is the last menu change.
+#Browsers send If-None-Match along with If-Modified-Since and it takes precedence, so a different user gets a fresh page.
+#No validators are given while flash messages are waiting, so they are never hidden behind a 304.
+#Returns (etag, last_modified timestamp); must be called where the ORM can be used synchronously.
+def home_validators(request):
+    if messages.get_messages(request):
+        return None, None
+    user = request.user
+    key = f"{get_menu_version()}:{user.pk}:{user.get_username()}:{user.is_staff}:{request.GET.get('q', '')}"
+    etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+    modified = get_menu_modified()
+    return etag, timegm(modified.utctimetuple()) if modified else None
+
+
+#the page must be revalidated on every visit and only by the user's browser, never by a shared cache.
+def set_validators(response, etag, last_modified):
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    if last_modified:
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+#the dishes matching ?q= (best first), or the whole menu without it.
+def menu_dishes(request):
+    query = request.GET.get('q', '').strip()
+    if query:
+        return query, [dish for dish, _ in search_dishes(query)]
+    return '', get_menu()
+
+
+class HomeView(ReadReplicaMixin, View):
     template_name = 'home.html'
+    query_budget = 4
 
+    #an unchanged menu is answered with 304 Not Modified before anything is rendered.
     def get(self, request):
-        dishes = Dish.objects.all()
+        etag, last_modified = home_validators(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+
+        #the version is read before the menu, so a cached fragment is never older than the version it is stored under.
+        menu_version = get_menu_version()
+        query, dishes = menu_dishes(request)
         ctx = {
             'add_to_menu_url': 'add_to_menu',
             'place_order_url': 'place_order',
@@ -24,12 +90,14 @@ class HomeView(View):
             'register_url': 'register',
             'login_url': 'login',
             'logout_url': 'logout',
-            'dishes': dishes
+            'dishes': dishes,
+            'q': query,
+            'menu_version': menu_version,
         }
         if request.user.is_authenticated:
             ctx['username'] = request.user.username
 
-        return render(request, 'food_app/home.html', ctx)
+        return set_validators(render(request, 'food_app/home.html', ctx), etag, last_modified)
 
 
 class RegisterView(View):
@@ -53,21 +121,26 @@ class LoginView(View):
         form = AuthenticationForm()
         return render(request, 'food_app/login.html', {'form': form})
 
+    #the form authenticates the user (one password hash), so its user is logged in as it is.
+    #Once too many logins from the same address or for the same username have failed,
+    #further attempts are refused before any hashing.
     def post(self, request):
+        username = request.POST.get('username')
+        wait = throttle_login(request, username)
+        if wait:
+            messages.error(request, f'Zbyt wiele prób logowania. Spróbuj ponownie za {wait} s.')
+            response = render(request, 'food_app/login.html', {'form': AuthenticationForm(request)}, status=429)
+            response.headers['Retry-After'] = str(wait)
+            return response
         form = AuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.info(request, f'Zalogowałeś się jako {username}')
-                return redirect('home')
-            else:
-                messages.error(request, 'Nieprawidłowy login lub hasło')
-        else:
-            messages.error(request, 'Nieprawidłowy login lub hasło')
-            return render(request, 'food_app/login.html', {'form': form})
+            user = form.get_user()
+            login(request, user)
+            messages.info(request, f'Zalogowałeś się jako {user.get_username()}')
+            return redirect('home')
+        record_failed_login(request, username)
+        messages.error(request, 'Nieprawidłowy login lub hasło')
+        return render(request, 'food_app/login.html', {'form': form})
 
 
 class LogoutView(View):
@@ -80,92 +153,244 @@ class LogoutView(View):
 # @method_decorator(login_required, name='dispatch') is a decorator that is used to enforce authentication for accessing the OrderView.
 # It adds the login_required decorator to the dispatch method, which is called for every HTTP request.
 @method_decorator(login_required, name='dispatch')
-class OrderView(View):
+class OrderView(ReadReplicaMixin, View):
     template_name = 'food_app/order.html'
+    query_budget = 25
     success_template_name = 'food_app/order_success.html'
     form_class = OrdersForm
 
-    #The get method retrieves the list of dishes along with the number of times each dish has been ordered,
+    #The get method retrieves the list of dishes from the menu cache,
     # creates a form instance with initial values, and renders the template with the form and dish list.
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('login')
 
-        dishes = Dish.objects.prefetch_related('ordersdish_set').annotate(num_orders=Count('ordersdish')).all()
+        menu_version = get_menu_version()
+        query, dishes = menu_dishes(request)
         #creates a form instance with initial values.
         form = self.form_class(initial={'counts': [1] * len(dishes)})
+        #the most ordered dishes come from the popularity counters, so the cost does not grow with the order history.
+        menu = get_menu_by_id()
+        popular_dishes = [(menu[dish_id], total) for dish_id, total in recently_popular() if dish_id in menu]
         context = {
             'dishes': dishes,
+            'q': query,
+            'menu_version': menu_version,
             'form': form,
+            'popular_dishes': popular_dishes,
+            #sent back with the form, so a repeated submission returns the first order instead of placing a new one.
+            'idempotency_key': new_idempotency_key(),
         }
         return render(request, self.template_name, context)
 
     # The post method is called when the user submits the order form.
-    # It creates a new Orders instance with the customer's details and calculates the total price of the order.
-    # It then creates a new OrdersDish instance for each selected dish and saves them to the database.
+    # It reads the customer's details, the selected dishes and the form's idempotency key once and hands them
+    # to place_order, which prices the lines and writes the order with a constant number of queries
+    # (or returns the order already placed with the same key).
     # Finally, it renders the success template with the order details.
     def post(self, request):
-        if request.method == 'POST':
-            customer_name = request.POST.get('customer_name')
-            customer_email = request.POST.get('customer_email')
-            customer_phone = request.POST.get('customer_phone')
-            customer_address = request.POST.get('customer_address')
-
-            orders = Orders.objects.create(
-                customer_name=customer_name,
-                customer_email=customer_email,
-                customer_phone=customer_phone,
-                customer_address=customer_address
-            )
-
-            total_price = 0
-            #goes through every item on the food list
-            for i in range(len(request.POST.getlist('dishes'))):
-                dish_id = int(request.POST.getlist('dishes')[i])
-                count = int(request.POST.getlist('counts_{}'.format(i))[0])
-                dish = Dish.objects.get(pk=dish_id)
-                price = dish.net_price * count
-                total_price += dish.net_price * count
-                OrdersDish.objects.create(
-                    orders=orders,
-                    dish=dish,
-                    count=count,
-                    price=price,
-                )
-
-            #updates the total cost of the order
-            orders.total_price = total_price
-            orders.save()
-
-            return render(request, self.success_template_name, {'order': orders})
-
-        return HttpResponseNotAllowed(['POST'])
-        #if the request method is not POST, the function returns a 405 response
-
-
-class OrderSuccessView(TemplateView):
+        try:
+            order = place_order(request.user, parse_customer(request.POST), parse_order_lines(request.POST),
+                                parse_idempotency_key(request.POST))
+        except InvalidOrder as exc:
+            messages.error(request, str(exc))
+            return redirect('order')
+
+        return render(request, self.success_template_name, {'order': order})
+
+
+#reads the body of a cart request: a form or a JSON object.
+def _payload(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise InvalidOrder('Nieprawidłowe dane')
+        if not isinstance(data, dict):
+            raise InvalidOrder('Nieprawidłowe dane')
+        return data
+    return request.POST
+
+
+def _dish_and_count(data, default_count=1):
+    try:
+        return int(data.get('dish')), int(data.get('count', default_count))
+    except (TypeError, ValueError):
+        raise InvalidOrder('Nieprawidłowe zamówienie')
+
+
+#The session cart (see food_app.cart): GET returns it, POST to the add, update and remove endpoints
+#changes one line ("dish" and "count") and returns the whole, small cart as JSON.
+#Nothing is read from the database but the session (and the menu, when it is not cached yet).
+class CartView(View):
+    action = None
+    #a new session costs a key lookup, the insert and its savepoint pair; the menu at most one query
+    query_budget = 6
+
+    def get(self, request):
+        cart = Cart(request.session)
+        cart.refresh()
+        return JsonResponse(cart.as_json())
+
+    def post(self, request):
+        if self.action is None:
+            return HttpResponseNotAllowed(['GET'])
+        cart = Cart(request.session)
+        try:
+            dish_id, count = _dish_and_count(_payload(request))
+            if self.action == 'add':
+                cart.add(dish_id, count)
+            elif self.action == 'update':
+                cart.set(dish_id, count)
+            else:
+                cart.remove(dish_id)
+        except InvalidOrder as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        cart.save()
+        return JsonResponse(cart.as_json())
+
+
+#Places the order of the cart: the customer's details and the idempotency key come with the request,
+#the lines from the session; place_order prices them from the database and writes everything in one transaction.
+#A retry with the key of an order already placed (e.g. after the response was lost) returns that order,
+#even though the first request has emptied the cart.
+class CartCheckoutView(View):
+    #the same writes as the order form
+    query_budget = OrderView.query_budget
+
+    def post(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Zaloguj się, aby złożyć zamówienie'}, status=403)
+        cart = Cart(request.session)
+        try:
+            data = _payload(request)
+            key = parse_idempotency_key(data)
+            order = submitted_order(request.user, key) if key else None
+            if order is None:
+                if not cart:
+                    return JsonResponse({'error': 'Koszyk jest pusty'}, status=400)
+                order = place_order(request.user, parse_customer(data), cart.order_lines(), key)
+        except InvalidOrder as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        if cart:
+            cart.clear()
+            cart.save()
+        return JsonResponse({
+            'order_id': order.pk,
+            'total': str(order.total_price),
+            'url': reverse('order_success', args=[order.pk]),
+        })
+
+
+class OrderSuccessView(LoginRequiredMixin, TemplateView):
     template_name = 'food_app/order_success.html'
+    query_budget = 3
 
     #The get function retrieves the details of the order with the given ID and renders an HTML template with this information.
+    # The lines come from order.summary, so the page is rendered from this one row.
+    # Only the user who placed the order can see it (the page shows the customer's contact details);
+    # anyone else gets a 404, so the order numbers cannot be walked.
     def get(self, request, *args, **kwargs):
         order_id = kwargs['order_id']
-        order = Orders.objects.get(pk=order_id)
+        order = get_object_or_404(user_orders(Orders.objects.all(), request.user), pk=order_id)
         context = {
             'order': order,
         }
         return render(request, self.template_name, context)
 
 
-class OrderHistoryView(LoginRequiredMixin, ListView):
+class OrderHistoryView(LoginRequiredMixin, ReadReplicaMixin, ListView):
     template_name = 'food_app/order_history.html'
     model = Orders
     context_object_name = 'orders'
     paginate_by = 10
+    query_budget = 3
 
-    #The get_queryset method returns a list of Orders objects that contain at least one OrdersDish owned by the user, sorted in descending order by creation date.
+    #The get_queryset method returns the Orders that contain at least one OrdersDish owned by the user.
+    # An EXISTS subquery replaces the join + DISTINCT, and the lines are shown from order.summary,
+    # so a page always costs one query no matter how many orders or lines it shows.
     def get_queryset(self):
-        return super().get_queryset().filter(ordersdish__user=self.request.user).order_by('-created_at').distinct()
+        return user_orders(super().get_queryset(), self.request.user)
+
+    #pages with a keyset cursor on (created_at, id) instead of OFFSET, so deep pages stay as fast as the first one.
+    #Past the last live order the pages go on into the archive of old orders (see food_app.archive).
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, ordering=('-created_at', '-id'))
+        page = extend_page(paginator, paginator.page(self.request.GET.get('cursor')), self.request.user)
+        return paginator, page, page.object_list, page.has_next or page.has_previous
+
+
+#Exposes the per-view numbers collected by ProfilingMiddleware as Prometheus text (or JSON with ?format=json).
+#Only staff users and INTERNAL_IPS (e.g. the Prometheus scraper) can read it.
+class MetricsView(View):
+    def get(self, request):
+        if not (request.user.is_staff or client_ip(request) in settings.INTERNAL_IPS):
+            raise PermissionDenied
+        snapshot = view_stats.snapshot()
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'views': snapshot})
+        return HttpResponse(prometheus_text(snapshot), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+#Streams the orders to finance as CSV or NDJSON (?format=ndjson), filtered by ?start=, ?end= and ?user=<id>
+#and resumed with ?after=<cursor>; see OrderExport. Only staff users can read it.
+class OrderExportView(View):
+    query_budget = 3
 
+    def get(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        try:
+            export = OrderExport.from_params(request.GET)
+        except InvalidExport as exc:
+            return HttpResponseBadRequest(str(exc))
+        response = StreamingHttpResponse(iter(export), content_type=export.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+        return response
+
+
+#Sales dashboard for staff. Reads only the rollup tables filled by the rollup_sales command,
+#so it never aggregates the order tables on the primary.
+class SalesDashboardView(ReadReplicaMixin, View):
+    template_name = 'food_app/sales_dashboard.html'
+    query_budget = 7
+
+    def get(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        try:
+            period, start, end = parse_report_params(request.GET)
+        except InvalidReport as exc:
+            return HttpResponseBadRequest(str(exc))
+        context = {
+            'start': start,
+            'end': end,
+            'processed_until': processed_until(),
+            'totals': report_totals(start, end),
+            'days': sales_report('day', start, end),
+            'dishes': dish_report(start, end),
+        }
+        return render(request, self.template_name, context)
 
 
+#The same data as JSON: ?period=day|hour&start=&end=; amounts are strings, like in the order export.
+class SalesReportView(ReadReplicaMixin, View):
+    query_budget = 7
 
+    def get(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        try:
+            period, start, end = parse_report_params(request.GET)
+        except InvalidReport as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        data = {
+            'period': period,
+            'start': start,
+            'end': end,
+            'processed_until': processed_until(),
+            'totals': report_totals(start, end),
+            'sales': sales_report(period, start, end),
+            'dishes': dish_report(start, end),
+        }
+        return JsonResponse(data, encoder=DjangoJSONEncoder)
@@ -0,0 +1,74 @@
+import logging
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+
+from .menu_cache import get_menu, get_menu_modified
+
+
+logger = logging.getLogger(__name__)
+
+
+# Warms up a freshly started worker before it serves traffic: parses every template of the app
+# (kept by the cached template loader for the life of the process), imports the URLconf and builds
+# its reverse lookup, and loads the menu into the per-process and the shared cache.
+# Django has no on-disk template compilation, so parsing once per process is the most that can be done ahead.
+
+
+#the names of the templates under food_app/templates, e.g. "food_app/home.html".
+def app_templates():
+    root = Path(apps.get_app_config('food_app').path) / 'templates'
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*') if path.is_file())
+
+
+#returns the time every step took, in milliseconds.
+def warm_up():
+    timings = {}
+
+    start = time.perf_counter()
+    templates = app_templates()
+    for name in templates:
+        get_template(name)
+    timings['templates_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    start = time.perf_counter()
+    get_resolver().url_patterns
+    reverse('home')
+    timings['urls_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    start = time.perf_counter()
+    get_menu()
+    get_menu_modified()
+    timings['menu_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    timings['templates'] = len(templates)
+    return timings
+
+
+#used when a worker starts: a failed warm-up is logged, not fatal, the worker can still serve cold.
+def warm_up_worker():
+    try:
+        timings = warm_up()
+    except Exception:
+        logger.exception('Warm-up failed, the worker starts cold')
+    else:
+        logger.info('Worker warmed up: %s', timings)
+
+
+#The ASGI lifespan protocol: with WARM_UP_ON_START, as in myproject.wsgi, the startup event is reported complete
+#only after the warm-up, so the server does not accept connections before.
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if getattr(settings, 'WARM_UP_ON_START', False):
+                await sync_to_async(warm_up_worker)()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
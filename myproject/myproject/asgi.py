@@ -2,6 +2,13 @@
 ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+By default it uses myproject.settings_asgi, which serves the ordering pages
+with the async views. See deploy/gunicorn_asgi.py for the worker configuration.
+
+Django itself only speaks the HTTP part of ASGI; the lifespan events are handled
+here, so with WARM_UP_ON_START every worker warms up (food_app.warmup) before it
+accepts connections.
+With SERVE_FILES the static and media files are served by food_app.fileserver in front of Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +16,23 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings_asgi')
+
+django_application = get_asgi_application()
+
+from food_app.warmup import lifespan  # noqa: E402  (needs the apps loaded above)
+
+if getattr(settings, 'SERVE_FILES', False):
+    from food_app.fileserver import AsyncFileServer
+
+    django_application = AsyncFileServer(django_application)
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
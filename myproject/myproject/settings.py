@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import os
 from pathlib import Path
 
+import django
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'food_app.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +57,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'myproject.urls'
 
+# Addresses allowed to read /metrics/ without a staff login (e.g. the Prometheus scraper).
+INTERNAL_IPS = ['127.0.0.1']
+
+# Number of reverse proxies in front of the application. The client address (login throttling, INTERNAL_IPS)
+# is then taken from X-Forwarded-For that many entries from the right instead of REMOTE_ADDR
+# (see food_app.middleware.client_ip). Leave it at 0 when clients connect directly: the header could be forged.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# When True, a view that runs more queries than its `query_budget` raises QueryBudgetExceeded
+# instead of only logging a warning. The test runner turns it on for the whole test suite.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'food_app.test_runner.QueryBudgetTestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -74,17 +91,149 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
+# Every value can be overridden from the environment (DB_ENGINE, DB_HOST, DB_NAME, ...).
+#
+# DB_CONN_MAX_AGE keeps connections open between requests (seconds, 0 = close after every request)
+# and DB_CONN_HEALTH_CHECKS checks a persistent connection before reusing it.
+# DB_POOL=1 enables the built-in psycopg 3 connection pool instead, sized by DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE.
+# It needs Django 5.1+ and the django.db.backends.postgresql engine with psycopg 3 installed; on anything older
+# the settings refuse to load rather than pass the driver an option it does not know.
+# Setting any of DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_NAME, DB_REPLICA_USER or DB_REPLICA_PASSWORD
+# adds a "replica" alias (the same settings as default with those overridden),
+# which food_app.routers.ReadReplicaRouter uses for the read-only views.
 
 DATABASES = {
     'default': {
-        'HOST': '127.0.0.1',
-        'NAME': 'food_app',
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'USER': 'postgres',
-        'PASSWORD': 'coderslab',
+        'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DB_PORT', ''),
+        'NAME': os.environ.get('DB_NAME', 'food_app'),
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql_psycopg2'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'coderslab'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {},
     }
 }
 
+if os.environ.get('DB_TEST_NAME'):
+    # e.g. a file for SQLite: the default in-memory test database cannot serve concurrent writers
+    DATABASES['default']['TEST'] = {'NAME': os.environ['DB_TEST_NAME']}
+
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['OPTIONS']['connect_timeout'] = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    if os.environ.get('DB_POOL') == '1':
+        if django.VERSION < (5, 1) or DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+            raise ImproperlyConfigured(
+                'DB_POOL=1 needs Django 5.1+ with DB_ENGINE=django.db.backends.postgresql and psycopg 3; '
+                'use DB_CONN_MAX_AGE (persistent connections) or an external pooler such as PgBouncer instead.'
+            )
+        # the pool replaces persistent connections, Django requires CONN_MAX_AGE = 0 with it
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        }
+
+_replica = {
+    key: os.environ['DB_REPLICA_' + key]
+    for key in ('HOST', 'PORT', 'NAME', 'USER', 'PASSWORD')
+    if 'DB_REPLICA_' + key in os.environ
+}
+if _replica:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        **_replica,
+        # tests run against one database; the replica alias reads it through the default connection
+        'TEST': {'MIRROR': 'default'},
+    }
+
+READ_REPLICA_ALIAS = 'replica'
+DATABASE_ROUTERS = ['food_app.routers.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The menu version, the cached_db sessions and the login throttle buckets live in this cache, so every worker
+# must share it in production: set CACHE_BACKEND and CACHE_LOCATION, e.g.
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+#   CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache CACHE_LOCATION=127.0.0.1:11211
+# (several comma-separated locations for a Memcached cluster). locmem is enough for a single process and for tests;
+# myproject.settings_production refuses to start with it.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': [
+            location for location in os.environ.get('CACHE_LOCATION', 'food_app').split(',') if location
+        ],
+    }
+}
+if len(CACHES['default']['LOCATION']) == 1:
+    CACHES['default']['LOCATION'] = CACHES['default']['LOCATION'][0]
+
+# Menu cache: time the shared copy of a menu version is kept (None = until the version changes)
+# and how many menu versions every process keeps in memory.
+MENU_CACHE_TIMEOUT = None
+MENU_CACHE_LOCAL_SIZE = 4
+
+# Dish search (food_app.search): 'database' uses the PostgreSQL full-text and trigram indexes, 'memory'
+# an index of the menu built in every process. Unset, the database is used on PostgreSQL only.
+DISH_SEARCH_BACKEND = os.environ.get('DISH_SEARCH_BACKEND')
+
+# Sessions and flash messages, by tier (SESSION_TIER):
+# 'db'        - Django's defaults: every session read and write goes to the database, messages fall back to it.
+# 'cached_db' - sessions read from the cache and written through to the database only when they changed
+#               (food_app.sessions), messages in a signed cookie. The cache must be shared by the workers.
+# 'cookie'    - the whole session in a signed cookie, no session table at all; a stolen or old cookie stays
+#               valid until it expires (logout cannot revoke it), so only for deployments that accept that.
+# An unchanged cached_db session is written again after SESSION_WRITE_INTERVAL seconds to keep its expiry;
+# `manage.py sweep_sessions` deletes the expired rows in batches.
+SESSION_TIERS = {
+    'db': ('django.contrib.sessions.backends.db', 'django.contrib.messages.storage.fallback.FallbackStorage'),
+    'cached_db': ('food_app.sessions', 'django.contrib.messages.storage.cookie.CookieStorage'),
+    'cookie': ('django.contrib.sessions.backends.signed_cookies', 'django.contrib.messages.storage.cookie.CookieStorage'),
+}
+SESSION_TIER = os.environ.get('SESSION_TIER', 'cached_db')
+SESSION_ENGINE, MESSAGE_STORAGE = SESSION_TIERS[SESSION_TIER]
+SESSION_WRITE_INTERVAL = 24 * 60 * 60
+
+# Failed logins allowed per client IP, per username on one IP and per username over all IPs:
+# (burst, seconds until one more is allowed). Checked before the password is hashed (food_app.throttle);
+# the buckets live in the shared cache.
+LOGIN_THROTTLE = {
+    'ip': (20, 6),
+    'user_ip': (5, 60),
+    'username': (50, 60),
+}
+
+# Number of days covered by the rolling "most ordered" dish popularity window.
+POPULARITY_WINDOW_DAYS = 30
+
+# Sales rollups: orders younger than this many seconds are left for the next rollup_sales run.
+REPORTING_SETTLE_SECONDS = 300
+
+# Orders older than ORDER_RETENTION_DAYS are moved by `manage.py archive_orders` to compressed monthly
+# segments under ORDER_ARCHIVE_DIR (see food_app.archive). Keep it longer than POPULARITY_WINDOW_DAYS.
+ORDER_ARCHIVE_DIR = os.environ.get('ORDER_ARCHIVE_DIR', os.path.join(BASE_DIR, 'order_archive'))
+ORDER_RETENTION_DAYS = 365
+# Number of archive segment indexes (one per month and run) every process keeps in memory.
+ORDER_ARCHIVE_INDEX_CACHE = 24
+
+# Background tasks (food_app.tasks, run by `manage.py run_tasks`): seconds a worker may hold a task before
+# another worker takes it over, attempts before a task is marked failed, the first retry delay in seconds
+# (doubled on every next attempt) and how long successfully finished tasks are kept.
+TASK_VISIBILITY_TIMEOUT = 300
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BACKOFF = 10
+TASK_KEEP_FINISHED_DAYS = 7
+
+# The order confirmation e-mails; printed to the console unless a real backend is configured.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'zamowienia@localhost')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -126,6 +275,13 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Serve STATIC_ROOT and MEDIA_ROOT from myproject.wsgi / myproject.asgi with food_app.fileserver, in front of Django
+# (on in myproject.settings_production). In development runserver and the static() URLs serve them.
+SERVE_FILES = False
+
+# Widths (in pixels) of the resized WebP/JPEG variants generated for every Dish.image.
+DISH_IMAGE_WIDTHS = (320, 640, 960)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
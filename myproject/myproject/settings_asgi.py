@@ -0,0 +1,9 @@
+"""
+Django settings for serving myproject through the ASGI entry point (myproject.asgi).
+
+Everything comes from myproject.settings; only the URLconf changes, so that the
+ordering pages are served by the async views.
+"""
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'myproject.urls_async'
@@ -0,0 +1,65 @@
+"""
+Django settings for running myproject in production.
+
+Everything comes from myproject.settings; this module turns DEBUG off, reads the
+secrets and host names from the environment, keeps parsed templates in memory for
+the life of the worker and warms every worker up before it serves traffic.
+The cache must be shared by the workers (CACHE_BACKEND / CACHE_LOCATION, Redis or Memcached).
+Static and media files are served by food_app.fileserver in front of Django; run
+`manage.py collectstatic` on every deploy to write the hashed, precompressed files.
+
+    DJANGO_SETTINGS_MODULE=myproject.settings_production
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# Every gunicorn worker is a separate process: with a per-process cache a menu edit would only bump the version
+# in one of them, a logout would not reach the others and the login throttle limits would be multiplied.
+if not any(name in CACHES['default']['BACKEND'].lower() for name in ('redis', 'memcached')):
+    raise ImproperlyConfigured(
+        'CACHE_BACKEND must be a cache shared by all workers (Redis or Memcached), not {}.'.format(
+            CACHES['default']['BACKEND']
+        )
+    )
+
+# The workers are expected behind one reverse proxy that appends the client address to X-Forwarded-For;
+# set TRUSTED_PROXY_COUNT to the number of proxies in front of them (0 if clients connect directly).
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+
+# The cached loader keeps every parsed template for the life of the process, so the files are read
+# and parsed once per worker. Explicit loaders need APP_DIRS off; the app directories are listed instead.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+# Parse the templates, load the URLconf and the menu when a WSGI worker starts (myproject.wsgi);
+# ASGI workers do it on the lifespan startup event (myproject.asgi).
+WARM_UP_ON_START = True
+
+# collectstatic writes hashed names ("app.3f2a9c1b7d4e.css", cached forever) and their .gz/.br variants.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'food_app.storage.CompressedManifestStaticFilesStorage'},
+}
+SERVE_FILES = True
@@ -0,0 +1,10 @@
+"""
+Django settings for serving myproject in production through the ASGI entry point (myproject.asgi).
+
+The production settings with the URLconf of the async views, as in myproject.settings_asgi.
+
+    DJANGO_SETTINGS_MODULE=myproject.settings_production_asgi
+"""
+from .settings_production import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'myproject.urls_async'
@@ -15,7 +15,9 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from food_app.views import HomeView, RegisterView, LoginView, LogoutView, OrderView, OrderSuccessView, OrderHistoryView
+from food_app.views import HomeView, RegisterView, LoginView, LogoutView, OrderView, OrderSuccessView, OrderHistoryView, \
+    MetricsView, OrderExportView, SalesDashboardView, SalesReportView, CartView, CartCheckoutView
+from food_app.api import DishListApiView, OrderListApiView
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -30,9 +32,21 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('order/', OrderView.as_view(), name='order'),
-    path('order_success/', OrderSuccessView.as_view(), name='order_success'),
+    path('order_success/<int:order_id>/', OrderSuccessView.as_view(), name='order_success'),
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/add/', CartView.as_view(action='add'), name='cart_add'),
+    path('cart/update/', CartView.as_view(action='update'), name='cart_update'),
+    path('cart/remove/', CartView.as_view(action='remove'), name='cart_remove'),
+    path('cart/checkout/', CartCheckoutView.as_view(), name='cart_checkout'),
     path('order_history/', OrderHistoryView.as_view(), name='order_history'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('reports/', SalesDashboardView.as_view(), name='sales_dashboard'),
+    path('reports/sales/', SalesReportView.as_view(), name='sales_report'),
+    path('api/dishes/', DishListApiView.as_view(), name='api_dishes'),
+    path('api/orders/', OrderListApiView.as_view(), name='api_orders'),
+    path('orders/export/', OrderExportView.as_view(), name='order_export'),
 ]
 
+# development only: static() adds nothing unless DEBUG is on; production uses food_app.fileserver
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,42 @@
+"""URL configuration used by the ASGI entry point (see myproject.settings_asgi).
+
+It serves the same URLs as myproject.urls, with the ordering views replaced
+by their async versions from food_app.async_views.
+"""
+from django.contrib import admin
+from django.urls import path
+from food_app.views import RegisterView, LoginView, LogoutView, MetricsView, SalesDashboardView, SalesReportView, \
+    CartView, CartCheckoutView
+from food_app.async_views import AsyncHomeView, AsyncOrderView, AsyncOrderSuccessView, AsyncOrderHistoryView, \
+    AsyncOrderExportView
+from food_app.api import DishListApiView, OrderListApiView
+from django.conf import settings
+from django.conf.urls.static import static
+
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', AsyncHomeView.as_view(), name='home'),
+    path('home/', AsyncHomeView.as_view(), name='home'),
+    path('register/', RegisterView.as_view(), name='register'),
+    path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('order/', AsyncOrderView.as_view(), name='order'),
+    path('order_success/<int:order_id>/', AsyncOrderSuccessView.as_view(), name='order_success'),
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/add/', CartView.as_view(action='add'), name='cart_add'),
+    path('cart/update/', CartView.as_view(action='update'), name='cart_update'),
+    path('cart/remove/', CartView.as_view(action='remove'), name='cart_remove'),
+    path('cart/checkout/', CartCheckoutView.as_view(), name='cart_checkout'),
+    path('order_history/', AsyncOrderHistoryView.as_view(), name='order_history'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('reports/', SalesDashboardView.as_view(), name='sales_dashboard'),
+    path('reports/sales/', SalesReportView.as_view(), name='sales_report'),
+    path('api/dishes/', DishListApiView.as_view(), name='api_dishes'),
+    path('api/orders/', OrderListApiView.as_view(), name='api_orders'),
+    path('orders/export/', AsyncOrderExportView.as_view(), name='order_export'),
+]
+
+# development only: static() adds nothing unless DEBUG is on; production uses food_app.fileserver
+urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -2,6 +2,9 @@
 WSGI config for myproject project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+With WARM_UP_ON_START (on in myproject.settings_production) every worker warms up
+(food_app.warmup) when it loads this module, before it accepts requests.
+With SERVE_FILES the static and media files are served by food_app.fileserver in front of Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
@@ -9,8 +12,19 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+if getattr(settings, 'SERVE_FILES', False):
+    from food_app.fileserver import FileServer
+
+    application = FileServer(application)
+
+if getattr(settings, 'WARM_UP_ON_START', False):
+    from food_app.warmup import warm_up_worker
+
+    warm_up_worker()